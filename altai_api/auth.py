@@ -19,16 +19,42 @@
 # License along with this program. If not, see
 # <http://www.gnu.org/licenses/>.
 
+import os
+import hmac
+import hashlib
+
+from datetime import datetime, timedelta
+from threading import Lock
+
 from flask import request, g, abort
 from flask import current_app as app
 
 from openstackclient_base.client_set import ClientSet
 from openstackclient_base import exceptions as osc_exc
 from altai_api import exceptions as exc
+from altai_api.cache import app_cache, app_failure_cache, app_single_flight
 
 
 ATTRIBUTE_NAME = 'altai_api_endpoint_auth_type'
 
+# cached tokens are considered expired a bit earlier than keystone
+# says, so that we never send a request with stale token
+_EXPIRES_MARGIN = timedelta(seconds=60)
+
+# salt for credentials hashes, so that cache keys are useless
+# outside of this process
+_CREDENTIALS_SALT = os.urandom(16)
+
+# cache value for credentials that are valid but don't give access
+# to system tenant
+_NOT_ADMIN = object()
+
+# protects updates of index of cached credentials by user
+_CREDENTIALS_INDEX_LOCK = Lock()
+
+# cache value for tokens that can't be scoped to a tenant
+_NOT_MEMBER = object()
+
 
 def require_auth():
     """Handle request authentication"""
@@ -40,23 +66,193 @@ def require_auth():
     return check_auth()
 
 
-def _keystone_auth(require_admin):
+def _credentials_cache():
+    return app_cache('credentials',
+                     app.config['AUTH_CACHE_SIZE'],
+                     app.config['AUTH_CACHE_TTL'])
+
+
+def _rejected_credentials():
+    return app_failure_cache('rejected_credentials',
+                             app.config['AUTH_FAILURE_CACHE_SIZE'],
+                             app.config['AUTH_FAILURE_BACKOFF'],
+                             app.config['AUTH_FAILURE_BACKOFF_MAX'])
+
+
+def rejected_credentials_count():
+    """Get number of credentials rejected without asking keystone
+
+    Credentials are rejected locally for some time after they
+    failed authentication.
+
+    """
+    return _rejected_credentials().blocked_count()
+
+
+def _credentials_key(*args):
+    """Make cache key out of credentials
+
+    We don't want to keep passwords in memory longer than needed,
+    so we use salted hash of credentials as a key.
+
+    """
+    message = repr(tuple(
+        arg.encode('utf-8') if isinstance(arg, unicode) else arg
+        for arg in args))
+    return hmac.new(_CREDENTIALS_SALT, message, hashlib.sha256).hexdigest()
+
+
+def _token_expires(client_set):
+    """Get time when client set token should be considered expired
+
+    Returns None if token expiration time is unknown.
+
+    """
+    # NOTE: importing utils here to avoid circular dependency:
+    #  utils.communication imports this module
+    from altai_api.utils.parsers import timestamp_from_openstack
+    try:
+        expires = client_set.http_client.access['token']['expires']
+        return timestamp_from_openstack(expires) - _EXPIRES_MARGIN
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _credentials_by_user():
+    return app_cache('credentials_by_user',
+                     app.config['AUTH_CACHE_SIZE'],
+                     app.config['AUTH_CACHE_TTL'])
+
+
+def _token_user_id(client_set):
+    """Get id of user client set token was issued to, or None"""
+    try:
+        return client_set.http_client.access['user']['id']
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
+def _cache_credentials(key, value, client_set):
+    """Put value into credentials cache
+
+    Entry expires with token of client_set, and is indexed by id of
+    its user, so that invalidate_user_credentials can find it.
+
+    """
+    _credentials_cache().put(key, value, _token_expires(client_set))
+    user_id = _token_user_id(client_set)
+    if user_id is not None:
+        index = _credentials_by_user()
+        with _CREDENTIALS_INDEX_LOCK:
+            keys = index.get(user_id, frozenset())
+            index.put(user_id, keys | frozenset((key,)))
+
+
+def invalidate_user_credentials(user_id):
+    """Forget client sets cached for user
+
+    Should be called when user password, status or administrative
+    rights change, so that old credentials and rights are no longer
+    trusted. Only caches of current process are cleared: other API
+    processes trust cached credentials for up to AUTH_CACHE_TTL
+    seconds more.
+
+    """
+    with _CREDENTIALS_INDEX_LOCK:
+        keys = _credentials_by_user().pop(user_id, ())
+    cache = _credentials_cache()
+    for key in keys:
+        cache.pop(key)
+
+
+def _request_credentials():
+    """Get credentials from request
+
+    Credentials are returned as a tuple of positional arguments for
+    _client_set, or None if request has no credentials at all.
+
+    """
     auth = request.authorization
-    if auth is None:
+    if auth is not None:
+        return (auth.username, auth.password)
+    token = request.headers.get('X-Auth-Token')
+    if token:
+        return (None, None, token)
+    return None
+
+
+def _cached_client_set(credentials, **kwargs):
+    """Authenticate with credentials, using process-wide credentials cache
+
+    Concurrent authentications with the same credentials wait for
+    single keystone request and share its result.
+
+    May return _NOT_ADMIN if credentials are known to be good but not
+    sufficient to get into tenant_name.
+
+    """
+    cache = _credentials_cache()
+    key = _credentials_key(kwargs.get('tenant_name'), *credentials)
+
+    def authenticate():
+        # someone might have put it into cache while we were waiting
+        result = cache.get(key)
+        if result is None:
+            result = _client_set(*credentials, **kwargs)
+            _cache_credentials(key, result, result)
+        return result
+
+    cs = cache.get(key)
+    if cs is None:
+        cs = app_single_flight('credentials').do(key, authenticate)
+    return cs
+
+
+def _keystone_auth(require_admin):
+    credentials = _request_credentials()
+    if credentials is None:
         abort(401)
 
+    rejected = _rejected_credentials()
+    rejection_key = _credentials_key(*credentials)
+    if rejected.is_blocked(rejection_key):
+        abort(403)
+
+    systenant = app.config['SYSTENANT']
+    # NOTE: keystone does not tell wrong credentials from
+    # credentials that give no access to systenant, so for administrative
+    # endpoints failures are remembered per systenant, too: otherwise
+    # they would never be remembered at all
+    admin_rejection_key = _credentials_key(systenant, *credentials)
+    if require_admin and rejected.is_blocked(admin_rejection_key):
+        abort(403)
+
     try:
-        cs = _client_set(auth.username, auth.password,
-                         tenant_name=app.config['SYSTENANT'])
-    except (osc_exc.Unauthorized, osc_exc.Forbidden):
+        cs = _cached_client_set(credentials, tenant_name=systenant)
+    except osc_exc.Unauthorized:
+        if require_admin:
+            rejected.failed(admin_rejection_key)
+        cs = _NOT_ADMIN
+    except osc_exc.Forbidden:
+        cs = _NOT_ADMIN
+
+    if cs is _NOT_ADMIN:
         if require_admin:
             abort(403)
         try:
             # as a user, try again without tenant
-            cs = _client_set(auth.username, auth.password)
+            cs = _cached_client_set(credentials)
         except (osc_exc.Unauthorized, osc_exc.Forbidden):
+            rejected.failed(rejection_key)
             abort(403)
-
+        # remember that this user can't get into systenant, so that
+        # we don't ask keystone about it again
+        _cache_credentials(_credentials_key(systenant, *credentials),
+                           _NOT_ADMIN, cs)
+
+    rejected.succeeded(rejection_key)
+    if require_admin:
+        rejected.succeeded(admin_rejection_key)
     if admin_role_id(cs) is None:
         if require_admin:
             abort(403)
@@ -82,7 +278,7 @@ def user_auth():
 
 def no_auth():
     """Authorize for noauth endpoint"""
-    if request.authorization is None:
+    if _request_credentials() is None:
         g.client_set = None
         g.is_admin = False
         return None
@@ -92,7 +288,12 @@ def no_auth():
 
 def _client_set(username=None, password=None, token=None,
                 tenant_name=None, tenant_id=None):
-    """Authorize in keystone and return client set"""
+    """Authorize in keystone and return client set
+
+    Either username and password or existing keystone token
+    should be provided.
+
+    """
     cs = ClientSet(username=username,
                    password=password,
                    token=token,
@@ -112,13 +313,45 @@ def is_authenticated():
     return getattr(g, 'client_set', None) is not None
 
 
-def client_set_for_tenant(tenant_id, eperm_status=403, fallback_to_api=False):
-    """Returns client set scoped to given tenant"""
-    try:
-        cs = _client_set(token=g.client_set.http_client.access['token']['id'],
-                         tenant_id=tenant_id)
-    except (osc_exc.Unauthorized, osc_exc.Forbidden):
-        if g.is_admin:
+def _scoped_client_sets():
+    return app_cache('scoped_client_sets',
+                     app.config['SCOPED_CLIENT_SET_CACHE_SIZE'],
+                     app.config['AUTH_CACHE_TTL'])
+
+
+def _earliest(*times):
+    """Return earliest of given times, ignoring None values"""
+    times = [t for t in times if t is not None]
+    return min(times) if times else None
+
+
+def _client_set_for_tenant(token_id, source_expires, is_admin,
+                           tenant_id, eperm_status, fallback_to_api):
+    """Get client set scoped to tenant, without request context"""
+    cache = _scoped_client_sets()
+    key = _credentials_key(token_id, tenant_id)
+
+    def rescope():
+        result = cache.get(key)
+        if result is None:
+            try:
+                result = _client_set(token=token_id, tenant_id=tenant_id)
+                cache.put(key, result,
+                          _earliest(_token_expires(result), source_expires))
+            except (osc_exc.Unauthorized, osc_exc.Forbidden):
+                result = _NOT_MEMBER
+                negative_ttl = app.config['SCOPED_CLIENT_SET_NEGATIVE_TTL']
+                cache.put(key, result, _earliest(
+                    source_expires,
+                    datetime.utcnow() + timedelta(seconds=negative_ttl)))
+        return result
+
+    cs = cache.get(key)
+    if cs is None:
+        cs = app_single_flight('scoped_client_sets').do(key, rescope)
+
+    if cs is _NOT_MEMBER:
+        if is_admin:
             if fallback_to_api:
                 return api_client_set(tenant_id)
             else:
@@ -130,10 +363,85 @@ def client_set_for_tenant(tenant_id, eperm_status=403, fallback_to_api=False):
     return cs
 
 
+def client_set_for_tenant(tenant_id, eperm_status=403, fallback_to_api=False):
+    """Returns client set scoped to given tenant
+
+    Scoped client sets are cached by source token and tenant, until
+    source token expires or project membership changes (see
+    invalidate_user_projects). Failures to get them are remembered for
+    SCOPED_CLIENT_SET_NEGATIVE_TTL seconds at most, so that users just
+    added to the tenant by other API process get access soon.
+    Concurrent requests for the same token and tenant share one
+    authentication.
+
+    """
+    return _client_set_for_tenant(
+        g.client_set.http_client.access['token']['id'],
+        _token_expires(g.client_set), g.is_admin,
+        tenant_id, eperm_status, fallback_to_api)
+
+
+def tenant_client_set_getter(eperm_status=403, fallback_to_api=False):
+    """Returns function that gets client sets scoped to tenants
+
+    Returned function takes tenant id and works like
+    client_set_for_tenant, but it does not need request context,
+    so it can be called by parallel_map.
+
+    """
+    token_id = g.client_set.http_client.access['token']['id']
+    source_expires = _token_expires(g.client_set)
+    is_admin = g.is_admin
+    flask_app = app._get_current_object()
+
+    def get(tenant_id):
+        with flask_app.app_context():
+            return _client_set_for_tenant(token_id, source_expires,
+                                          is_admin, tenant_id,
+                                          eperm_status, fallback_to_api)
+    return get
+
+
+def _catalog_cache():
+    return app_cache('catalog', 2, app.config['CATALOG_CACHE_TTL'])
+
+
+def _load_roles():
+    roles = admin_client_set().identity_admin.roles.list()
+    result = dict(((role.name.lower(), role.id) for role in roles))
+    _catalog_cache().put('roles', result)
+    return result
+
+
+def _load_default_tenant_id():
+    result = admin_client_set().http_client.access['token']['tenant']['id']
+    _catalog_cache().put('systenant-id', result)
+    return result
+
+
+def role_id(name):
+    """Returns ID of role with given name, or None if there is no such role
+
+    Roles are looked up in process-wide catalog that is refreshed
+    every CATALOG_CACHE_TTL seconds or when role is not found in it.
+    Role names are case-insensitive.
+
+    """
+    name = name.lower()
+    roles = _catalog_cache().get('roles')
+    if roles is None or name not in roles:
+        roles = app_single_flight('catalog').do('roles', _load_roles)
+    return roles.get(name)
+
+
 def default_tenant_id():
     """Returns ID of tenant named app.config['SYSTENANT']
     """
-    return admin_client_set().http_client.access['token']['tenant']['id']
+    result = _catalog_cache().get('systenant-id')
+    if result is None:
+        result = app_single_flight('catalog').do('systenant-id',
+                                                 _load_default_tenant_id)
+    return result
 
 
 def admin_role_id(client_set=None):
@@ -186,15 +494,33 @@ def add_api_superuser_to_project(project_id):
     """Gives API superuser administrative permissions for given projects
 
     API superuser should be granted all possible permissions.
+    Returns True on success, False otherwise.
+
     """
     try:
         cs = api_client_set()
         user_id = cs.http_client.access['user']['id']
         cs.identity_admin.roles.add_user_role(
             user_id, admin_role_id(cs), project_id)
+        return True
     except Exception, e:
         app.logger.exception("Failed to add API superuser to "
                              "project %r (%s)", project_id, e)
+        return False
+
+
+def _api_client_set_pool():
+    """Process-wide pool of API superuser client sets, by project id"""
+    return app_cache('api_client_sets',
+                     app.config['API_CLIENT_SET_POOL_SIZE'],
+                     app.config['API_CLIENT_SET_TTL'])
+
+
+def _api_superuser_projects():
+    """Projects this process has already added API superuser to"""
+    return app_cache('api_superuser_projects',
+                     app.config['API_CLIENT_SET_POOL_SIZE'],
+                     app.config['API_CLIENT_SET_TTL'])
 
 
 def _api_client_set_impl(project_id=None):
@@ -219,12 +545,35 @@ def api_client_set(project_id=None):
     Useful when user is administrator, but not member of
     project project_id.
 
+    Client sets are taken from process-wide pool and are replaced
+    with fresh ones shortly before their tokens expire. Concurrent
+    requests for the same project share one authentication.
+
     """
+    cs = _api_client_set_pool().get(project_id)
+    if cs is None:
+        cs = app_single_flight('api_client_sets').do(
+            project_id, _new_api_client_set, project_id)
+    return cs
+
+
+def _new_api_client_set(project_id):
+    pool = _api_client_set_pool()
+    cs = pool.get(project_id)
+    if cs is not None:
+        return cs
+
     cs = _api_client_set_impl(project_id)
     if not cs and project_id is not None:
-        add_api_superuser_to_project(project_id)
-        cs = _api_client_set_impl(project_id)
+        added = _api_superuser_projects()
+        # NOTE: if we already added superuser to the
+        # project, adding it once again won't help
+        if not added.get(project_id):
+            if add_api_superuser_to_project(project_id):
+                added.put(project_id, True)
+            cs = _api_client_set_impl(project_id)
     if cs:
+        pool.put(project_id, cs, _token_expires(cs))
         return cs
     else:
         raise RuntimeError('Service misconfiguration: '
@@ -262,12 +611,52 @@ def bound_client_set():
     return client_set_for_tenant(tenants[0].id)
 
 
+def _project_membership_cache():
+    return app_cache('project_membership',
+                     app.config['MEMBERSHIP_CACHE_SIZE'],
+                     app.config['MEMBERSHIP_CACHE_TTL'])
+
+
 def current_user_project_ids():
-    """Get set of project ids current user is member of"""
+    """Get set of project ids current user is member of
+
+    Project ids are cached by user id for MEMBERSHIP_CACHE_TTL
+    seconds; functions that change project membership should call
+    invalidate_user_projects.
+
+    """
     try:
         return g.current_user_project_ids
     except AttributeError:
-        tenants = (g.client_set.identity_public.tenants.list()
-                   if is_authenticated() else [])
-        g.current_user_project_ids = set((tenant.id for tenant in tenants))
+        if is_authenticated():
+            cache = _project_membership_cache()
+            user_id = current_user_id()
+            project_ids = cache.get(user_id)
+            if project_ids is None:
+                tenants = g.client_set.identity_public.tenants.list()
+                project_ids = frozenset((tenant.id for tenant in tenants))
+                cache.put(user_id, project_ids)
+        else:
+            project_ids = ()
+        g.current_user_project_ids = set(project_ids)
         return g.current_user_project_ids
+
+
+def invalidate_user_projects(user_id=None):
+    """Forget cached project membership of given user
+
+    If user_id is None, membership of all users is forgotten.
+    Client sets scoped to projects (and failures to get them) are
+    forgotten for all users, as they are cached by token, not by user.
+
+    """
+    cache = _project_membership_cache()
+    if user_id is None:
+        cache.clear()
+    else:
+        cache.pop(user_id)
+    _scoped_client_sets().clear()
+    try:
+        del g.current_user_project_ids
+    except AttributeError:
+        pass
@@ -25,6 +25,7 @@ from openstackclient_base import exceptions as osc_exc
 from altai_api.utils import make_json_response
 from altai_api.utils import make_collection_response
 from altai_api.utils import parse_collection_request
+from altai_api.utils import collection
 
 from altai_api.utils.decorators import root_endpoint
 
@@ -99,9 +100,18 @@ _SCHEMA = Schema((
 @root_endpoint('audit-log')
 def list_all_records():
     parse_collection_request(_SCHEMA)
-    result = [record_to_view(record)
-              for record in AuditDAO.list_all()]
-    return make_collection_response(u'audit-log', result)
+    if g.sortby or collection.has_filters():
+        result = [record_to_view(record)
+                  for record in AuditDAO.list_all()]
+        return make_collection_response(u'audit-log', result)
+
+    # NOTE: records are already in order, so database
+    # can find the requested page
+    size, records = AuditDAO.list_page(collection.pop_marker_id(),
+                                       g.offset, g.limit)
+    return make_collection_response(
+        u'audit-log', records, size=size,
+        to_views=lambda page: [record_to_view(record) for record in page])
 
 
 @BP.route('/<record_id>')
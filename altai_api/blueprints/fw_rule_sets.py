@@ -26,11 +26,13 @@ from openstackclient_base import exceptions as osc_exc
 from altai_api.utils import *
 
 from altai_api.utils.decorators import root_endpoint, user_endpoint
+from altai_api.utils.parallel import parallel_map
 
 from altai_api.schema import Schema
 from altai_api.schema import types as st
 
 from altai_api.auth import (client_set_for_tenant, admin_client_set,
+                            tenant_client_set_getter,
                             assert_admin_or_project_user)
 from altai_api.blueprints.projects import link_for_project
 
@@ -80,12 +82,17 @@ def list_fw_rule_sets():
     else:
         tenants = admin_client_set().identity_admin.tenants.list()
 
-    result = []
-    for tenant in tenants:
-        if tenant.name != app.config['SYSTENANT']:
-            tcs = client_set_for_tenant(tenant.id, fallback_to_api=g.is_admin)
-            for sg in tcs.compute.security_groups.list():
-                result.append(_sg_to_view(sg, tenant.name))
+    tenants = [tenant for tenant in tenants
+               if tenant.name != app.config['SYSTENANT']]
+    get_client_set = tenant_client_set_getter(fallback_to_api=g.is_admin)
+
+    def list_security_groups(tenant):
+        return get_client_set(tenant.id).compute.security_groups.list()
+
+    sg_lists = parallel_map(list_security_groups, tenants)
+    result = [_sg_to_view(sg, tenant.name)
+              for tenant, sgs in zip(tenants, sg_lists)
+              for sg in sgs]
     return make_collection_response(u'fw-rule-sets', result)
 
 
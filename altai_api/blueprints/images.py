@@ -59,12 +59,37 @@ def _fetch_image(image_id, to_modify):
     return image
 
 
+def _image_names():
+    """Get request-scoped dictionary that maps image ids to names"""
+    names = getattr(g, 'image_names', None)
+    if names is None:
+        names = g.image_names = {}
+    return names
+
+
+def remember_image_names(image_list):
+    """Remember names of images for the rest of current request
+
+    Images should be visible to current user. Links to these images
+    are made without asking Glance.
+
+    """
+    _image_names().update(((image.id, image.name) for image in image_list))
+
+
 def link_for_image(image_id, image_name=None):
     if image_name is None:
+        names = _image_names()
         try:
-            image_name = _fetch_image(image_id, to_modify=False).name
-        except HTTPException:
-            image_name = None
+            image_name = names[image_id]
+        except KeyError:
+            try:
+                image_name = _fetch_image(image_id, to_modify=False).name
+            except HTTPException:
+                image_name = None
+            # NOTE: missing and invisible images are
+            # remembered too, so they are looked up only once
+            names[image_id] = image_name
     return {
         u'id': image_id,
         u'href': url_for('images.get_image', image_id=image_id),
@@ -98,13 +123,30 @@ def _image_to_view(image, tenant=None):
     return result
 
 
-def list_all_images(client):
-    """Get list of all images from all tenants"""
+def _list_images(client, is_public, marker_id=None):
+    kwargs = {'filters': {'is_public': is_public}}
+    if marker_id is not None:
+        kwargs['marker'] = marker_id
+    try:
+        return client.list(**kwargs)
+    except osc_exc.BadRequest:
+        if marker_id is None:
+            raise
+        raise collection.marker_not_found()
+
+
+def list_all_images(client, marker_id=None):
+    """Get list of all images from all tenants
+
+    If marker_id is given, only images that go after image with this
+    id are returned.
+
+    """
     # NOTE(imelnikov): When is_public is True (the default), images
     # available for current tenant are returned (public images and
     # images from current tenant). When is_public is set to None
     # explicitly, current tenant is ignored.
-    return client.list(filters={'is_public': None})
+    return _list_images(client, None, marker_id)
 
 
 _SCHEMA = Schema((
@@ -138,8 +180,9 @@ def _images_for_tenant(tenant_id, is_public):
 
     client = auth.client_set_for_tenant(tenant_id,
                                         fallback_to_api=g.is_admin)
-    image_list = client.image.images.list(
-            filters={'is_public': is_public})
+    image_list = _list_images(client.image.images, is_public,
+                              collection.pop_marker_id())
+    remember_image_names(image_list)
     return [_image_to_view(image, tenant) for image in image_list]
 
 
@@ -152,9 +195,13 @@ def _images_for_all_tenants():
     tenant_dict = dict(((tenant.id, tenant) for tenant in tenants))
     tenant_dict[auth.default_tenant_id()] = None
 
+    image_list = [image for image in
+                  list_all_images(auth.admin_client_set().image.images,
+                                  collection.pop_marker_id())
+                  if not g.my_projects or image.owner in tenant_dict]
+    remember_image_names(image_list)
     return [_image_to_view(image, tenant_dict.get(image.owner))
-            for image in list_all_images(auth.admin_client_set().image.images)
-            if not g.my_projects or image.owner in tenant_dict]
+            for image in image_list]
 
 
 def _project_argument():
@@ -19,6 +19,8 @@
 # License along with this program. If not, see
 # <http://www.gnu.org/licenses/>.
 
+import re
+
 from flask import url_for, g, Blueprint, abort, request
 from flask.exceptions import HTTPException
 
@@ -28,6 +30,9 @@ from openstackclient_base import exceptions as osc_exc
 from altai_api.utils import *
 from altai_api.utils.decorators import root_endpoint, user_endpoint
 from altai_api.utils.collection import get_matcher_argument
+from altai_api.utils.collection import view_fields, is_requested
+from altai_api.utils.collection import pop_marker_id, marker_not_found
+from altai_api.utils.parallel import parallel_map
 
 from altai_api.schema import Schema
 from altai_api.schema import types as st
@@ -35,12 +40,15 @@ from altai_api.schema import types as st
 from altai_api.utils.parsers import timestamp_from_openstack, int_from_string
 
 from altai_api.auth import (client_set_for_tenant, admin_client_set,
-                            current_user_project_ids,
+                            tenant_client_set_getter,
+                            current_user_project_ids, default_tenant_id,
                             assert_admin_or_project_user)
 
-from altai_api.blueprints.users import link_for_user_id
+from altai_api.blueprints.users import (link_for_user_id,
+                                        project_member_names)
 from altai_api.blueprints.projects import link_for_project
-from altai_api.blueprints.images import link_for_image
+from altai_api.blueprints.images import (link_for_image, list_all_images,
+                                         remember_image_names)
 from altai_api.blueprints.nodes import link_for_node
 
 from altai_api.db.instance_data import InstanceDataDAO
@@ -69,7 +77,23 @@ def _instance_to_view(server):
     user_link = link_for_user_id(server.user_id)
     image_link = link_for_image(server.image['id'])
     instancedata = InstanceDataDAO.get(server.id)
+    return _make_view(server, project_link, flavor, user_link,
+                      image_link, instancedata)
+
+
+def _ipv4_addresses(server):
+    return [elem['addr']
+            for val in server.addresses.itervalues()
+            for elem in val if elem['version'] == 4]
+
 
+def _make_view(server, project_link, flavor, user_link,
+               image_link, instancedata):
+    """Make view of server
+
+    Link objects and flavor that are None are omitted from view.
+
+    """
     href_for = lambda endpoint: url_for(endpoint,
                                         instance_id=server.id)
 
@@ -77,20 +101,9 @@ def _instance_to_view(server):
         u'id': server.id,
         u'href': href_for('instances.get_instance'),
         u'name': server.name,
-        u'project': project_link,
-        u'created-by': user_link,
-        u'image': image_link,
-        u'instance-type': {
-            u'id': flavor.id,
-            u'name': flavor.name,
-            u'href': url_for('instance_types.get_instance_type',
-                             instance_type_id=flavor.id)
-        },
         u'created': timestamp_from_openstack(server.created),
         u'state': server.status,
-        u'ipv4': [elem['addr']
-                  for val in server.addresses.itervalues()
-                  for elem in val if elem['version'] == 4],
+        u'ipv4': _ipv4_addresses(server),
         u'links': {
             u'reboot': href_for('instances.reboot_instance'),
             u'reset': href_for('instances.reset_instance'),
@@ -101,6 +114,18 @@ def _instance_to_view(server):
                                   '.list_instance_fw_rule_sets')
         }
     }
+    for name, link in ((u'project', project_link),
+                       (u'created-by', user_link),
+                       (u'image', image_link)):
+        if link is not None:
+            result[name] = link
+    if flavor is not None:
+        result[u'instance-type'] = {
+            u'id': flavor.id,
+            u'name': flavor.name,
+            u'href': url_for('instance_types.get_instance_type',
+                             instance_type_id=flavor.id)
+        }
     if instancedata:
         if instancedata.expires_at is not None:
             result[u'expires-at'] = instancedata.expires_at
@@ -111,6 +136,99 @@ def _instance_to_view(server):
     return result
 
 
+def _visible_user_names():
+    """Get names of all users current user can see
+
+    Returns dictionary that maps user IDs to names.
+
+    """
+    if g.is_admin:
+        users = admin_client_set().identity_admin.users.list()
+        return dict(((user.id, user.name) for user in users))
+    return project_member_names()
+
+
+def _visible_image_names():
+    """Get names of all images current user can see
+
+    Returns dictionary that maps image IDs to names.
+
+    """
+    images = list_all_images(admin_client_set().image.images)
+    if not g.is_admin:
+        visible = set(current_user_project_ids())
+        visible.add(default_tenant_id())
+        images = [image for image in images if image.owner in visible]
+    remember_image_names(images)
+    return dict(((image.id, image.name) for image in images))
+
+
+def _prefetched_link(link_for, object_id, names):
+    """Make link object using names from prefetched dictionary
+
+    Unlike link_for_* functions, never looks up objects that are
+    missing from names: we already know they are not found or not
+    visible, so their names are None.
+
+    """
+    name = names.get(object_id)
+    link = link_for(object_id, name if name is not None else u'')
+    link[u'name'] = name
+    return link
+
+
+def _instances_to_views(servers, fields=None):
+    """Convert list of servers to list of views
+
+    Instead of fetching flavor, project, user, image and instance data
+    for every server, we list every kind of objects once and build
+    views from these lists. If fields is given, it is a set of element
+    names the views should have, and only objects needed for these
+    elements are fetched.
+
+    """
+    if not servers:
+        return []
+    client = admin_client_set()
+    flavors = project_names = user_names = image_names = None
+    instancedata = {}
+    if is_requested(fields, 'instance-type'):
+        flavors = dict(((flavor.id, flavor)
+                        for flavor in client.compute.flavors.list()))
+    if is_requested(fields, 'project'):
+        project_names = dict(((tenant.id, tenant.name) for tenant
+                              in client.identity_admin.tenants.list()))
+    if is_requested(fields, 'created-by'):
+        user_names = _visible_user_names()
+    if is_requested(fields, 'image'):
+        image_names = _visible_image_names()
+    if is_requested(fields, 'expires-at', 'remind-at'):
+        instancedata = InstanceDataDAO.get_many(server.id
+                                                for server in servers)
+
+    result = []
+    for server in servers:
+        flavor = project_link = user_link = image_link = None
+        if flavors is not None:
+            flavor_id = server.flavor['id']
+            if flavor_id not in flavors:
+                # deleted flavors are not listed, but still may be used
+                flavors[flavor_id] = client.compute.flavors.get(flavor_id)
+            flavor = flavors[flavor_id]
+        if project_names is not None:
+            project_link = _prefetched_link(link_for_project,
+                                            server.tenant_id, project_names)
+        if user_names is not None:
+            user_link = _prefetched_link(link_for_user_id,
+                                         server.user_id, user_names)
+        if image_names is not None:
+            image_link = _prefetched_link(link_for_image,
+                                          server.image['id'], image_names)
+        result.append(_make_view(server, project_link, flavor, user_link,
+                                 image_link, instancedata.get(server.id)))
+    return result
+
+
 def fetch_instance(instance_id):
     try:
         instance = admin_client_set().compute.servers.get(instance_id)
@@ -145,19 +263,76 @@ _SCHEMA = Schema((
 )
 
 
-def _servers_for_user():
+def _link_keys(name, get_id):
+    """Make keys for link object element with given name"""
+    return {
+        name: lambda server: {u'id': get_id(server)},
+        name + '.id': get_id
+    }
+
+
+# keys to filter and sort servers without building views
+_KEYS = {
+    'id': lambda server: server.id,
+    'name': lambda server: server.name,
+    'state': lambda server: server.status,
+    'created': lambda server: timestamp_from_openstack(server.created),
+    'ipv4': _ipv4_addresses
+}
+_KEYS.update(_link_keys('project', lambda server: server.tenant_id))
+_KEYS.update(_link_keys('created-by', lambda server: server.user_id))
+_KEYS.update(_link_keys('instance-type',
+                        lambda server: server.flavor['id']))
+_KEYS.update(_link_keys('image', lambda server: server.image['id']))
+
+
+# NOTE: re.escape escapes every non-alphanumeric character,
+#  including all the non-ASCII ones, which databases Nova queries
+#  (e.g. MySQL REGEXP) don't understand, so only regular expression
+#  metacharacters are escaped
+_REGEX_METACHARACTERS = re.compile(r'([.^$*+?()\[\]{}|\\])')
+
+
+def _regex_escape(string):
+    """Escape regular expression metacharacters in string"""
+    return _REGEX_METACHARACTERS.sub(r'\\\1', string)
+
+
+def _search_opts():
+    """Convert filters Nova can apply itself to search options
+
+    Nova matches names with regular expressions and maps some states
+    to the same search option, so name and state matchers are kept
+    and applied to views again.
+
+    """
+    result = {}
+    name = get_matcher_argument('name', 'eq')
+    if name is not None:
+        result['name'] = u'^%s$' % _regex_escape(name)
+    state = get_matcher_argument('state', 'eq')
+    if state is not None:
+        result['status'] = state
+    return result
+
+
+def _servers_for_user(search_opts):
     project_id = get_matcher_argument('project', 'eq')
     if project_id is not None:
         projects = (project_id,)
     else:
         projects = get_matcher_argument('project', 'in')
 
-    result = []
-    for project_id in current_user_project_ids():
-        if projects is None or project_id in projects:
-            cs = client_set_for_tenant(project_id)
-            result.extend(cs.compute.servers.list())
-    return result
+    tenant_ids = [tenant_id
+                  for tenant_id in sorted(current_user_project_ids())
+                  if projects is None or tenant_id in projects]
+    get_client_set = tenant_client_set_getter()
+    # NOTE: tokens are rescoped to projects concurrently, too
+    server_lists = parallel_map(
+        lambda tenant_id: get_client_set(tenant_id).compute.servers.list(
+            search_opts=search_opts),
+        tenant_ids)
+    return [server for servers in server_lists for server in servers]
 
 
 @BP.route('/', methods=('GET',))
@@ -165,13 +340,30 @@ def _servers_for_user():
 @user_endpoint
 def list_instances():
     parse_collection_request(_SCHEMA.sortby)
+    search_opts = _search_opts()
     if g.my_projects:
-        servers = _servers_for_user()
+        servers = _servers_for_user(search_opts)
     else:
-        servers = g.client_set.compute.servers.list(
-                search_opts={'all_tenants': 1})
-    result = [_instance_to_view(instance) for instance in servers]
-    return make_collection_response(u'instances', result)
+        search_opts['all_tenants'] = 1
+        project_id = get_matcher_argument('project', 'eq',
+                                          delete_if_found=True)
+        if project_id is not None:
+            search_opts['tenant_id'] = project_id
+        marker_id = pop_marker_id()
+        if marker_id is not None:
+            search_opts['marker'] = marker_id
+        try:
+            servers = g.client_set.compute.servers.list(
+                search_opts=search_opts)
+        except osc_exc.BadRequest:
+            if marker_id is None:
+                raise
+            raise marker_not_found()
+    fields = view_fields()
+    return make_collection_response(
+        u'instances', servers,
+        to_views=lambda page: _instances_to_views(page, fields),
+        keys=_KEYS)
 
 
 @BP.route('/<instance_id>', methods=('GET',))
@@ -31,7 +31,8 @@ from altai_api.schema import types as st
 from altai_api import exceptions as exc
 from openstackclient_base import exceptions as osc_exc
 
-from altai_api.blueprints.projects import link_for_project
+from altai_api.blueprints.projects import (link_for_project,
+                                           invalidate_network_index)
 
 BP = flask.Blueprint('networks', __name__)
 
@@ -117,5 +118,6 @@ def delete_network(net_id):
         client.compute.networks.delete(net_id)
     except osc_exc.NotFound:
         flask.abort(404)
+    invalidate_network_index()
     return make_json_response(None, status_code=204)
 
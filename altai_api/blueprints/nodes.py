@@ -63,12 +63,8 @@ _SCHEMA = Schema((
 ))
 
 
-@BP.route('/', methods=('GET',))
-@root_endpoint('nodes')
-def list_nodes():
-    parse_collection_request(_SCHEMA)
-    host_mgr = g.client_set.compute.hosts
-
+def list_node_views(host_mgr):
+    """Make views of all compute nodes known to host manager"""
     names = [h._info['host_name']
              for h in host_mgr.list_all()
              if h._info['service'] == 'compute']
@@ -79,6 +75,14 @@ def list_nodes():
             result.append(_node_to_view(name, host_mgr.get(name)))
         except osc_exc.NotFound:
             pass
+    return result
+
+
+@BP.route('/', methods=('GET',))
+@root_endpoint('nodes')
+def list_nodes():
+    parse_collection_request(_SCHEMA)
+    result = list_node_views(g.client_set.compute.hosts)
     return make_collection_response('nodes', result)
 
 
@@ -27,7 +27,8 @@ from openstackclient_base import exceptions as osc_exc
 from altai_api.utils import *
 from altai_api.utils.decorators import user_endpoint
 from altai_api.auth import (admin_client_set, assert_admin_or_project_user,
-                            assert_admin, current_user_id)
+                            assert_admin, current_user_id,
+                            invalidate_user_projects)
 
 from altai_api.schema import Schema
 from altai_api.schema import types as st
@@ -98,6 +99,7 @@ def add_project_user(project_id):
         user = _get_user(user_id)  # check that user still exists
         abort(404)  # if user still exists, tenant was removed
 
+    invalidate_user_projects(user.id)
     return make_json_response(link_for_user(user))
 
 
@@ -121,5 +123,6 @@ def remove_project_user(project_id, user_id):
             tenant.remove_user(user_id, role.id)
         except osc_exc.NotFound:
             pass  # already deleted by someone else
+    invalidate_user_projects(user_id)
     return make_json_response(None, status_code=204)
 
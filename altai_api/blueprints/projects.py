@@ -27,12 +27,15 @@ from openstackclient_base import exceptions as osc_exc
 
 from altai_api.utils import *
 from altai_api.utils.decorators import root_endpoint, user_endpoint
+from altai_api.utils.collection import view_fields, is_requested
+from altai_api.utils.parallel import parallel_map
 
 from altai_api.schema import Schema
 from altai_api.schema import types as st
 
 from altai_api.utils.misc import from_mb, to_mb
-from altai_api.auth import admin_client_set
+from altai_api.auth import admin_client_set, invalidate_user_projects
+from altai_api.cache import app_cache, app_single_flight
 
 
 BP = Blueprint('projects', __name__)
@@ -91,17 +94,76 @@ def _project_to_view(tenant, net, quotaset):
     return result
 
 
+def _network_index_cache():
+    return app_cache('project_networks', 1,
+                     app.config['NETWORK_INDEX_CACHE_TTL'])
+
+
+def _load_network_index():
+    index = dict(((net.project_id, net)
+                  for net in admin_client_set().compute.networks.list()
+                  if net.project_id))
+    _network_index_cache().put('index', index)
+    return index
+
+
+def _networks_by_project():
+    """Get dictionary that maps project ids to their networks
+
+    Dictionary is built from one networks.list() call and kept in
+    cache for NETWORK_INDEX_CACHE_TTL seconds.
+
+    """
+    index = _network_index_cache().get('index')
+    if index is None:
+        index = app_single_flight('project_networks').do(
+            'index', _load_network_index)
+    return index
+
+
+def invalidate_network_index():
+    """Forget networks of projects, e.g. after network was associated"""
+    _network_index_cache().clear()
+
+
 def _network_for_project(project_id):
-    for net in admin_client_set().compute.networks.list():
-        if net.project_id == project_id:
-            return net
-    return None
+    return _networks_by_project().get(project_id)
 
 
 def _quotaset_for_project(project_id):
     return admin_client_set().compute.quotas.get(project_id)
 
 
+def _quotasets_for_projects(project_ids):
+    """Get quota sets of several projects
+
+    Nova has no call to get quota sets of many projects at once, so
+    they are requested concurrently. Returns dictionary that maps
+    project ids to quota sets.
+
+    """
+    quotas = admin_client_set().compute.quotas
+    return dict(zip(project_ids, parallel_map(quotas.get, project_ids)))
+
+
+def _projects_to_views(tenants, fields=None):
+    """Convert list of tenants to list of project views
+
+    Networks and quota sets are fetched only when they are needed
+    for elements in fields.
+
+    """
+    if not tenants:
+        return []
+    networks, quotasets = {}, {}
+    if is_requested(fields, 'network'):
+        networks = _networks_by_project()
+    if is_requested(fields, 'cpus-limit', 'ram-limit', 'instances-limit'):
+        quotasets = _quotasets_for_projects([t.id for t in tenants])
+    return [_project_to_view(t, networks.get(t.id), quotasets.get(t.id))
+            for t in tenants]
+
+
 def get_tenant(project_id):
     try:
         if g.is_admin:
@@ -145,6 +207,14 @@ _SCHEMA = Schema((
 )
 
 
+# keys to filter and sort tenants without building views
+_KEYS = {
+    'id': lambda tenant: tenant.id,
+    'name': lambda tenant: tenant.name,
+    'description': lambda tenant: tenant.description
+}
+
+
 @BP.route('/', methods=('GET',))
 @root_endpoint('projects')
 @user_endpoint
@@ -155,16 +225,14 @@ def list_projects():
     else:
         client = admin_client_set().identity_admin
 
-    tenants = client.tenants.list()
-    networks = dict(((net.project_id, net)
-                     for net in admin_client_set().compute.networks.list()
-                     if net.project_id))
     systenant = app.config['SYSTENANT']
     # systenant is special entity, not a 'project' in Altai sense
-    result = [_project_to_view(t, networks.get(t.id),
-                                 _quotaset_for_project(t.id))
-              for t in tenants if t.name != systenant]
-    return make_collection_response(u'projects', result)
+    tenants = [t for t in client.tenants.list() if t.name != systenant]
+    fields = view_fields()
+    return make_collection_response(
+        u'projects', tenants,
+        to_views=lambda page: _projects_to_views(page, fields),
+        keys=_KEYS)
 
 
 def _set_quota(tenant_id, data):
@@ -207,6 +275,8 @@ def create_project():
         tenant.delete()
         raise exc.InvalidRequest('Failed to associate network %r '
                                  'with created project' % data['network'])
+    finally:
+        invalidate_network_index()
     _set_quota(tenant.id, data)
     result = _project_to_view(tenant, networks.get(net.id),
                                 _quotaset_for_project(tenant.id))
@@ -251,11 +321,15 @@ def delete_project(project_id):
     for net in net_client.list():
         if net.project_id == tenant.id:
             net_client.disassociate(net)
+    invalidate_network_index()
 
     try:
         tenant.delete()
     except osc_exc.NotFound:
         pass  # already deleted by someone else
+    # we don't know who were members of the project, so we forget
+    # membership of all users
+    invalidate_user_projects()
     return make_json_response(None, 204)
 
 
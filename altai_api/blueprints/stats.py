@@ -19,43 +19,179 @@
 # License along with this program. If not, see
 # <http://www.gnu.org/licenses/>.
 
-from flask import Blueprint, g, url_for
+from datetime import datetime, timedelta
+from flask import Blueprint, g, url_for, request
+from flask import current_app
 
 from altai_api import auth
+from altai_api import exceptions as exc
 from altai_api.utils import make_json_response
 from altai_api.utils import parse_collection_request, make_collection_response
+from altai_api.utils.collection import get_matcher_argument
 from altai_api.utils.decorators import root_endpoint
 from altai_api.utils.decorators import user_endpoint
+from altai_api.utils.parsers import boolean_from_string
+from altai_api.utils.parallel import parallel_map
 from altai_api.schema import Schema
 from altai_api.schema import types as st
 
+from altai_api.db.stats import StatsDAO, GlobalStats, ProjectStats
+from altai_api.db.stats import StatsHistoryDAO, SAMPLE_VALUES
 from altai_api.blueprints.images import list_all_images
-from altai_api.blueprints.projects import link_for_tenant, get_tenant
+from altai_api.blueprints.nodes import link_for_node
+from altai_api.blueprints.projects import link_for_project, link_for_tenant
+from altai_api.blueprints.projects import get_tenant
 
 BP = Blueprint('stats', __name__)
 
 
-@BP.route('', methods=('GET',))
-@root_endpoint('stats')
-@user_endpoint
-def altai_stats():
+def _count_members(tenant_mgr, tenant_ids, pool_size):
+    """Count members of tenants concurrently
+
+    Users of every tenant are listed only once, even if its id is
+    repeated. Returns dictionary that maps tenant ids to numbers of
+    members.
+
+    """
+    tenant_ids = sorted(set(tenant_ids))
+    counts = parallel_map(
+        lambda tenant_id: len(tenant_mgr.list_users(tenant_id)),
+        tenant_ids, pool_size)
+    return dict(zip(tenant_ids, counts))
+
+
+def compute_stats():
+    """Compute statistics of the whole cloud
+
+    Returns pair (global_stats, project_stats), where global_stats is
+    GlobalStats object and project_stats is list of ProjectStats
+    objects. Objects are not saved to database.
+
+    """
+    computed_at = datetime.utcnow()
     cs = auth.admin_client_set()
-    tenants = cs.identity_admin.tenants.list()
-    users = cs.identity_admin.users.list()
+    systenant_id = auth.default_tenant_id()
+    tenant_mgr = cs.identity_admin.tenants
+    pool_size = current_app.config['FANOUT_POOL_SIZE']
 
+    def list_tenants_and_members():
+        tenants = [tenant for tenant in tenant_mgr.list()
+                   if tenant.id != systenant_id]
+        return tenants, _count_members(tenant_mgr,
+                                       [tenant.id for tenant in tenants],
+                                       pool_size)
+
+    # NOTE: all the services are asked at once, and members
+    # are counted while servers and images are still being listed, so
+    # we wait only for the slowest of them
     # TODO(imelnikov): should we ignore servers in systenant?
-    servers = cs.compute.servers.list(search_opts={'all_tenants': 1})
-    images = list_all_images(cs.image.images)
-    global_images = [image for image in images if image.is_public]
+    (tenants, members), users, servers, images = parallel_map(
+        lambda fetch: fetch(), (
+            list_tenants_and_members,
+            cs.identity_admin.users.list,
+            lambda: cs.compute.servers.list(search_opts={'all_tenants': 1}),
+            lambda: list_all_images(cs.image.images)),
+        pool_size)
+
+    projects = {}
+    for tenant in tenants:
+        projects[tenant.id] = ProjectStats(
+            project_id=tenant.id, project_name=tenant.name,
+            members=members[tenant.id], instances=0,
+            local_images=0, total_images=0,
+            computed_at=computed_at)
+
+    for server in servers:
+        try:
+            projects[server.tenant_id].instances += 1
+        except KeyError:
+            pass
+
+    global_images = 0
+    for image in images:
+        if image.is_public:
+            global_images += 1
+        if image.owner in projects:
+            projects[image.owner].local_images += 1
+            if not image.is_public:
+                projects[image.owner].total_images += 1
+
+    for stats in projects.itervalues():
+        stats.total_images += global_images
+
+    global_stats = GlobalStats(
+        projects=len(projects), instances=len(servers), users=len(users),
+        total_images=len(images), global_images=global_images,
+        computed_at=computed_at)
+    return global_stats, projects.values()
+
+
+def _parse_fresh_arg():
+    """Parse fresh request argument
+
+    Only administrators may ask for statistics that are computed
+    right now instead of the last snapshot.
+
+    """
+    try:
+        fresh = boolean_from_string(request.args['fresh'])
+        g.unused_args.discard('fresh')
+    except KeyError:
+        return False
+    except ValueError:
+        raise exc.InvalidArgumentValue('fresh', 'boolean',
+                                       request.args.get('fresh'))
+    if fresh and not g.is_admin:
+        raise exc.InvalidArgumentValue('fresh', 'boolean', True,
+                                       'Only administrators are allowed '
+                                       'to request fresh statistics')
+    return fresh
 
-    return make_json_response({
-        'projects': len(tenants) - 1,  # not counting systenant
-        'instances': len(servers),
-        'users': len(users),
-        'total-images': len(images),
-        'global-images': len(global_images),
-        'by-project-stats-href': url_for('stats.list_stats_by_project')
-    })
+
+def _recompute_snapshot():
+    global_stats, project_stats = compute_stats()
+    StatsDAO.save(global_stats, project_stats)
+    return global_stats, project_stats
+
+
+def _global_stats():
+    global_stats = None
+    if not _parse_fresh_arg():
+        global_stats = StatsDAO.get_global()
+    if global_stats is None:
+        global_stats = _recompute_snapshot()[0]
+    return global_stats
+
+
+def _project_stats():
+    project_stats = None
+    # NOTE: global statistics is saved with statistics of
+    # projects, so it tells whether snapshot was ever computed
+    if not _parse_fresh_arg() and StatsDAO.get_global() is not None:
+        project_stats = list(StatsDAO.list_projects())
+    if project_stats is None:
+        project_stats = _recompute_snapshot()[1]
+    return project_stats
+
+
+@BP.route('', methods=('GET',))
+@root_endpoint('stats')
+@user_endpoint
+def altai_stats():
+    global_stats = _global_stats()
+    result = {
+        'projects': global_stats.projects,
+        'instances': global_stats.instances,
+        'users': global_stats.users,
+        'total-images': global_stats.total_images,
+        'global-images': global_stats.global_images,
+        'computed-at': global_stats.computed_at,
+        'by-project-stats-href': url_for('stats.list_stats_by_project'),
+        'history-href': url_for('stats.list_stats_history')
+    }
+    if g.is_admin:
+        result['rejected-credentials'] = auth.rejected_credentials_count()
+    return make_json_response(result)
 
 
 _SCHEMA = Schema((
@@ -67,50 +203,145 @@ _SCHEMA = Schema((
 ))
 
 
+def _project_stats_to_view(stats):
+    return {
+        'project': link_for_project(stats.project_id, stats.project_name),
+        'members': stats.members,
+        'instances': stats.instances,
+        'local-images': stats.local_images,
+        'total-images': stats.total_images,
+        'href': url_for('stats.get_project_stats',
+                        project_id=stats.project_id)
+    }
+
+
 @BP.route('/by-project/', methods=('GET',))
 @user_endpoint
 def list_stats_by_project():
     parse_collection_request(_SCHEMA)
-    cs = auth.admin_client_set()
+    project_stats = _project_stats()
 
     if g.my_projects:
         tenants = g.client_set.identity_public.tenants.list()
+        my_ids = set(tenant.id for tenant in tenants)
+        project_stats = [stats for stats in project_stats
+                         if stats.project_id in my_ids]
+
+    data = sorted((_project_stats_to_view(stats)
+                   for stats in project_stats),
+                  key=lambda s: s['href'])
+    return make_collection_response(u'stats', data,
+                                    parent_href=url_for('stats.altai_stats'))
+
+
+_HISTORY_STEPS = {
+    'hour': 3600,
+    'day': 24 * 3600
+}
+
+# by default, history for that many steps is returned
+_DEFAULT_HISTORY_STEPS = 24
+
+
+_HISTORY_SCHEMA = Schema((
+    st.Timestamp('timestamp'),
+    st.LinkObject('project'),
+    st.LinkObject('node'),
+    st.Int('samples'),
+    st.Int('instances'),
+    st.Int('local-images'),
+    st.Int('members'),
+    st.Int('cpus'),
+    st.Int('cpus-used'),
+    st.Int('memory'),
+    st.Int('memory-used')
+))
+
+
+def _parse_step_arg():
+    value = request.args.get('step', 'hour')
+    g.unused_args.discard('step')
+    try:
+        return _HISTORY_STEPS[value]
+    except KeyError:
+        raise exc.InvalidArgumentValue('step', 'string', value,
+                                       'Step should be hour or day')
+
+
+def _history_range(step):
+    """Get time range of requested history
+
+    Range is taken from filters on timestamp, so only samples that
+    may match them are read from database. Filters used are removed:
+    they select samples, not periods samples are aggregated by, so a
+    period is returned if any of its samples are in range, even if
+    the period starts before it.
+
+    """
+    def pop_bounds(*match_types):
+        bounds = [get_matcher_argument('timestamp', match_type,
+                                       delete_if_found=True)
+                  for match_type in match_types]
+        return [bound for bound in bounds if bound is not None]
+
+    eq = pop_bounds('eq')
+    # NOTE: samples are taken at whole seconds, and database
+    #  reads them up to until inclusive
+    bounds = eq + pop_bounds('le') + [
+        bound - timedelta(seconds=1) if not bound.microsecond else bound
+        for bound in pop_bounds('lt')]
+    until = min(bounds) if bounds else datetime.utcnow()
+    bounds = eq + pop_bounds('ge', 'gt')
+    if bounds:
+        since = max(bounds)
     else:
-        tenants = cs.identity_admin.tenants.list()
+        since = until - timedelta(seconds=step * _DEFAULT_HISTORY_STEPS)
+    return since, until
 
-    result = {}
-    for tenant in tenants:
-        if tenant.id != auth.default_tenant_id():
-            users = cs.identity_admin.tenants.list_users(tenant.id)
-            result[tenant.id] = {
-                'project': link_for_tenant(tenant),
-                'members': len(users),
-                'instances': 0,
-                'local-images': 0,
-                'total-images': 0,
-                'href': url_for('stats.get_project_stats',
-                                project_id=tenant.id)
-            }
-
-    for server in cs.compute.servers.list(search_opts={'all_tenants': 1}):
-        try:
-            result[server.tenant_id]['instances'] += 1
-        except KeyError:
-            pass
 
-    global_images = 0
-    for image in list_all_images(cs.image.images):
-        if image.is_public:
-            global_images += 1
-        if image.owner in result:
-            result[image.owner]['local-images'] += 1
-            if not image.is_public:
-                result[image.owner]['total-images'] += 1
+def _sample_to_view(sample, project_names):
+    result = {
+        'timestamp': datetime.utcfromtimestamp(sample.timestamp),
+        'samples': sample.samples
+    }
+    if sample.project_id is not None:
+        # NOTE: project may be already deleted, so we don't
+        # look its name up in identity service
+        result['project'] = {
+            'id': sample.project_id,
+            'name': project_names.get(sample.project_id),
+            'href': url_for('projects.get_project',
+                            project_id=sample.project_id)
+        }
+    if sample.node_name is not None:
+        # NOTE: node name is its id; link objects are
+        #  matched and sorted by id, so we put it there
+        result['node'] = link_for_node(sample.node_name)
+        result['node']['id'] = sample.node_name
+    for name in SAMPLE_VALUES:
+        value = getattr(sample, name)
+        if value is not None:
+            result[name.replace('_', '-')] = value
+    return result
 
-    for value in result.itervalues():
-        value['total-images'] += global_images
-    data = sorted(result.itervalues(), key=lambda s: s['href'])
-    return make_collection_response(u'stats', data,
+
+@BP.route('/history/', methods=('GET',))
+@user_endpoint
+def list_stats_history():
+    parse_collection_request(_HISTORY_SCHEMA)
+    step = _parse_step_arg()
+    since, until = _history_range(step)
+
+    project_ids = None
+    if g.my_projects:
+        project_ids = [tenant.id for tenant in
+                       g.client_set.identity_public.tenants.list()]
+    samples = StatsHistoryDAO.history(step, since, until, project_ids)
+    project_names = dict((stats.project_id, stats.project_name)
+                         for stats in StatsDAO.list_projects())
+
+    result = [_sample_to_view(sample, project_names) for sample in samples]
+    return make_collection_response(u'history', result,
                                     parent_href=url_for('stats.altai_stats'))
 
 
@@ -29,6 +29,8 @@ from altai_api import exceptions as exc
 from altai_api import auth
 from altai_api.utils import *
 from altai_api.utils.decorators import root_endpoint, user_endpoint
+from altai_api.utils.collection import view_fields, is_requested
+from altai_api.utils.parallel import parallel_map
 
 from altai_api.schema import Schema
 from altai_api.schema import types as st
@@ -75,6 +77,28 @@ def _user_is_visible(user, admin_mode):
         return False
 
 
+def project_member_names():
+    """Get names of members of current user's projects
+
+    Besides the current user, these are the only users non-admin
+    can see. Members are listed once per project, concurrently.
+    Returns dictionary that maps user IDs to names.
+
+    """
+    tenant_mgr = auth.admin_client_set().identity_admin.tenants
+
+    def list_members(project_id):
+        try:
+            return tenant_mgr.list_users(project_id)
+        except osc_exc.NotFound:
+            return []  # project was deleted meanwhile
+
+    member_lists = parallel_map(list_members,
+                                sorted(auth.current_user_project_ids()))
+    return dict((user.id, user.name)
+                for members in member_lists for user in members)
+
+
 def _role_is_visible(role):
     if role.tenant['name'] == app.config['SYSTENANT']:
         return False
@@ -96,19 +120,19 @@ def fetch_user(user_id, admin_mode):
 
 def member_role_id():
     """Get ID of member role that is used to add member to project"""
-    for role in g.client_set.identity_admin.roles.list():
-        if role.name.lower() == 'member':
-            return role.id
-    raise RuntimeError('Server misconfiguration: role not found')
-
-
-def user_to_view(user, invite=None, send_code=False):
-    roles = user.list_roles()
-    projects = [link_for_project(r.tenant['id'], r.tenant['name'])
-                for r in roles if _role_is_visible(r)]
-    is_admin = any((r.role["name"].lower() == 'admin'
-                    for r in roles
-                    if r.tenant['name'] == app.config['SYSTENANT']))
+    role_id = auth.role_id('member')
+    if role_id is None:
+        raise RuntimeError('Server misconfiguration: role not found')
+    return role_id
+
+
+def user_to_view(user, invite=None, send_code=False, fields=None):
+    """Convert user to view
+
+    If fields is given, it is a set of element names the view should
+    have; other elements may be omitted.
+
+    """
     href = lambda endpoint: url_for(endpoint, user_id=user.id)
     result = {
         u'id': user.id,
@@ -116,8 +140,6 @@ def user_to_view(user, invite=None, send_code=False):
         u'name': user.name,
         u'email': user.email,
         u'fullname': getattr(user, 'fullname', ''),
-        u'admin': is_admin,
-        u'projects': projects,
         u'completed-registration': user.enabled,
         u'links': {
             u'ssh-keys': href('users_ssh_keys.list_users_ssh_keys'),
@@ -125,6 +147,19 @@ def user_to_view(user, invite=None, send_code=False):
         }
     }
 
+    if is_requested(fields, 'admin', 'projects'):
+        roles = user.list_roles()
+        systenant = app.config['SYSTENANT']
+        result[u'projects'] = [
+            link_for_project(r.tenant['id'], r.tenant['name'])
+            for r in roles if _role_is_visible(r)]
+        result[u'admin'] = any((r.role["name"].lower() == 'admin'
+                                for r in roles
+                                if r.tenant['name'] == systenant))
+
+    if not is_requested(fields, 'invited-at'):
+        return result
+
     if not user.enabled and invite is None:
         invite = InvitesDAO.get_for_user(user.id)
 
@@ -144,6 +179,7 @@ def _grant_admin(user_id):
     auth.assert_admin()
     g.client_set.identity_admin.roles.add_user_role(
         user_id, auth.admin_role_id(), auth.default_tenant_id())
+    auth.invalidate_user_credentials(user_id)
 
 
 def _revoke_admin(user_id):
@@ -158,6 +194,7 @@ def _revoke_admin(user_id):
             user_id, auth.admin_role_id(), auth.default_tenant_id())
     except osc_exc.NotFound:
         pass  # user was not admin
+    auth.invalidate_user_credentials(user_id)
 
 
 def _add_user_to_projects(user, projects):
@@ -198,16 +235,32 @@ _SCHEMA = Schema((
 )
 
 
+# keys to filter and sort users without building views
+_KEYS = {
+    'id': lambda user: user.id,
+    'name': lambda user: user.name,
+    'fullname': lambda user: getattr(user, 'fullname', ''),
+    'email': lambda user: user.email,
+    'completed-registration': lambda user: user.enabled
+}
+
+
 @BP.route('/', methods=('GET',))
 @root_endpoint('users')
 @user_endpoint
 def list_users():
     parse_collection_request(_SCHEMA.list_args)
-    user_mgr = auth.admin_client_set().identity_admin.users
+    users = auth.admin_client_set().identity_admin.users.list()
+    if g.my_projects:
+        visible_ids = set(project_member_names())
+        visible_ids.add(auth.current_user_id())
+        users = [user for user in users if user.id in visible_ids]
+    fields = view_fields()
     return make_collection_response(
-        u'users', [user_to_view(user)
-                   for user in user_mgr.list()
-                   if _user_is_visible(user, not g.my_projects)])
+        u'users', users,
+        to_views=lambda page: [user_to_view(user, fields=fields)
+                               for user in page],
+        keys=_KEYS)
 
 
 @BP.route('/<user_id>', methods=('GET',))
@@ -308,6 +361,8 @@ def update_user_data(user, data):
             user_mgr.update_password(user, data['password'])
     except osc_exc.NotFound:
         abort(404)
+    if 'password' in data or 'enabled' in data:
+        auth.invalidate_user_credentials(user.id)
 
 
 @BP.route('/<user_id>', methods=('PUT',))
@@ -327,6 +382,7 @@ def update_user(user_id):
         _grant_admin(user_id)
     elif admin == False:
         _revoke_admin(user_id)
+    auth.invalidate_user_projects(user_id)
 
     # get updated user
     user = fetch_user(user_id, g.is_admin)
@@ -349,6 +405,8 @@ def delete_user(user_id):
         g.client_set.identity_admin.users.delete(user_id)
     except osc_exc.NotFound:
         abort(404)
+    auth.invalidate_user_credentials(user_id)
+    auth.invalidate_user_projects(user_id)
     return make_json_response(None, status_code=204)
 
 
@@ -0,0 +1,219 @@
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Process-wide caches
+
+Caches live in application extensions dictionary, so every application
+object (and so every test) gets its own set of caches.
+
+"""
+
+import sys
+
+from threading import Lock, Event
+from datetime import datetime, timedelta
+from collections import OrderedDict
+
+from flask import current_app
+
+
+def _now():
+    return datetime.utcnow()
+
+
+class ExpiringCache(object):
+    """Thread-safe LRU cache with per-entry expiration time
+
+    Every entry lives at most ttl seconds. Entry may be given earlier
+    expiration time when it is put into cache. When cache grows
+    larger than max_size entries, least recently used entries are
+    evicted.
+
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = timedelta(seconds=ttl)
+        self._lock = Lock()  # protects self._data
+        self._data = OrderedDict()  # key -> (value, expires_at)
+
+    def get(self, key, default=None):
+        """Get value for key, or default if key is absent or expired"""
+        with self._lock:
+            try:
+                value, expires_at = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires_at <= _now():
+                return default
+            # re-insert to mark entry as most recently used
+            self._data[key] = (value, expires_at)
+            return value
+
+    def put(self, key, value, expires_at=None):
+        """Put value into cache
+
+        If expires_at is given and is earlier than ttl seconds from
+        now, entry expires at expires_at.
+
+        """
+        max_expires_at = _now() + self.ttl
+        if expires_at is None or expires_at > max_expires_at:
+            expires_at = max_expires_at
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove key from cache and return its value"""
+        with self._lock:
+            value, expires_at = self._data.pop(key, (default, None))
+        if expires_at is not None and expires_at <= _now():
+            return default
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def values(self):
+        """Return list of values of entries that are not expired"""
+        now = _now()
+        with self._lock:
+            return [value for value, expires_at in self._data.itervalues()
+                    if expires_at > now]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class FailureCache(object):
+    """Remember recent failures and back off exponentially
+
+    After first failure key is blocked for backoff seconds. Every next
+    failure doubles blocking time, up to max_backoff seconds. Failures
+    are forgotten when key was not blocked for max_backoff seconds.
+
+    """
+
+    def __init__(self, max_size, backoff, max_backoff):
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self._lock = Lock()  # makes failed() atomic
+        # values are (number of failures, blocked until) pairs
+        self._cache = ExpiringCache(max_size, 2 * self.max_backoff)
+
+    def is_blocked(self, key):
+        entry = self._cache.get(key)
+        return entry is not None and entry[1] > _now()
+
+    def failed(self, key):
+        """Register failure for key"""
+        with self._lock:
+            entry = self._cache.get(key)
+            failures = entry[0] + 1 if entry is not None else 1
+            delay = min(self.backoff * 2 ** (failures - 1), self.max_backoff)
+            blocked_until = _now() + timedelta(seconds=delay)
+            forget_at = blocked_until + timedelta(seconds=self.max_backoff)
+            self._cache.put(key, (failures, blocked_until), forget_at)
+
+    def succeeded(self, key):
+        """Forget failures for key"""
+        self._cache.pop(key)
+
+    def blocked_count(self):
+        """Return number of keys that are blocked now"""
+        now = _now()
+        return sum(1 for _, blocked_until in self._cache.values()
+                   if blocked_until > now)
+
+
+class _Call(object):
+    """Function call in progress"""
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """Deduplicate concurrent function calls
+
+    When several threads call the same function with the same key
+    concurrently, the function is called only once, and all the threads
+    get its result (or its exception).
+
+    """
+
+    def __init__(self):
+        self._lock = Lock()  # protects self._calls
+        self._calls = {}
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.exc_info is not None:
+                raise call.exc_info[0], call.exc_info[1], call.exc_info[2]
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def _app_object(name, factory):
+    objects = current_app.extensions.setdefault('altai_api_caches', {})
+    try:
+        return objects[name]
+    except KeyError:
+        return objects.setdefault(name, factory())
+
+
+def app_cache(name, max_size, ttl):
+    """Get process-wide cache with given name, creating it if needed"""
+    return _app_object(name, lambda: ExpiringCache(max_size, ttl))
+
+
+def app_failure_cache(name, max_size, backoff, max_backoff):
+    """Get process-wide FailureCache with given name"""
+    return _app_object(name, lambda: FailureCache(max_size, backoff,
+                                                  max_backoff))
+
+
+def app_single_flight(name):
+    """Get process-wide SingleFlight with given name"""
+    return _app_object(name + ':single-flight', SingleFlight)
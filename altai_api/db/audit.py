@@ -57,7 +57,27 @@ class AuditDAO(object):
 
     @staticmethod
     def list_all():
-        return AuditRecord.query
+        return AuditRecord.query.order_by(AuditRecord.record_id)
+
+    @staticmethod
+    def list_page(after_id=None, offset=None, limit=None):
+        """Get one page of audit log
+
+        Returns number of records that go after record with id
+        after_id (or number of all records if after_id is None) and
+        list of records from requested page of them.
+
+        """
+        query = AuditRecord.query
+        if after_id is not None:
+            query = query.filter(AuditRecord.record_id > after_id)
+        size = query.count()
+        query = query.order_by(AuditRecord.record_id)
+        if offset:
+            query = query.offset(offset)
+        if limit:
+            query = query.limit(limit)
+        return size, query.all()
 
     @staticmethod
     def get(record_id):
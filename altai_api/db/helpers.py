@@ -21,7 +21,7 @@
 
 import sqlalchemy.types
 
-from flask import json
+from altai_api import json_backend
 from altai_api.db import DB
 
 
@@ -29,8 +29,8 @@ class Json(sqlalchemy.types.TypeDecorator):
     impl = DB.Text
 
     def process_bind_param(self, value, dialect):
-        return json.dumps(value)
+        return json_backend.dumps(value)
 
     def process_result_value(self, value, dialect):
-        return json.loads(value)
+        return json_backend.loads(value)
 
@@ -22,6 +22,9 @@
 from altai_api.db import DB
 
 
+_IN_CHUNK_SIZE = 500
+
+
 class InstanceData(DB.Model):
     """Model for Altai-API specific extra instance data"""
     __tablename__ = 'instance_data'
@@ -44,6 +47,25 @@ class InstanceDataDAO(object):
     def get(instance_id):
         return InstanceData.query.get(instance_id)
 
+    @staticmethod
+    def get_many(instance_ids):
+        """Get data for several instances at once
+
+        Returns dictionary that maps instance IDs to data. Instances
+        that have no data are not in the dictionary.
+
+        """
+        instance_ids = list(instance_ids)
+        result = {}
+        # NOTE: some databases limit number of query
+        # parameters, so we split long lists into chunks
+        for start in xrange(0, len(instance_ids), _IN_CHUNK_SIZE):
+            chunk = instance_ids[start:start + _IN_CHUNK_SIZE]
+            query = InstanceData.query.filter(
+                InstanceData.instance_id.in_(chunk))
+            result.update((data.instance_id, data) for data in query)
+        return result
+
     @staticmethod
     def update(instance_id, **kwargs):
         instancedata = InstanceData(instance_id=instance_id)
@@ -0,0 +1,221 @@
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+import calendar
+
+from sqlalchemy import and_, func
+
+from altai_api.db import DB
+
+
+class GlobalStats(DB.Model):
+    """Model for snapshot of statistics of the whole cloud"""
+    __tablename__ = 'global_stats'
+
+    # NOTE: there is only one snapshot, so we use fixed key
+    stats_id = DB.Column(DB.Integer, primary_key=True)
+
+    projects = DB.Column(DB.Integer, nullable=False)
+    instances = DB.Column(DB.Integer, nullable=False)
+    users = DB.Column(DB.Integer, nullable=False)
+    total_images = DB.Column(DB.Integer, nullable=False)
+    global_images = DB.Column(DB.Integer, nullable=False)
+
+    computed_at = DB.Column(DB.DateTime, nullable=False)
+
+
+class ProjectStats(DB.Model):
+    """Model for snapshot of statistics of one project"""
+    __tablename__ = 'project_stats'
+
+    project_id = DB.Column(DB.String(64), primary_key=True)
+    project_name = DB.Column(DB.String(255))
+
+    members = DB.Column(DB.Integer, nullable=False)
+    instances = DB.Column(DB.Integer, nullable=False)
+    local_images = DB.Column(DB.Integer, nullable=False)
+    total_images = DB.Column(DB.Integer, nullable=False)
+
+    computed_at = DB.Column(DB.DateTime, nullable=False)
+
+
+_GLOBAL_STATS_ID = 1
+
+
+class StatsDAO(object):
+
+    @staticmethod
+    def save(global_stats, project_stats):
+        """Replace stored snapshot with new one
+
+        global_stats should be GlobalStats object, and project_stats
+        should be a list of ProjectStats objects. Statistics of projects
+        that are not in project_stats are removed.
+
+        """
+        global_stats.stats_id = _GLOBAL_STATS_ID
+        DB.session.merge(global_stats)
+        ProjectStats.query.delete()
+        for stats in project_stats:
+            DB.session.merge(stats)
+        DB.session.commit()
+
+    @staticmethod
+    def get_global():
+        """Get global statistics, or None if it was never computed"""
+        return GlobalStats.query.get(_GLOBAL_STATS_ID)
+
+    @staticmethod
+    def list_projects():
+        return ProjectStats.query.order_by(ProjectStats.project_id)
+
+
+class StatsSample(DB.Model):
+    """Model for sample of statistics of one project or node
+
+    Raw samples are taken every few minutes. Later they are downsampled
+    into hourly samples, and those into daily ones. Values of downsampled
+    sample are averages of values of samples it replaced.
+
+    """
+    __tablename__ = 'stats_samples'
+
+    sample_id = DB.Column(DB.Integer, primary_key=True, autoincrement=True)
+
+    # NOTE: time is stored as number of seconds since epoch,
+    # so samples can be grouped into periods with plain SQL arithmetic
+    timestamp = DB.Column(DB.Integer, nullable=False, index=True)
+    # length of period sample covers, in seconds; 0 for raw samples
+    period = DB.Column(DB.Integer, nullable=False, default=0)
+    # number of raw samples this sample was computed from
+    samples = DB.Column(DB.Integer, nullable=False, default=1)
+
+    # either project_id or node_name is set
+    project_id = DB.Column(DB.String(64), index=True)
+    node_name = DB.Column(DB.String(255))
+
+    instances = DB.Column(DB.Float)
+    local_images = DB.Column(DB.Float)
+    members = DB.Column(DB.Float)
+    cpus = DB.Column(DB.Float)
+    cpus_used = DB.Column(DB.Float)
+    memory = DB.Column(DB.Float)
+    memory_used = DB.Column(DB.Float)
+
+
+SAMPLE_VALUES = ('instances', 'local_images', 'members',
+                 'cpus', 'cpus_used', 'memory', 'memory_used')
+
+
+def to_epoch(value):
+    """Convert datetime in UTC to number of seconds since epoch"""
+    return calendar.timegm(value.utctimetuple())
+
+
+def _aggregate(step, criterion):
+    """Group samples that match criterion into periods of step seconds
+
+    Returns list of new StatsSample objects, which are not saved.
+    Values are averaged with weights equal to numbers of raw samples.
+
+    """
+    period_start = StatsSample.timestamp - StatsSample.timestamp % step
+    weight = StatsSample.samples
+    columns = [period_start, StatsSample.project_id, StatsSample.node_name,
+               func.sum(weight)]
+    columns.extend(func.sum(getattr(StatsSample, name) * weight)
+                   for name in SAMPLE_VALUES)
+    group = (period_start, StatsSample.project_id, StatsSample.node_name)
+    query = DB.session.query(*columns).filter(criterion)\
+            .group_by(*group).order_by(*group)
+
+    result = []
+    for row in query:
+        samples = int(row[3])
+        values = [None if total is None else float(total) / samples
+                  for total in row[4:]]
+        sample = StatsSample(timestamp=int(row[0]), period=step,
+                             samples=samples, project_id=row[1],
+                             node_name=row[2])
+        for name, value in zip(SAMPLE_VALUES, values):
+            setattr(sample, name, value)
+        result.append(sample)
+    return result
+
+
+class StatsHistoryDAO(object):
+
+    @staticmethod
+    def add_samples(timestamp, samples):
+        """Save raw samples taken at given time
+
+        samples should be a list of StatsSample objects with project_id
+        or node_name and values set.
+
+        """
+        timestamp = to_epoch(timestamp)
+        for sample in samples:
+            sample.timestamp = timestamp
+            sample.period = 0
+            sample.samples = 1
+            DB.session.add(sample)
+        DB.session.commit()
+
+    @staticmethod
+    def rollup(period, before):
+        """Downsample samples taken before given time
+
+        Samples that cover periods shorter than period seconds are
+        replaced with samples that cover period seconds. Only complete
+        periods that ended before given time are downsampled.
+
+        Returns number of new samples.
+
+        """
+        end = to_epoch(before)
+        end -= end % period
+        criterion = and_(StatsSample.period < period,
+                         StatsSample.timestamp < end)
+        result = _aggregate(period, criterion)
+        StatsSample.query.filter(criterion).delete()
+        DB.session.add_all(result)
+        DB.session.commit()
+        return len(result)
+
+    @staticmethod
+    def history(step, since, until, project_ids=None):
+        """Aggregate samples taken between since and until
+
+        Samples are grouped by project or node and by periods of step
+        seconds. If project_ids is not None, only samples of projects
+        with these ids are used. Returns list of StatsSample objects,
+        which are not saved.
+
+        """
+        since = to_epoch(since)
+        criteria = [StatsSample.timestamp >= since - since % step,
+                    StatsSample.timestamp <= to_epoch(until)]
+        if project_ids is not None:
+            project_ids = list(project_ids)
+            if not project_ids:
+                return []
+            criteria.append(StatsSample.project_id.in_(project_ids))
+        return _aggregate(step, and_(*criteria))
@@ -82,8 +82,74 @@ LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 RIP_EXPIRED_INSTANCES_TASK_INTERVAL = 10.0
 INSTANCES_REMINDER_TASK_INTERVAL = 60.0
 INSTANCE_DATA_GC_TASK_INTERVAL = 40 * 60.0
+STATS_SNAPSHOT_TASK_INTERVAL = 5 * 60.0
+STATS_HISTORY_ROLLUP_TASK_INTERVAL = 60 * 60.0
+
+# age of statistics history samples after which raw samples are
+# downsampled to hourly ones, and hourly ones to daily, in seconds
+STATS_HISTORY_RAW_TTL = 2 * 24 * 3600
+STATS_HISTORY_HOURLY_TTL = 60 * 24 * 3600
 
 # request sanity check parameters
 MAX_ELEMENT_NAME_LENGTH = 64
 MAX_PARAMETER_LENGTH = 4096
 
+# authentication cache parameters: maximum number of cached
+# credentials and maximum time to trust them, in seconds; changes
+# of password or rights made through other API process may take
+# AUTH_CACHE_TTL seconds to have effect in this one
+AUTH_CACHE_SIZE = 1024
+AUTH_CACHE_TTL = 60
+
+# credentials that failed authentication are rejected without asking
+# keystone for AUTH_FAILURE_BACKOFF seconds; this time doubles with each
+# next failure, up to AUTH_FAILURE_BACKOFF_MAX seconds
+AUTH_FAILURE_CACHE_SIZE = 4096
+AUTH_FAILURE_BACKOFF = 1.0
+AUTH_FAILURE_BACKOFF_MAX = 60.0
+
+# cache of client sets scoped to projects: maximum number of client
+# sets and maximum time to remember that token can't be scoped to
+# project, in seconds
+SCOPED_CLIENT_SET_CACHE_SIZE = 4096
+SCOPED_CLIENT_SET_NEGATIVE_TTL = 30
+
+# cache of project membership: maximum number of users and maximum
+# time to keep the list of projects user is member of, in seconds
+MEMBERSHIP_CACHE_SIZE = 4096
+MEMBERSHIP_CACHE_TTL = 30
+
+# time to keep role ids and system tenant id, in seconds
+CATALOG_CACHE_TTL = 600
+
+# time to keep index of networks by project they are associated
+# with, in seconds
+NETWORK_INDEX_CACHE_TTL = 60
+
+# pool of API superuser client sets: maximum number of projects
+# to keep client sets for and maximum time to keep them, in seconds
+API_CLIENT_SET_POOL_SIZE = 256
+API_CLIENT_SET_TTL = 3600
+
+# maximum number of concurrent requests to OpenStack services made
+# when listing resources from several projects
+FANOUT_POOL_SIZE = 8
+
+# collections with at least this many elements are sent to client
+# as they are encoded, without building whole response in memory
+STREAM_COLLECTION_MIN_SIZE = 500
+
+# JSON encoder and decoder: 'simplejson', 'json' (standard library),
+# 'ujson' or 'auto' to use the fastest one installed
+JSON_BACKEND = 'auto'
+
+# compress responses with gzip or deflate when client accepts it;
+# responses shorter than COMPRESS_MIN_SIZE bytes are sent as is,
+# COMPRESS_LEVEL is zlib compression level from 1 (fastest) to 9 (best)
+COMPRESS_RESPONSES = False
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+
+# key to sign collection markers with; when not set, key is derived
+# from ALTAI_API_SUPERUSER_PASSWORD
+MARKER_SECRET_KEY = None
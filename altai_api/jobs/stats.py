@@ -0,0 +1,85 @@
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+from datetime import datetime, timedelta
+from flask import current_app
+
+from altai_api.auth import admin_client_set
+from altai_api.db.stats import StatsDAO, StatsHistoryDAO, StatsSample
+from altai_api.blueprints.stats import compute_stats
+from altai_api.blueprints.nodes import list_node_views
+from altai_api.utils.periodic_job import PeriodicAdministrativeJob
+
+
+_HOUR = 3600
+_DAY = 24 * _HOUR
+
+
+def _node_samples():
+    try:
+        nodes = list_node_views(admin_client_set().compute.hosts)
+    except Exception:
+        current_app.logger.exception('Failed to get statistics of nodes')
+        return []
+    return [StatsSample(node_name=node['name'],
+                        cpus=node.get('cpus'),
+                        cpus_used=node.get('cpus-used'),
+                        memory=node.get('memory'),
+                        memory_used=node.get('memory-used'))
+            for node in nodes]
+
+
+def update_stats_snapshot():
+    """Run periodically to recompute statistics snapshot
+
+    Statistics of projects and nodes are also appended to history.
+
+    """
+    global_stats, project_stats = compute_stats()
+    samples = [StatsSample(project_id=stats.project_id,
+                           instances=stats.instances,
+                           local_images=stats.local_images,
+                           members=stats.members)
+               for stats in project_stats]
+    samples.extend(_node_samples())
+
+    StatsDAO.save(global_stats, project_stats)
+    StatsHistoryDAO.add_samples(global_stats.computed_at, samples)
+
+
+def rollup_stats_history():
+    """Run periodically to downsample old statistics history"""
+    now = datetime.utcnow()
+    config = current_app.config
+    StatsHistoryDAO.rollup(_HOUR, now - timedelta(
+        seconds=config['STATS_HISTORY_RAW_TTL']))
+    StatsHistoryDAO.rollup(_DAY, now - timedelta(
+        seconds=config['STATS_HISTORY_HOURLY_TTL']))
+
+
+def jobs_factory(app):
+    result = []
+    for job, interval_param in (
+            (update_stats_snapshot, 'STATS_SNAPSHOT_TASK_INTERVAL'),
+            (rollup_stats_history, 'STATS_HISTORY_ROLLUP_TASK_INTERVAL')):
+        result.append(PeriodicAdministrativeJob(
+            app, app.config[interval_param], job))
+    return result
@@ -0,0 +1,186 @@
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+"""Pluggable JSON encoding and decoding
+
+Backend is chosen with JSON_BACKEND setting. Available backends are
+'simplejson', 'json' (the standard library module) and 'ujson'; 'auto'
+means the fastest one installed. All backends produce and accept the
+same data; datetime objects are encoded as timestamps.
+
+"""
+
+import json
+
+from datetime import datetime
+from flask import current_app, has_app_context
+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def format_timestamp(value):
+    """Convert datetime to string, as it goes to clients"""
+    if value.tzinfo is not None:
+        return value.strftime(_TIMESTAMP_FORMAT)
+    # NOTE: isoformat is much faster than strftime,
+    # but it omits microseconds when there are none
+    if value.microsecond:
+        return value.isoformat() + 'Z'
+    return value.isoformat() + '.000000Z'
+
+
+def json_default(obj):
+    """A function that we use as default= parameter for json.dumps
+
+    Now it just adds serialization of datetime.datetime
+
+    """
+    if isinstance(obj, datetime):
+        return format_timestamp(obj)
+    raise TypeError('%r is not JSON serializable' % obj)
+
+
+def _with_timestamps(data):
+    """Replace datetime objects in data with timestamps
+
+    Needed for encoders that have no default= hook.
+
+    """
+    if isinstance(data, dict):
+        return dict(((key, _with_timestamps(value))
+                     for key, value in data.iteritems()))
+    if isinstance(data, (list, tuple)):
+        return [_with_timestamps(value) for value in data]
+    if isinstance(data, datetime):
+        return format_timestamp(data)
+    return data
+
+
+def _with_object_hook(data, object_hook):
+    """Apply object_hook to all objects in data, innermost first"""
+    if isinstance(data, dict):
+        return object_hook(dict(((key, _with_object_hook(value, object_hook))
+                                 for key, value in data.iteritems())))
+    if isinstance(data, list):
+        return [_with_object_hook(value, object_hook) for value in data]
+    return data
+
+
+class StdlibBackend(object):
+    """Backend that uses json module from standard library"""
+    name = 'json'
+    module = json
+
+    def dumps(self, data):
+        return self.module.dumps(data, separators=(',', ':'),
+                                 default=json_default)
+
+    def loads(self, text, object_hook=None, encoding=None):
+        return self.module.loads(text, object_hook=object_hook,
+                                 encoding=encoding)
+
+
+class SimplejsonBackend(StdlibBackend):
+    """Backend that uses simplejson with C speedups"""
+    name = 'simplejson'
+    module = simplejson
+
+
+class UjsonBackend(object):
+    """Backend that uses ujson"""
+    name = 'ujson'
+
+    def __init__(self):
+        self.options = {'escape_forward_slashes': False}
+        if getattr(ujson, '__version__', '1.').startswith('1.'):
+            # ujson 1.x rounds floats to 10 digits by default
+            self.options['double_precision'] = 15
+
+    def dumps(self, data):
+        # NOTE: ujson has no default= hook, and some versions
+        # encode datetimes as numbers, so we replace them beforehand
+        return ujson.dumps(_with_timestamps(data), **self.options)
+
+    def loads(self, text, object_hook=None, encoding=None):
+        if encoding is not None and isinstance(text, str):
+            text = text.decode(encoding)
+        data = ujson.loads(text)
+        if object_hook is not None:
+            data = _with_object_hook(data, object_hook)
+        return data
+
+
+_BACKENDS = {'json': StdlibBackend()}
+if simplejson is not None:
+    _BACKENDS['simplejson'] = SimplejsonBackend()
+if ujson is not None:
+    _BACKENDS['ujson'] = UjsonBackend()
+
+# fastest goes first; ujson is last because replacing datetimes in
+# Python takes more time than it saves (see tools/benchmark_json.py)
+_AUTO_ORDER = ('simplejson', 'json', 'ujson')
+
+
+def available_backends():
+    """Return names of installed backends, fastest first"""
+    return [name for name in _AUTO_ORDER if name in _BACKENDS]
+
+
+def get_backend(name=None):
+    """Get backend by name
+
+    If name is not given, JSON_BACKEND setting of current application
+    is used, or 'auto' when there is no application context.
+
+    """
+    if name is None:
+        if has_app_context():
+            name = current_app.config.get('JSON_BACKEND', 'auto')
+        else:
+            name = 'auto'
+    if name == 'auto':
+        name = available_backends()[0]
+    try:
+        return _BACKENDS[name]
+    except KeyError:
+        raise RuntimeError('JSON backend %r is not available' % name)
+
+
+def dumps(data):
+    """Encode data to compact JSON"""
+    return get_backend().dumps(data)
+
+
+def loads(text, object_hook=None, encoding=None):
+    """Decode JSON text"""
+    return get_backend().loads(text, object_hook=object_hook,
+                               encoding=encoding)
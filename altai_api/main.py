@@ -40,6 +40,7 @@ from altai_api.db import DB
 
 from altai_api.entry_points import register_entry_points
 from altai_api.jobs import instances as instances_jobs
+from altai_api.jobs import stats as stats_jobs
 
 
 CONFIG_ENV = 'ALTAI_API_SETTINGS'
@@ -130,6 +131,7 @@ def main():
     if not app.config['USE_RELOADER'] \
        or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
         periodic_jobs.extend(instances_jobs.jobs_factory(app))
+        periodic_jobs.extend(stats_jobs.jobs_factory(app))
     try:
         app.run(use_reloader=app.config['USE_RELOADER'],
                 host=app.config['HOST'],
@@ -20,6 +20,7 @@
 # <http://www.gnu.org/licenses/>.
 
 from functools import wraps
+from operator import itemgetter
 
 from altai_api import exceptions as exc
 from altai_api.utils.parsers import (int_from_string,
@@ -80,9 +81,50 @@ def _matchers_plus(dst, matchers):
     return result
 
 
+def compiled_by(compiler):
+    """Attach compiler to matcher
+
+    Compiler takes a pattern and returns a function of one argument
+    that tells if value matches the pattern, exactly as matcher
+    would do, but faster. Intended to be used as decorator.
+
+    """
+    def _decorator(func):
+        func = matcher(func)
+        func.compile = compiler
+        return func
+    return _decorator
+
+
+def _compile_eq(pattern, get=None):
+    if get is None:
+        return lambda value: value is not None and value == pattern
+    return lambda value: value is not None and get(value) == pattern
+
+
+def _compile_in(lst, get=None):
+    try:
+        patterns = frozenset(lst)
+    except TypeError:  # unhashable patterns
+        patterns = lst
+
+    def _match(value):
+        if value is None:
+            return False
+        if get is not None:
+            value = get(value)
+        try:
+            return value in patterns
+        except TypeError:  # unhashable value
+            return value in lst
+    return _match
+
+
 _BASIC_MATCHERS = _matchers_plus({}, (
-    ('eq', lambda value, pattern: value == pattern),
-    ('in', lambda value, lst: value in lst),
+    ('eq', compiled_by(_compile_eq)(
+        lambda value, pattern: value == pattern)),
+    ('in', compiled_by(_compile_in)(
+        lambda value, lst: value in lst)),
     ('exists', exists_matcher)
 ))
 
@@ -231,9 +273,12 @@ class LinkObject(ElementType):
     """'link object' element type"""
 
     def __init__(self, name, **kwargs):
+        get_id = itemgetter('id')
         matchers = {
-            'eq': matcher(lambda value, pattern: value['id'] == pattern),
-            'in': matcher(lambda value, lst: value['id'] in lst),
+            'eq': compiled_by(lambda pattern: _compile_eq(pattern, get_id))(
+                lambda value, pattern: value['id'] == pattern),
+            'in': compiled_by(lambda lst: _compile_in(lst, get_id))(
+                lambda value, lst: value['id'] in lst),
             'exists': exists_matcher
         }
         super(LinkObject, self).__init__(
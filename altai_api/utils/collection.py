@@ -19,46 +19,280 @@
 # License along with this program. If not, see
 # <http://www.gnu.org/licenses/>.
 
-from flask import g, request
+from flask import g, request, current_app, stream_with_context
+from werkzeug.datastructures import MultiDict
+from werkzeug.urls import url_encode
 
 from altai_api import exceptions as exc
 
 from altai_api.utils.parsers import int_from_string
-from altai_api.utils.communication import make_json_response
+from altai_api.utils.communication import (make_json_response,
+                                           make_json_stream_response)
 
-from altai_api.utils.sorting import parse_sortby, apply_sortby
+from altai_api.utils.sorting import (parse_sortby, apply_sortby,
+                                     apply_marker, sort_key_values)
+from altai_api.utils.markers import encode_marker, decode_marker
 from altai_api.utils.filters import parse_filters, apply_filters
 
 
-def make_collection_response(name, elements, parent_href=None):
-    """Return a collection to client"""
+def has_filters():
+    """Check if there are filters left to apply to collection"""
+    filters = getattr(g, 'filters', None)
+    return bool(filters) and any(filters.itervalues())
+
+
+class _ElementKeys(dict):
+    """Keys of raw collection element, with reference to that element"""
+    __slots__ = ('raw',)
+
+
+def _element_keys(element, names, keys):
+    """Compute keys with given names for raw element
+
+    Dotted names go into nested dictionaries, like they are in views.
+    Names must be ordered so that shorter paths go first.
+
+    """
+    result = _ElementKeys()
+    result.raw = element
+    for name in names:
+        path = name.split('.')
+        target = result
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = keys[name](element)
+    return result
+
+
+def _names_to_match(filtered, has_sortby):
+    """Return set of element names needed to filter and sort collection"""
+    names = set()
+    if filtered:
+        names.update((name for name, matchers in g.filters.iteritems()
+                      if matchers))
+    if has_sortby and g.sortby:
+        names.update((name for name, _, _ in g.sortby))
+    return names
+
+
+# elements that are always present in views when fields are requested
+_IDENTITY_FIELDS = frozenset(('id', 'href'))
+
+
+def view_fields():
+    """Return set of element names views of collection should have
+
+    Besides elements requested with fields argument, the set includes
+    elements used in filters and sortby, and elements that identify
+    collection items. Returns None when all the elements are needed.
+
+    """
+    fields = getattr(g, 'fields', None)
+    if fields is None:
+        return None
+    result = set(fields)
+    result.update(_IDENTITY_FIELDS)
+    if getattr(g, 'filters', None):
+        result.update((name for name, matchers in g.filters.iteritems()
+                       if matchers))
+    if getattr(g, 'sortby', None):
+        result.update((name.split('.', 1)[0] for name, _, _ in g.sortby))
+    return result
+
+
+def is_requested(fields, *names):
+    """Whether any of elements with given names should be in view
+
+    fields is a set of element names, like view_fields() returns,
+    or None when all the elements should be in view.
+
+    """
+    return fields is None or any((name in fields for name in names))
+
+
+def _apply_fields(elements):
+    """Remove elements that were not requested from views"""
+    fields = getattr(g, 'fields', None)
+    if fields is None:
+        return elements
+    fields = _IDENTITY_FIELDS.union(fields)
+    return [dict(((key, value) for key, value in element.iteritems()
+                  if key in fields))
+            for element in elements]
+
+
+def make_collection_response(name, elements, parent_href=None,
+                             to_views=None, keys=None, size=None):
+    """Return a collection to client
+
+    If to_views is given, elements are raw objects, and to_views is
+    a function that converts list of them to list of views. Only
+    elements of requested page are converted, if possible.
+
+    keys is a dictionary that maps element names (and sortby names, like
+    'project.id') to functions that cheaply compute the value of
+    that element for a raw object. When all the names used in filters
+    and sortby have such functions, raw objects are filtered and sorted
+    by these values; otherwise all views are built first.
+
+    If size is given, elements are the requested page that backend
+    has already filtered, sorted and paginated, and size is the number
+    of matching elements.
+
+    When fields argument was given, only requested elements are left
+    in views. View builders may use view_fields() to skip computing
+    the rest.
+
+    """
     if getattr(g, 'filters', None):
         g.unused_args.difference_update(
             (arg for arg in request.args.iterkeys() if ':' in arg))
-        elements = apply_filters(elements, g.filters,
-                                 g.collection_schema)
+    g.unused_args.discard('fields')
+    g.unused_args.discard('marker')
+    if size is None:
+        elements, size, to_views = _select_page(elements, to_views, keys)
+    else:
+        g.unused_args.difference_update(('sortby', 'limit', 'offset'))
 
-    # NOTE(imelnikov): size is number of element matching given
-    # criteria -- calculated after filtering
-    size = len(elements)
-
-    if 'sortby' in g.unused_args:
-        g.unused_args.discard('sortby')
-        elements = apply_sortby(g.sortby, elements)
-    elements = _apply_pagination(elements)
+    min_stream_size = current_app.config['STREAM_COLLECTION_MIN_SIZE']
+    streamed = len(elements) >= min_stream_size
+    if to_views is not None and not streamed:
+        elements = to_views(elements)
+        to_views = None
+    next_href = _next_href(elements, size, to_views)
 
     result = {
         u'collection': {
             u'name': name,
             u'size': size
-        },
-        name: elements
+        }
     }
     if parent_href is not None:
         result[u'collection'][u'parent-href'] = parent_href
+    if next_href is not None:
+        result[u'collection'][u'next-href'] = next_href
+    if streamed:
+        # NOTE: views are built as response is sent, so
+        #  building them needs request context kept around
+        views = stream_with_context(
+            _lazy_views(elements, to_views, min_stream_size))
+        return make_json_stream_response(result, name, views)
+    result[name] = _apply_fields(elements)
     return make_json_response(result)
 
 
+def _select_page(elements, to_views, keys):
+    """Filter, sort and paginate collection elements
+
+    Returns requested page, number of elements matching given
+    criteria, and to_views function that is still to be applied
+    to the page (or None).
+
+    """
+    filtered = has_filters()
+    has_sortby = 'sortby' in g.unused_args
+    marker = getattr(g, 'marker', None)
+    keyed = False
+    if to_views is not None and (filtered or has_sortby
+                                 or marker is not None):
+        names = _names_to_match(filtered, has_sortby)
+        if marker is not None:
+            names.add('id')
+        if keys is not None and names.issubset(keys):
+            names = sorted(names, key=lambda n: n.count('.'))
+            elements = [_element_keys(element, names, keys)
+                        for element in elements]
+            keyed = True
+        else:
+            elements = to_views(elements)
+            to_views = None
+
+    if filtered:
+        elements = apply_filters(elements, g.filters,
+                                 g.collection_schema)
+    if marker is not None:
+        elements = _apply_marker(elements, marker)
+
+    # NOTE(imelnikov): size is number of element matching given
+    # criteria -- calculated after filtering
+    size = len(elements)
+
+    if has_sortby:
+        g.unused_args.discard('sortby')
+        elements = apply_sortby(g.sortby, elements, _page_end())
+    elements = _apply_pagination(elements)
+    if keyed:
+        elements = [element.raw for element in elements]
+    return elements, size, to_views
+
+
+def marker_not_found():
+    """Make exception to raise when marked element does not exist"""
+    return exc.InvalidArgumentValue('marker', 'string',
+                                    request.args.get('marker'),
+                                    'Marker element not found')
+
+
+def _apply_marker(elements, marker):
+    values, element_id = marker
+    result = apply_marker(getattr(g, 'sortby', None), elements,
+                          values, element_id,
+                          lambda element: element.get('id'))
+    if result is None:
+        raise marker_not_found()
+    return result
+
+
+def _next_href(page, size, to_views=None):
+    """Make reference to the next page of collection
+
+    If to_views is given, page consists of raw elements that are not
+    converted to views yet. Returns None if there is no next page or
+    it can't be marked.
+
+    """
+    if not getattr(g, 'limit', None) or not page:
+        return None
+    if (g.offset or 0) + len(page) >= size:
+        return None
+    last = page[-1]
+    if to_views is not None:
+        last = to_views([last])[0]
+    element_id = last.get('id') if isinstance(last, dict) else None
+    if element_id is None:
+        return None
+    sortby = request.args.get('sortby')
+    marker = encode_marker(sortby,
+                           sort_key_values(getattr(g, 'sortby', None), last),
+                           element_id)
+    args = MultiDict(request.args)
+    args.pop('offset', None)
+    args['marker'] = marker
+    return '%s%s?%s' % (request.script_root, request.path,
+                        url_encode(args, sort=True))
+
+
+def _lazy_views(elements, to_views, chunk_size):
+    """Convert elements to views chunk by chunk, when they are needed"""
+    for start in xrange(0, len(elements), chunk_size):
+        chunk = elements[start:start + chunk_size]
+        if to_views is not None:
+            chunk = to_views(chunk)
+        for view in _apply_fields(chunk):
+            yield view
+
+
+def _page_end():
+    """Return number of elements up to the end of requested page
+
+    Returns None if all the elements are requested.
+
+    """
+    if g.limit:
+        return (g.offset or 0) + g.limit
+    return None
+
+
 def _apply_pagination(result):
     """Apply previously parsed pagination to given request result."""
     g.unused_args.discard('limit')
@@ -78,6 +312,42 @@ def _parse_int_request_argument(name):
         raise exc.InvalidArgumentValue(name, 'int', value)
 
 
+def _parse_fields(param, schema):
+    """Parse fields request argument
+
+    Returns set of requested element names, or None if all the
+    elements are requested.
+
+    """
+    if param is None:
+        return None
+    allowed = set((t.name for t in schema.info))
+    allowed.update(_IDENTITY_FIELDS)
+    result = set()
+    for name in param.split(','):
+        if name not in allowed:
+            raise exc.InvalidArgumentValue('fields', 'string', param,
+                                           'Unknown element: %r' % name)
+        result.add(name)
+    return result
+
+
+def _parse_marker(param, sortby):
+    """Parse marker request argument
+
+    Returns sort key values and id of the marked element, or None
+    if there is no marker.
+
+    """
+    if param is None:
+        return None
+    marker_sortby, values, element_id = decode_marker(param)
+    if marker_sortby != sortby:
+        raise exc.InvalidArgumentValue('marker', 'string', param,
+                                       'Marker was made for other sortby')
+    return values, element_id
+
+
 def parse_collection_request(schema):
     """Parse request arguments and save them into flask.g for farther use"""
     g.limit = _parse_int_request_argument('limit')
@@ -85,6 +355,28 @@ def parse_collection_request(schema):
     g.collection_schema = schema
     g.sortby = parse_sortby(request.args.get('sortby'), schema.sortby_names)
     g.filters = parse_filters(request.args.iteritems(multi=True), schema)
+    g.fields = _parse_fields(request.args.get('fields'), schema)
+    g.marker = _parse_marker(request.args.get('marker'),
+                             request.args.get('sortby'))
+
+
+def pop_marker_id():
+    """Get marker for backend that applies it itself
+
+    Backends like Nova and Glance return elements that go after the
+    element with given id in their own order. We can pass them the
+    marker only when collection is not sorted. Marker is removed,
+    so it is not applied again.
+
+    Returns None if there is no marker or it can't be passed to
+    backend.
+
+    """
+    marker = getattr(g, 'marker', None)
+    if marker is None or g.sortby:
+        return None
+    g.marker = None
+    return marker[1]
 
 
 def get_matcher_argument(name, match_type, delete_if_found=False):
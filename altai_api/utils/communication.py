@@ -21,11 +21,14 @@
 
 """Miscellaneous utility functions"""
 
+import zlib
+import hashlib
+
 from flask import json, request, abort, g, after_this_request, current_app
-from datetime import datetime
 
 import altai_api
 
+from altai_api import json_backend
 from altai_api.auth import is_authenticated
 from altai_api import exceptions as exc
 from altai_api.utils.parsers import boolean_from_string
@@ -35,23 +38,136 @@ from altai_api.utils.parsers import boolean_from_string
 _JSON = 'application/json'
 _IMPLEMENTATION = 'Altai API service v%s' % altai_api.__version__
 
-_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
+def _set_json_headers(response, add_headers):
+    if add_headers:
+        for header, value in add_headers:
+            response.headers[header] = value
 
-def _json_default(obj):
-    """A function that we use as default= parameter for json.dumps
+    response.headers['Content-Type'] = _JSON
+    if is_authenticated():
+        response.headers['X-GD-Altai-Implementation'] = _IMPLEMENTATION
+    return response
+
+
+# supported content codings and zlib window bits for them,
+# in order of preference
+_CONTENT_CODINGS = (('gzip', 16 + zlib.MAX_WBITS),
+                    ('deflate', zlib.MAX_WBITS))
 
-    Now it just adds serialization of datetime.datetime
+
+def _response_coding():
+    """Choose content coding for response to current request
+
+    Returns pair of coding name and zlib window bits, or None when
+    response should not be compressed.
 
     """
-    if isinstance(obj, datetime):
-        return obj.strftime(_TIMESTAMP_FORMAT)
-    raise TypeError('%r is not JSON serializable' % obj)
+    if not current_app.config.get('COMPRESS_RESPONSES'):
+        return None
+    qualities = dict((value.lower(), quality)
+                     for value, quality in request.accept_encodings)
+    best, best_quality = None, 0
+    for coding in _CONTENT_CODINGS:
+        quality = qualities.get(coding[0], qualities.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def _compressor(wbits):
+    return zlib.compressobj(current_app.config['COMPRESS_LEVEL'],
+                            zlib.DEFLATED, wbits)
+
+
+def _compress_response(response):
+    """Compress response body if client accepts it"""
+    if not current_app.config.get('COMPRESS_RESPONSES'):
+        return response
+    response.vary.add('Accept-Encoding')
+    if len(response.data) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+    coding = _response_coding()
+    if coding is not None:
+        compressor = _compressor(coding[1])
+        response.data = compressor.compress(response.data) + compressor.flush()
+        _set_content_encoding(response, coding)
+    return response
+
+
+def _set_content_encoding(response, coding):
+    response.headers['Content-Encoding'] = coding[0]
+    # compressed body is other representation, so it needs other ETag
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(_coded_etag(etag, coding[0]), weak)
+
+
+def _coded_etag(etag, coding_name):
+    return '%s-%s' % (etag, coding_name)
+
 
+def _compress_stream(compressor, chunks):
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
 
-def make_json_response(data, status_code=200, add_headers=None):
+
+def _is_conditional(status_code):
+    """Whether response may be replaced with 304 Not Modified"""
+    return status_code == 200 and request.method in ('GET', 'HEAD')
+
+
+def _matching_etag(etag):
+    """Find tag from If-None-Match header that matches etag
+
+    Tags of compressed representations of the same response match,
+    too. Returns None if nothing matches.
+
+    """
+    if 'If-None-Match' not in request.headers:
+        return None
+    if_none_match = request.if_none_match
+    if if_none_match.star_tag:
+        return etag
+    for tag in [etag] + [_coded_etag(etag, coding[0])
+                         for coding in _CONTENT_CODINGS]:
+        if if_none_match.contains_weak(tag):
+            return tag
+    return None
+
+
+def _not_modified_response(etag, add_headers):
+    response = current_app.make_response(('', 304))
+    if add_headers:
+        for header, value in add_headers:
+            response.headers[header] = value
+    if current_app.config.get('COMPRESS_RESPONSES'):
+        response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    return response
+
+
+def make_json_response(data, status_code=200, add_headers=None,
+                       etag=None):
     """Make json response from response data.
+
+    Successful responses to GET requests get strong ETag. It is
+    computed from response body unless etag argument is given: it
+    should be version stamp that changes whenever the data changes.
+    When the ETag matches If-None-Match header of the request, 304 Not
+    Modified response with no body is returned instead.
+
     """
+    conditional = _is_conditional(status_code)
+    if conditional and etag is not None:
+        # data is not even encoded when client already has it
+        matching = _matching_etag(etag)
+        if matching is not None:
+            return _not_modified_response(matching, add_headers)
+
     if data is not None:
         if current_app.config['AUDIT_VERBOSITY'] > 0:
             if status_code >= 400 and 'message' in data:
@@ -59,22 +175,95 @@ def make_json_response(data, status_code=200, add_headers=None):
 
         if current_app.config.get('PRETTY_PRINT_JSON'):
             data = json.dumps(data, indent=4, sort_keys=True,
-                              default=_json_default)
+                              default=json_backend.json_default)
             data += '\n'
         else:
-            data = json.dumps(data, separators=(',', ':'),
-                              default=_json_default)
+            data = json_backend.dumps(data)
     else:
         data = ""
+
+    if conditional and etag is None and data:
+        etag = hashlib.sha1(data).hexdigest()
+        matching = _matching_etag(etag)
+        if matching is not None:
+            return _not_modified_response(matching, add_headers)
+
     response = current_app.make_response((data, status_code))
+    if conditional and etag is not None:
+        response.set_etag(etag)
+    return _compress_response(_set_json_headers(response, add_headers))
 
-    if add_headers:
-        for header, value in add_headers:
-            response.headers[header] = value
 
-    response.headers['Content-Type'] = _JSON
-    if is_authenticated():
-        response.headers['X-GD-Altai-Implementation'] = _IMPLEMENTATION
+# approximate size of chunks of streamed JSON responses, in bytes
+_STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def _stream_json(dumps, data, name, elements):
+    """Encode data with list of elements added under name, part by part"""
+    if data:
+        # put the list in place of closing brace
+        yield dumps(data)[:-1] + ','
+    else:
+        yield '{'
+    chunk, length = [dumps(name), ':['], 0
+    for index, element in enumerate(elements):
+        encoded = dumps(element)
+        if index:
+            chunk.append(',')
+        chunk.append(encoded)
+        length += len(encoded)
+        if length >= _STREAM_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk, length = [], 0
+    chunk.append(']}')
+    yield ''.join(chunk)
+
+
+def make_json_stream_response(data, name, elements, add_headers=None,
+                              etag=None):
+    """Make json response that is encoded while it is sent
+
+    Response is JSON object with all the items from dictionary data
+    and list of elements under key name. Elements may be given by any
+    iterable, and are encoded one by one as response is sent, so
+    response body is never kept in memory as a whole. Iterables that
+    need request context should be wrapped with stream_with_context.
+
+    When PRETTY_PRINT_JSON is on, response is not streamed. When
+    client accepts compressed responses, chunks are compressed as they
+    are encoded.
+
+    Headers are sent before the body is encoded, so ETag can't be
+    computed from the body: response to GET request gets ETag only
+    if version stamp is passed as etag argument.
+
+    """
+    if current_app.config.get('PRETTY_PRINT_JSON'):
+        data = dict(data)
+        data[name] = list(elements)
+        return make_json_response(data, add_headers=add_headers, etag=etag)
+
+    conditional = etag is not None and _is_conditional(200)
+    if conditional:
+        matching = _matching_etag(etag)
+        if matching is not None:
+            return _not_modified_response(matching, add_headers)
+
+    # NOTE: elements may be encoded outside of application
+    # context, so we choose JSON backend and compression right now
+    dumps = json_backend.get_backend().dumps
+    chunks = _stream_json(dumps, data, name, elements)
+    coding = _response_coding()
+    if coding is not None:
+        chunks = _compress_stream(_compressor(coding[1]), chunks)
+    response = _set_json_headers(current_app.response_class(chunks),
+                                 add_headers)
+    if conditional:
+        response.set_etag(etag)
+    if current_app.config.get('COMPRESS_RESPONSES'):
+        response.vary.add('Accept-Encoding')
+    if coding is not None:
+        _set_content_encoding(response, coding)
     return response
 
 
@@ -95,7 +284,10 @@ def check_request_headers():
     if request.accept_charsets and 'utf-8' not in request.accept_charsets:
         raise exc.InvalidRequest('Unsupported reply charset: %s'
                                  % request.accept_charsets)
-    if any((key.lower().startswith('if-')
+    # NOTE: only If-None-Match is supported, and only for
+    #  requests that may get 304 Not Modified in return
+    allowed = ('if-none-match',) if request.method in ('GET', 'HEAD') else ()
+    if any((key.lower().startswith('if-') and key.lower() not in allowed
             for key in request.headers.iterkeys())):
         raise exc.InvalidRequest('Unsupported conditional header')
     if not _is_data_request():
@@ -171,8 +363,9 @@ def parse_request_data(allowed=None, required=None):
     # NOTE(imelnikov): we don't use request.json because we want
     # to raise our custom exception and add our custom validation
     try:
-        data = json.loads(request.data, object_hook=_json_object_hook,
-                          encoding=request.mimetype_params.get('charset'))
+        data = json_backend.loads(
+            request.data, object_hook=_json_object_hook,
+            encoding=request.mimetype_params.get('charset'))
     except ValueError, e:
         raise exc.InvalidRequest('JSON decoding error: %s' % e)
 
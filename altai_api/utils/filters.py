@@ -47,14 +47,69 @@ def parse_filters(param_pairs, schema):
     return result
 
 
+# NOTE: we evaluate cheap and selective matchers first;
+# matchers not listed here go last
+_MATCH_TYPE_COST = {
+    'eq': 0,
+    'in': 1,
+    'exists': 2,
+    'startswith': 3,
+    'gt': 4,
+    'ge': 4,
+    'lt': 4,
+    'le': 4
+}
+_DEFAULT_COST = 5
+
+
+def _compile_one(schema, name, match_type, value):
+    """Make predicate for one filter that takes value of resource element"""
+    match = schema.argument_matcher(name, match_type)
+    compile_match = getattr(match, 'compile', None)
+    if compile_match is not None:
+        return compile_match(value)
+    return lambda resource_value: match(resource_value, value)
+
+
+def _step_cost(step):
+    match_type, value = step[1], step[2]
+    cost = _MATCH_TYPE_COST.get(match_type, _DEFAULT_COST)
+    if match_type == 'in':
+        # short lists are more selective
+        return cost, len(value)
+    return cost, 0
+
+
+def compile_filters(parsed_filters, schema):
+    """Compile previously parsed filters into a predicate
+
+    Returns function that takes a resource and returns True if it
+    matches all the filters.
+
+    """
+    steps = sorted(((name, match_type, value)
+                    for name, filters in parsed_filters.iteritems()
+                    for match_type, value in filters.iteritems()),
+                   key=_step_cost)
+    plan = tuple((name, _compile_one(schema, name, match_type, value))
+                 for name, match_type, value in steps)
+
+    if not plan:
+        return lambda resource: True
+    if len(plan) == 1:
+        name, matches = plan[0]
+        return lambda resource: matches(resource.get(name))
+
+    def _predicate(resource):
+        get = resource.get
+        for name, matches in plan:
+            if not matches(get(name)):
+                return False
+        return True
+    return _predicate
+
+
 def apply_filters(result, parsed_filters, schema):
     """Apply previously parsed filters to query results"""
-    compiled_filters = [
-        (name, value, schema.argument_matcher(name, match_type))
-        for name, filters in parsed_filters.iteritems()
-        for match_type, value in filters.iteritems()]
-    return [resource
-            for resource in result
-            if all((matches(resource.get(name), value)
-                    for name, value, matches in compiled_filters))]
-
+    predicate = compile_filters(parsed_filters, schema)
+    return [resource for resource in result if predicate(resource)]
@@ -0,0 +1,107 @@
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Opaque collection markers
+
+Marker tells where previous page of collection ended. It is a
+signed JSON object, so clients can't forge it and we don't have to
+validate its contents thoroughly.
+
+"""
+
+import hmac
+import base64
+import hashlib
+
+from datetime import datetime
+from flask import json, current_app
+
+from altai_api import exceptions as exc
+from altai_api.json_backend import format_timestamp
+from altai_api.utils.parsers import timestamp_from_user
+
+
+def _signing_key():
+    key = current_app.config.get('MARKER_SECRET_KEY')
+    if key:
+        return key
+    # NOTE: every API process knows superuser password,
+    # so markers made by one process are accepted by others
+    return hmac.new(current_app.config['ALTAI_API_SUPERUSER_PASSWORD'],
+                    'marker', hashlib.sha1).digest()
+
+
+def _signature(payload):
+    return hmac.new(_signing_key(), payload, hashlib.sha1).hexdigest()
+
+
+def _signature_matches(signature, payload):
+    """Compare signatures in time that does not depend on contents"""
+    expected = _signature(payload)
+    if len(signature) != len(expected):
+        return False
+    return reduce(lambda acc, pair: acc | (ord(pair[0]) ^ ord(pair[1])),
+                  zip(signature, expected), 0) == 0
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'datetime': format_timestamp(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return timestamp_from_user(value['datetime'])
+    return value
+
+
+def encode_marker(sortby, values, element_id):
+    """Make marker for element with given sort key values and id
+
+    sortby is value of sortby argument the collection was sorted with.
+
+    """
+    payload = base64.urlsafe_b64encode(json.dumps({
+        's': sortby,
+        'k': [_encode_value(value) for value in values],
+        'i': element_id
+    }, separators=(',', ':'))).rstrip('=')
+    return '%s.%s' % (payload, _signature(payload))
+
+
+def decode_marker(marker):
+    """Check marker and return sortby, sort key values and id from it
+
+    Raises InvalidArgumentValue when marker is broken or forged.
+
+    """
+    try:
+        payload, signature = str(marker).rsplit('.', 1)
+        if not _signature_matches(signature, payload):
+            raise ValueError('Bad signature')
+        padding = '=' * (-len(payload) % 4)
+        data = json.loads(base64.urlsafe_b64decode(payload + padding))
+        return (data['s'], [_decode_value(value) for value in data['k']],
+                data['i'])
+    except (ValueError, TypeError, KeyError, UnicodeError):
+        raise exc.InvalidArgumentValue('marker', 'string', marker,
+                                       'Bad marker')
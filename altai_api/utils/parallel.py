@@ -0,0 +1,155 @@
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2012-2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Run independent calls concurrently"""
+
+import sys
+
+from Queue import Queue
+from threading import Thread, Lock, Condition
+from flask import current_app
+
+
+class _Job(object):
+    """Function and items it should be called for"""
+
+    def __init__(self, function, items):
+        self.function = function
+        self.lock = Lock()  # protects items, failed and running
+        self.finished = Condition(self.lock)
+        self.items = enumerate(items)
+        self.failed = False
+        self.running = 0
+        self.results = [None] * len(items)
+        self.errors = [None] * len(items)
+
+    def work(self):
+        """Take items one by one and call function until none are left"""
+        while True:
+            with self.lock:
+                if self.failed:
+                    return
+                try:
+                    index, item = self.items.next()
+                except StopIteration:
+                    return
+                self.running += 1
+            try:
+                self.results[index] = self.function(item)
+            except BaseException:
+                self.errors[index] = sys.exc_info()
+                with self.lock:
+                    self.failed = True
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    if not self.running:
+                        self.finished.notify_all()
+
+    def wait(self):
+        """Wait for calls started by other threads"""
+        with self.lock:
+            while self.running:
+                self.finished.wait()
+
+
+class _Pool(object):
+    """Threads shared by all parallel_map calls
+
+    Threads are started on demand and never stopped. Caller of
+    parallel_map works on its own job, too, and asks only idle threads
+    to help, so nested calls never wait for the pool and the number of
+    threads stays bounded.
+
+    """
+
+    def __init__(self):
+        self.lock = Lock()  # protects threads and idle
+        self.jobs = Queue()
+        self.threads = 0
+        self.idle = 0
+
+    def help(self, job, helpers, max_threads):
+        """Ask up to helpers threads to work on job
+
+        New threads are started while there are less than
+        max_threads of them.
+
+        """
+        with self.lock:
+            from_idle = min(helpers, self.idle)
+            self.idle -= from_idle
+            new_threads = max(0, min(helpers - from_idle,
+                                     max_threads - self.threads))
+            self.threads += new_threads
+        for _ in xrange(new_threads):
+            thread = Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+        for _ in xrange(from_idle + new_threads):
+            self.jobs.put(job)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                job.work()
+            finally:
+                with self.lock:
+                    self.idle += 1
+
+
+_POOL = _Pool()
+
+
+def parallel_map(function, items, pool_size=None):
+    """Call function for every item, running at most pool_size calls at once
+
+    Returns list of results in the order of items. Items are taken in
+    order, and no new calls are started after first failure, so if
+    some calls raise exceptions, the same exception is re-raised as
+    if the calls were made one after another.
+
+    If pool_size is not given, app.config['FANOUT_POOL_SIZE'] is used.
+    Calls are made by the calling thread and threads of the pool shared
+    by all parallel_map calls; the pool has at most pool_size - 1
+    threads, so nested calls do not multiply number of threads.
+
+    Function is called in other threads, without application or request
+    context, so it should not use flask.g, flask.request or current_app.
+
+    """
+    items = list(items)
+    if pool_size is None:
+        pool_size = current_app.config['FANOUT_POOL_SIZE']
+    pool_size = min(pool_size, len(items))
+    if pool_size <= 1:
+        return [function(item) for item in items]
+
+    job = _Job(function, items)
+    _POOL.help(job, pool_size - 1, pool_size - 1)
+    job.work()
+    job.wait()
+
+    for exc_info in job.errors:
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+    return job.results
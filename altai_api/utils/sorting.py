@@ -21,6 +21,7 @@
 
 """Collection sorting"""
 
+import heapq
 
 from altai_api import exceptions as exc
 
@@ -71,33 +72,126 @@ def parse_sortby(param, allowed_names):
             for x in param.split(',')]
 
 
-def _cmp(val1, val2):
-    """Compare two values, considering one of them may be None"""
-    # We make None less than any other value
-    if val1 is None and val2 is None:
-        return 0
-    elif val1 is None:
-        return -1
-    elif val2 is None:
-        return 1
-    else:
-        return cmp(val1, val2)
+class _Inverted(object):
+    """Wrapper that reverses ordering of wrapped values"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __gt__(self, other):
+        return other.value > self.value
+
+    def __le__(self, other):
+        return other.value <= self.value
+
+    def __ge__(self, other):
+        return other.value >= self.value
+
+
+# NOTE: None goes before any other value, so we replace
+# every value with a tuple where first element tells if it is None
+_NONE_KEY = (0,)
+
+
+def _link_id(value):
+    """Replace link object with its id
+
+    Link objects are sorted by id: raw collection elements often have
+    no names and hrefs, so ordering should not depend on them.
+
+    """
+    if isinstance(value, dict) and 'id' in value:
+        return value['id']
+    return value
+
+
+def _sort_key(value, is_asc):
+    value = _link_id(value)
+    value = _NONE_KEY if value is None else (1, value)
+    return value if is_asc else _Inverted(value)
 
 
-def apply_sortby(how, result):
+def _make_key_function(how):
+    """Make function that computes composite sort key for an element"""
+    parts = [(keyfun, is_asc) for _, is_asc, keyfun in how]
+
+    def key(element):
+        return [_sort_key(keyfun(element), is_asc)
+                for keyfun, is_asc in parts]
+    return key
+
+
+def sort_key_values(how, element):
+    """Return values of element sort keys, e.g. to put them into marker"""
+    if how is None:
+        return []
+    return [_link_id(keyfun(element)) for _, _, keyfun in how]
+
+
+def apply_marker(how, result, values, element_id, get_id):
+    """Leave only elements that go after marker in sorted list
+
+    Marker is given by values of sort keys and id of the last element
+    of previous page. Elements with the same sort keys go in the same
+    order as in result, like apply_sortby puts them. If the marked
+    element is gone, elements with the same keys are all kept.
+
+    Returns None when the collection is not sorted and the marked
+    element is not found.
+
+    """
+    how = how or ()
+    key = _make_key_function(how)
+    marker_key = [_sort_key(value, is_asc)
+                  for value, (_, is_asc, _) in zip(values, how)]
+    after, ties = [], []
+    found = False
+    for element in result:
+        element_key = key(element)
+        if marker_key < element_key:
+            after.append(element)
+        elif element_key == marker_key:
+            if found:
+                ties.append(element)
+            elif get_id(element) == element_id:
+                found = True
+                del ties[:]
+            else:
+                ties.append(element)
+    if not found and not how:
+        return None
+    # elements with different keys are put in order by apply_sortby
+    return after + ties
+
+
+# if no more than 1/_HEAP_RATIO of elements is needed, heap is
+# used to select them instead of sorting all the elements
+_HEAP_RATIO = 8
+
+
+def apply_sortby(how, result, count=None):
     """Apply sorting to target.
 
     Takes result of parse_sortby and a list and sorts list as
-    specified.
+    specified. If count is given, only first count elements
+    of sorted list are returned.
+
     """
     if how is None:
-        return result
-
-    def compare(val1, val2):
-        for _, is_asc, keyfun in how:
-            res = _cmp(keyfun(val1), keyfun(val2))
-            if res != 0:
-                return res if is_asc else -res
-        return 0
-    return sorted(list(result), compare)
+        return result if count is None else result[:count]
 
+    key = _make_key_function(how)
+    if count is not None and count * _HEAP_RATIO <= len(result):
+        return heapq.nsmallest(count, result, key=key)
+    result = sorted(result, key=key)
+    return result if count is None else result[:count]
@@ -21,6 +21,8 @@
 
 from flask import g
 from base64 import b64encode
+from datetime import datetime
+from threading import Thread
 
 from openstackclient_base.exceptions import Unauthorized, Forbidden
 
@@ -187,6 +189,46 @@ class CurrentUserProjectIds(MockedTestCase):
             ids = auth.current_user_project_ids()
             self.assertEquals(ids, set(('PID1', 'PID2')))
 
+    def test_current_user_project_ids_cached(self):
+        tenants = [doubles.make(self.mox, doubles.Tenant, id='PID1')]
+        self.fake_client_set.identity_public.tenants.list() \
+                .AndReturn(tenants)
+
+        self.mox.ReplayAll()
+        for _ in xrange(2):
+            with self.app.test_request_context():
+                self.install_fake_auth()
+                ids = auth.current_user_project_ids()
+                self.assertEquals(ids, set(('PID1',)))
+
+    def test_current_user_project_ids_invalidated(self):
+        tenants = [doubles.make(self.mox, doubles.Tenant, id='PID1')]
+        self.fake_client_set.identity_public.tenants.list() \
+                .AndReturn(tenants)
+        self.fake_client_set.identity_public.tenants.list() \
+                .AndReturn([])
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            self.assertEquals(auth.current_user_project_ids(),
+                              set(('PID1',)))
+            auth.invalidate_user_projects(auth.current_user_id())
+            self.assertEquals(auth.current_user_project_ids(), set())
+
+    def test_invalidate_all_user_projects(self):
+        self.fake_client_set.identity_public.tenants.list() \
+                .AndReturn([])
+        self.fake_client_set.identity_public.tenants.list() \
+                .AndReturn([])
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            auth.current_user_project_ids()
+            auth.invalidate_user_projects()
+            auth.current_user_project_ids()
+
 
 class NoAuthEndpointTestCase(MoxTestBase):
 
@@ -407,6 +449,21 @@ class ClientSetForTenantTestCase(MockedTestCase):
             cs = auth.client_set_for_tenant('PID')
             self.assertEquals(cs, tcs)
 
+    def test_tenant_client_set_getter_works_in_thread(self):
+        tcs = self._fake_client_set_factory()
+        self.mock_client_set().AndReturn(tcs)
+        tcs.http_client.authenticate()
+        result = []
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            get_client_set = auth.tenant_client_set_getter()
+        thread = Thread(target=lambda: result.append(get_client_set('PID')))
+        thread.start()
+        thread.join()
+        self.assertEquals(result, [tcs])
+
     def test_client_set_for_tenant_no_auth(self):
         tcs = self._fake_client_set_factory()
         self.mock_client_set().AndReturn(tcs)
@@ -459,6 +516,90 @@ class ClientSetForTenantTestCase(MockedTestCase):
             self.assertNotEquals(getattr(ex, 'exc_type', None),
                                  'AdministratorIsNotMemberOfTenant')
 
+    def test_client_set_for_tenant_cached(self):
+        tcs = self._fake_client_set_factory()
+        self.mock_client_set().AndReturn(tcs)
+        tcs.http_client.authenticate()
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            self.assertEquals(auth.client_set_for_tenant('PID'), tcs)
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            self.assertEquals(auth.client_set_for_tenant('PID'), tcs)
+
+    def test_client_set_for_tenant_failure_cached(self):
+        tcs = self._fake_client_set_factory()
+        self.mock_client_set().AndReturn(tcs)
+        tcs.http_client.authenticate()\
+                .AndRaise(Forbidden('denied'))
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            g.is_admin = False
+            self.assertAborts(403, auth.client_set_for_tenant, 'PID')
+            self.assertAborts(403, auth.client_set_for_tenant, 'PID')
+
+    def test_client_set_for_tenant_failure_expires(self):
+        self.app.config['SCOPED_CLIENT_SET_NEGATIVE_TTL'] = 0
+        tcs = self._fake_client_set_factory()
+        self.mock_client_set().AndReturn(tcs)
+        tcs.http_client.authenticate()\
+                .AndRaise(Forbidden('denied'))
+        tcs2 = self._fake_client_set_factory()
+        self.mock_client_set().AndReturn(tcs2)
+        tcs2.http_client.authenticate()
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            g.is_admin = False
+            self.assertAborts(403, auth.client_set_for_tenant, 'PID')
+            # user was added to the project
+            self.assertEquals(auth.client_set_for_tenant('PID'), tcs2)
+
+    def test_client_set_for_tenant_other_token(self):
+        tcs = self._fake_client_set_factory()
+        self.mock_client_set().AndReturn(tcs)
+        tcs.http_client.authenticate()
+        tcs2 = self._fake_client_set_factory()
+        auth.ClientSet(token='OTHER_TOKEN_ID',
+                       tenant_id='PID',
+                       tenant_name=None,
+                       username=None,
+                       password=None,
+                       auth_uri=self.app.config['KEYSTONE_URI']) \
+                .AndReturn(tcs2)
+        tcs2.http_client.authenticate()
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            self.assertEquals(auth.client_set_for_tenant('PID'), tcs)
+            self.fake_client_set.http_client.access['token']['id'] = \
+                    'OTHER_TOKEN_ID'
+            self.assertEquals(auth.client_set_for_tenant('PID'), tcs2)
+
+    def test_client_set_for_tenant_membership_changed(self):
+        tcs = self._fake_client_set_factory()
+        self.mock_client_set().AndReturn(tcs)
+        tcs.http_client.authenticate()\
+                .AndRaise(Forbidden('denied'))
+        tcs2 = self._fake_client_set_factory()
+        self.mock_client_set().AndReturn(tcs2)
+        tcs2.http_client.authenticate()
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            g.is_admin = False
+            self.assertAborts(403, auth.client_set_for_tenant, 'PID')
+            # user was added to the project
+            auth.invalidate_user_projects('UID')
+            self.assertEquals(auth.client_set_for_tenant('PID'), tcs2)
+
 
 class AdminClientSetTestCase(MockedTestCase):
     FAKE_AUTH = False
@@ -517,6 +658,50 @@ class AuthInfoTestCase(MockedTestCase):
         # look at tests/mocked.py, near line 100
         self.assertEquals(result, u'SYSTENANT_ID')
 
+    def test_default_tenant_id_cached(self):
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            auth.default_tenant_id()
+        with self.app.test_request_context():
+            # no client set at all, so value must come from cache
+            self.assertEquals(auth.default_tenant_id(), u'SYSTENANT_ID')
+
+    def test_role_id(self):
+        self.fake_client_set.identity_admin.roles.list().AndReturn([
+            doubles.make(self.mox, doubles.Role, id=u'AR', name=u'admin'),
+            doubles.make(self.mox, doubles.Role, id=u'MR', name=u'Member')
+        ])
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            self.assertEquals(auth.role_id('member'), u'MR')
+            self.assertEquals(auth.role_id('ADMIN'), u'AR')
+
+    def test_role_id_reloads_on_miss(self):
+        self.fake_client_set.identity_admin.roles.list().AndReturn([
+            doubles.make(self.mox, doubles.Role, id=u'AR', name=u'admin')
+        ])
+        self.fake_client_set.identity_admin.roles.list().AndReturn([
+            doubles.make(self.mox, doubles.Role, id=u'AR', name=u'admin'),
+            doubles.make(self.mox, doubles.Role, id=u'MR', name=u'member')
+        ])
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            self.assertEquals(auth.role_id('admin'), u'AR')
+            self.assertEquals(auth.role_id('member'), u'MR')
+
+    def test_role_id_not_found(self):
+        self.fake_client_set.identity_admin.roles.list().AndReturn([])
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            self.assertEquals(auth.role_id('member'), None)
+
     def test_admin_role_id(self):
         self.mox.ReplayAll()
         with self.app.test_request_context():
@@ -659,6 +844,51 @@ class ApiClientSetTestCase(MockedTestCase):
         with self.app.test_request_context():
             self.assertRaises(RuntimeError, auth.api_client_set, 'PID')
 
+    def test_api_cs_pooled(self):
+        auth._client_set('test_admin', 'test_p@ssw0rd',
+                         tenant_id='PID') \
+                .AndReturn('FAKE_CS')
+        auth.admin_role_id('FAKE_CS').AndReturn('ROLE')
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            cs = auth.api_client_set('PID')
+        with self.app.test_request_context():
+            cs2 = auth.api_client_set('PID')
+        self.assertEquals(cs, 'FAKE_CS')
+        self.assertEquals(cs2, 'FAKE_CS')
+
+    def test_api_cs_pooled_per_project(self):
+        for pid in ('PID1', 'PID2'):
+            auth._client_set('test_admin', 'test_p@ssw0rd',
+                             tenant_id=pid) \
+                    .AndReturn('FAKE_CS_' + pid)
+            auth.admin_role_id('FAKE_CS_' + pid).AndReturn('ROLE')
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.assertEquals(auth.api_client_set('PID1'), 'FAKE_CS_PID1')
+            self.assertEquals(auth.api_client_set('PID2'), 'FAKE_CS_PID2')
+            self.assertEquals(auth.api_client_set('PID1'), 'FAKE_CS_PID1')
+
+    def test_api_cs_added_only_once(self):
+        auth._client_set('test_admin', 'test_p@ssw0rd',
+                         tenant_id='PID') \
+                .AndRaise(Unauthorized('denied'))
+        auth.add_api_superuser_to_project('PID').AndReturn(True)
+        auth._client_set('test_admin', 'test_p@ssw0rd',
+                         tenant_id='PID') \
+                .AndRaise(Unauthorized('denied'))
+        # second call: superuser was already added, so we don't add it
+        auth._client_set('test_admin', 'test_p@ssw0rd',
+                         tenant_id='PID') \
+                .AndRaise(Unauthorized('denied'))
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.assertRaises(RuntimeError, auth.api_client_set, 'PID')
+            self.assertRaises(RuntimeError, auth.api_client_set, 'PID')
+
 
 class BoundClientSetTestCase(MockedTestCase):
 
@@ -698,3 +928,262 @@ class BoundClientSetTestCase(MockedTestCase):
             self.install_fake_auth()
             self.assertAborts(403, auth.bound_client_set)
 
+
+class CredentialsCacheTestCase(MoxTestBase):
+
+    def setUp(self):
+        super(CredentialsCacheTestCase, self).setUp()
+        self.app = make_app()
+        self.app.config['SYSTENANT'] = 'test_default_tenant'
+
+        @self.app.route('/hello')
+        @user_endpoint
+        def hello_():
+            return 'hello, world!'
+
+        @self.app.route('/admin-hello')
+        @admin_endpoint
+        def admin_hello_():
+            return 'hello, admin!'
+
+        self.mox.StubOutWithMock(auth, '_client_set')
+        self.mox.StubOutWithMock(auth, 'admin_role_id')
+        self.mox.StubOutWithMock(auth, 'current_user_id')
+
+    def get_hello(self, user, password):
+        return self.app.test_client().get(
+            '/hello',
+            headers={'Authorization': _basic_auth(user, password)}
+        )
+
+    def test_admin_authenticated_once(self):
+        admin, password = '@Dm33n', 'p@ssw0rd'
+        auth._client_set(admin, password,
+                         tenant_name='test_default_tenant') \
+                .AndReturn('FAKE_CLIENT_SET')
+        for _ in xrange(2):
+            auth.admin_role_id('FAKE_CLIENT_SET').AndReturn('AR_ID')
+            auth.current_user_id().AndReturn('FAKE_UID')
+        self.mox.ReplayAll()
+
+        for _ in xrange(2):
+            rv = self.get_hello(admin, password)
+            self.assertEquals(rv.status_code, 200, rv.data)
+
+    def test_not_admin_remembered(self):
+        user, password = 'u$3R', 'p@ssw0rd'
+        auth._client_set(user, password, tenant_name='test_default_tenant') \
+                .AndRaise(Unauthorized('denied'))
+        auth._client_set(user, password) \
+                .AndReturn('FAKE_CLIENT_SET')
+        for _ in xrange(2):
+            auth.admin_role_id('FAKE_CLIENT_SET').AndReturn(None)
+            auth.current_user_id().AndReturn('FAKE_UID')
+        self.mox.ReplayAll()
+
+        for _ in xrange(2):
+            rv = self.get_hello(user, password)
+            self.assertEquals(rv.status_code, 200, rv.data)
+
+    def test_other_password_not_cached(self):
+        user = 'u$3R'
+        auth._client_set(user, 'p@ssw0rd',
+                         tenant_name='test_default_tenant') \
+                .AndReturn('FAKE_CLIENT_SET')
+        auth.admin_role_id('FAKE_CLIENT_SET').AndReturn('AR_ID')
+        auth.current_user_id().AndReturn('FAKE_UID')
+        auth._client_set(user, 'wrong',
+                         tenant_name='test_default_tenant') \
+                .AndRaise(Unauthorized('denied'))
+        auth._client_set(user, 'wrong') \
+                .AndRaise(Unauthorized('denied'))
+        self.mox.ReplayAll()
+
+        rv = self.get_hello(user, 'p@ssw0rd')
+        self.assertEquals(rv.status_code, 200, rv.data)
+        rv = self.get_hello(user, 'wrong')
+        self.assertEquals(rv.status_code, 403, rv.data)
+
+    def _user_client_set(self, user_id):
+        cs = self.mox.CreateMockAnything()
+        cs.http_client = self.mox.CreateMockAnything()
+        cs.http_client.access = {'user': {'id': user_id}}
+        return cs
+
+    def test_granted_admin_not_remembered_as_user(self):
+        user, password = 'u$3R', 'p@ssw0rd'
+        user_cs = self._user_client_set('UID')
+        admin_cs = self._user_client_set('UID')
+        auth._client_set(user, password, tenant_name='test_default_tenant') \
+                .AndRaise(Unauthorized('denied'))
+        auth._client_set(user, password).AndReturn(user_cs)
+        auth.admin_role_id(user_cs).AndReturn(None)
+        auth.current_user_id().AndReturn('UID')
+        auth._client_set(user, password, tenant_name='test_default_tenant') \
+                .AndReturn(admin_cs)
+        auth.admin_role_id(admin_cs).AndReturn('AR_ID')
+        auth.current_user_id().AndReturn('UID')
+        self.mox.ReplayAll()
+
+        rv = self.get_hello(user, password)
+        self.assertEquals(rv.status_code, 200, rv.data)
+        with self.app.test_request_context():
+            auth.invalidate_user_credentials('UID')
+        rv = self.get_hello(user, password)
+        self.assertEquals(rv.status_code, 200, rv.data)
+
+    def test_changed_password_not_trusted(self):
+        user, password = '@Dm33n', 'p@ssw0rd'
+        admin_cs = self._user_client_set('UID')
+        auth._client_set(user, password, tenant_name='test_default_tenant') \
+                .AndReturn(admin_cs)
+        auth.admin_role_id(admin_cs).AndReturn('AR_ID')
+        auth.current_user_id().AndReturn('UID')
+        auth._client_set(user, password, tenant_name='test_default_tenant') \
+                .AndRaise(Unauthorized('denied'))
+        auth._client_set(user, password) \
+                .AndRaise(Unauthorized('denied'))
+        self.mox.ReplayAll()
+
+        rv = self.get_hello(user, password)
+        self.assertEquals(rv.status_code, 200, rv.data)
+        with self.app.test_request_context():
+            auth.invalidate_user_credentials('UID')
+        rv = self.get_hello(user, password)
+        self.assertEquals(rv.status_code, 403, rv.data)
+
+    def test_failure_remembered(self):
+        user, password = 'u$3R', 'wrong'
+        auth._client_set(user, password, tenant_name='test_default_tenant') \
+                .AndRaise(Unauthorized('denied'))
+        auth._client_set(user, password) \
+                .AndRaise(Unauthorized('denied'))
+        self.mox.ReplayAll()
+
+        # second request is rejected without asking keystone
+        for _ in xrange(2):
+            rv = self.get_hello(user, password)
+            self.assertEquals(rv.status_code, 403, rv.data)
+        with self.app.test_request_context():
+            self.assertEquals(auth.rejected_credentials_count(), 1)
+
+    def test_admin_endpoint_failure_remembered(self):
+        user, password = 'u$3R', 'wrong'
+        auth._client_set(user, password, tenant_name='test_default_tenant') \
+                .AndRaise(Unauthorized('denied'))
+        self.mox.ReplayAll()
+
+        # second request is rejected without asking keystone
+        for _ in xrange(2):
+            rv = self.app.test_client().get(
+                '/admin-hello',
+                headers={'Authorization': _basic_auth(user, password)})
+            self.assertEquals(rv.status_code, 403, rv.data)
+        with self.app.test_request_context():
+            self.assertEquals(auth.rejected_credentials_count(), 1)
+
+    def test_admin_endpoint_failure_does_not_block_user(self):
+        user, password = 'u$3R', 'p@ssw0rd'
+        for _ in xrange(2):
+            auth._client_set(user, password,
+                             tenant_name='test_default_tenant') \
+                    .AndRaise(Unauthorized('denied'))
+        auth._client_set(user, password) \
+                .AndReturn('FAKE_CLIENT_SET')
+        auth.admin_role_id('FAKE_CLIENT_SET').AndReturn(None)
+        auth.current_user_id().AndReturn('FAKE_UID')
+        self.mox.ReplayAll()
+
+        rv = self.app.test_client().get(
+            '/admin-hello',
+            headers={'Authorization': _basic_auth(user, password)})
+        self.assertEquals(rv.status_code, 403, rv.data)
+        rv = self.get_hello(user, password)
+        self.assertEquals(rv.status_code, 200, rv.data)
+
+    def test_token_expires(self):
+        cs = self.mox.CreateMockAnything()
+        cs.http_client = self.mox.CreateMockAnything()
+        cs.http_client.access = {
+            'token': {'expires': '2013-01-01T12:00:00Z'}
+        }
+        self.mox.ReplayAll()
+        self.assertEquals(auth._token_expires(cs),
+                          datetime(2013, 1, 1, 11, 59, 0))
+
+    def test_token_expires_unknown(self):
+        self.mox.ReplayAll()
+        self.assertEquals(auth._token_expires('FAKE_CLIENT_SET'), None)
+
+
+class TokenAuthTestCase(MoxTestBase):
+
+    def setUp(self):
+        super(TokenAuthTestCase, self).setUp()
+        self.app = make_app()
+        self.app.config['SYSTENANT'] = 'test_default_tenant'
+
+        @self.app.route('/hello')
+        @user_endpoint
+        def hello_():
+            assert g.client_set == 'FAKE_CLIENT_SET'
+            return 'hello, world!'
+
+        self.mox.StubOutWithMock(auth, '_client_set')
+        self.mox.StubOutWithMock(auth, 'admin_role_id')
+        self.mox.StubOutWithMock(auth, 'current_user_id')
+
+    def get_hello(self, token):
+        return self.app.test_client().get(
+            '/hello', headers={'X-Auth-Token': token})
+
+    def test_token_as_admin(self):
+        auth._client_set(None, None, 'T0KEN',
+                         tenant_name='test_default_tenant') \
+                .AndReturn('FAKE_CLIENT_SET')
+        auth.admin_role_id('FAKE_CLIENT_SET').AndReturn('AR_ID')
+        auth.current_user_id().AndReturn('FAKE_UID')
+        self.mox.ReplayAll()
+
+        rv = self.get_hello('T0KEN')
+        self.assertEquals(rv.status_code, 200, rv.data)
+
+    def test_token_as_user_validated_once(self):
+        auth._client_set(None, None, 'T0KEN',
+                         tenant_name='test_default_tenant') \
+                .AndRaise(Unauthorized('denied'))
+        auth._client_set(None, None, 'T0KEN') \
+                .AndReturn('FAKE_CLIENT_SET')
+        for _ in xrange(2):
+            auth.admin_role_id('FAKE_CLIENT_SET').AndReturn(None)
+            auth.current_user_id().AndReturn('FAKE_UID')
+        self.mox.ReplayAll()
+
+        for _ in xrange(2):
+            rv = self.get_hello('T0KEN')
+            self.assertEquals(rv.status_code, 200, rv.data)
+
+    def test_bad_token(self):
+        auth._client_set(None, None, 'T0KEN',
+                         tenant_name='test_default_tenant') \
+                .AndRaise(Unauthorized('denied'))
+        auth._client_set(None, None, 'T0KEN') \
+                .AndRaise(Unauthorized('denied'))
+        self.mox.ReplayAll()
+
+        rv = self.get_hello('T0KEN')
+        self.assertEquals(rv.status_code, 403, rv.data)
+
+    def test_basic_auth_preferred(self):
+        auth._client_set('u$3R', 'p@ssw0rd',
+                         tenant_name='test_default_tenant') \
+                .AndReturn('FAKE_CLIENT_SET')
+        auth.admin_role_id('FAKE_CLIENT_SET').AndReturn('AR_ID')
+        auth.current_user_id().AndReturn('FAKE_UID')
+        self.mox.ReplayAll()
+
+        rv = self.app.test_client().get('/hello', headers={
+            'Authorization': _basic_auth('u$3R', 'p@ssw0rd'),
+            'X-Auth-Token': 'T0KEN'
+        })
+        self.assertEquals(rv.status_code, 200, rv.data)
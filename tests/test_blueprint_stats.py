@@ -19,6 +19,9 @@
 # License along with this program. If not, see
 # <http://www.gnu.org/licenses/>.
 
+from datetime import datetime, timedelta
+from mox import IsA
+
 from openstackclient_base import exceptions as osc_exc
 
 from tests import doubles
@@ -26,6 +29,7 @@ from tests.mocked import MockedTestCase
 
 from altai_api import auth
 from altai_api.blueprints import stats
+from altai_api.db.stats import GlobalStats, ProjectStats, StatsSample
 
 
 class StatsTestCase(MockedTestCase):
@@ -35,10 +39,26 @@ class StatsTestCase(MockedTestCase):
         self.mox.StubOutWithMock(auth, 'default_tenant_id')
         self.mox.StubOutWithMock(auth, 'client_set_for_tenant')
         self.mox.StubOutWithMock(stats, 'list_all_images')
+        self.mox.StubOutWithMock(stats, 'StatsDAO')
+        self.mox.StubOutWithMock(stats, 'datetime')
+        self.now = datetime(2013, 2, 3, 4, 5, 6)
+
+    def _expect_compute(self, tenants, users, servers, images):
+        cs = self.fake_client_set
+        stats.datetime.utcnow().AndReturn(self.now)
+        auth.default_tenant_id().AndReturn('SYS')
+        # NOTE: backends are called concurrently, so there
+        # is no particular order between calls to different mocks
+        cs.identity_admin.tenants.list().AndReturn(tenants)
+        cs.identity_admin.users.list().AndReturn(users)
+        cs.compute.servers.list(search_opts={'all_tenants': 1})\
+                .AndReturn(servers)
+        stats.list_all_images(cs.image.images).AndReturn(images)
 
     def test_stats_work(self):
         images = [doubles.make(self.mox, doubles.Image,
-                               id=str(i), name='image%s' % i, is_public=p)
+                               id=str(i), name='image%s' % i,
+                               is_public=p, owner=None)
                   for i, p in enumerate((True, False, False, True, False))]
 
         expected = {
@@ -47,23 +67,58 @@ class StatsTestCase(MockedTestCase):
             'users': 9,
             'total-images': 5,
             'global-images': 2,
-            'by-project-stats-href': u'/v1/stats/by-project/'
+            'rejected-credentials': 0,
+            'computed-at': '2013-02-03T04:05:06.000000Z',
+            'by-project-stats-href': u'/v1/stats/by-project/',
+            'history-href': u'/v1/stats/history/'
         }
-        tenants = ['systenant', 'tenant1', 'tenant2', 'tenant3']
+        tenants = [doubles.make(self.mox, doubles.Tenant,
+                                id=tid, name=tid)
+                   for tid in ('SYS', 'tenant1', 'tenant2', 'tenant3')]
+        servers = [doubles.make(self.mox, doubles.Server,
+                                tenant_id='tenant1')
+                   for i in xrange(14)]
 
-        cs = self.fake_client_set
-        cs.identity_admin.tenants.list().AndReturn(tenants)
-        cs.identity_admin.users.list()\
-                .AndReturn(['user%s' % i for i in xrange(9)])
-        cs.compute.servers.list(search_opts={'all_tenants': 1})\
-                .AndReturn(['instance%s' % i for i in xrange(14)])
-        stats.list_all_images(cs.image.images).AndReturn(images)
+        stats.StatsDAO.get_global().AndReturn(None)
+        self._expect_compute(tenants, ['user%s' % i for i in xrange(9)],
+                             servers, images)
+        for tenant in tenants[1:]:
+            self.fake_client_set.identity_admin.tenants\
+                    .list_users(tenant.id).InAnyOrder().AndReturn([])
+        stats.StatsDAO.save(IsA(GlobalStats), IsA(list))
 
         self.mox.ReplayAll()
         rv = self.client.get('/v1/stats')
         data = self.check_and_parse_response(rv)
         self.assertEquals(expected, data)
 
+    def test_stats_from_snapshot(self):
+        stats.StatsDAO.get_global().AndReturn(GlobalStats(
+            projects=3, instances=14, users=9,
+            total_images=5, global_images=2, computed_at=self.now))
+        self.mox.ReplayAll()
+
+        rv = self.client.get('/v1/stats')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data['projects'], 3)
+        self.assertEquals(data['instances'], 14)
+        self.assertEquals(data['computed-at'], '2013-02-03T04:05:06.000000Z')
+
+    def test_stats_fresh(self):
+        self._expect_compute([], [], [], [])
+        stats.StatsDAO.save(IsA(GlobalStats), [])
+        self.mox.ReplayAll()
+
+        rv = self.client.get('/v1/stats?fresh=true')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data['projects'], 0)
+        self.assertEquals(data['computed-at'], '2013-02-03T04:05:06.000000Z')
+
+    def test_stats_bad_fresh(self):
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/stats?fresh=maybe')
+        self.check_and_parse_response(rv, status_code=400)
+
     def test_list_works(self):
         tenants = [doubles.make(self.mox, doubles.Tenant, **kwargs)
                    for kwargs in (dict(id=u'p1', name=u'test1'),
@@ -78,21 +133,13 @@ class StatsTestCase(MockedTestCase):
                                  dict(id='y', is_public=False, owner='p2'),
                                  dict(id='z', is_public=True, owner='p1'))]
 
-        self.fake_client_set.identity_admin.tenants.list()\
-                .AndReturn(tenants)
-        auth.default_tenant_id().AndReturn('SYS')
+        stats.StatsDAO.get_global().AndReturn(None)
+        self._expect_compute(tenants, [], servers, images)
         self.fake_client_set.identity_admin.tenants.list_users('p1')\
-                .AndReturn([])
-        auth.default_tenant_id().AndReturn('SYS')
+                .InAnyOrder().AndReturn([])
         self.fake_client_set.identity_admin.tenants.list_users('p2')\
-                .AndReturn([])
-        auth.default_tenant_id().AndReturn('SYS')
-
-        self.fake_client_set.compute.servers\
-                .list(search_opts={'all_tenants': 1})\
-                .AndReturn(servers)
-        stats.list_all_images(self.fake_client_set.image.images)\
-                .AndReturn(images)
+                .InAnyOrder().AndReturn(['user1', 'user2'])
+        stats.StatsDAO.save(IsA(GlobalStats), IsA(list))
 
         expected = [
             {
@@ -115,7 +162,7 @@ class StatsTestCase(MockedTestCase):
                     'name': 'test2'
                 },
                 'instances': 1,
-                'members': 0,
+                'members': 2,
                 'local-images': 1,
                 'total-images': 3
             },
@@ -126,26 +173,62 @@ class StatsTestCase(MockedTestCase):
         data = self.check_and_parse_response(rv)
         self.assertEquals(data['stats'], expected)
 
+    def test_count_members_once(self):
+        tenant_mgr = self.fake_client_set.identity_admin.tenants
+        tenant_mgr.list_users('p1').InAnyOrder().AndReturn(['u1', 'u2'])
+        tenant_mgr.list_users('p2').InAnyOrder().AndReturn([])
+        self.mox.ReplayAll()
+
+        result = stats._count_members(tenant_mgr, ['p2', 'p1', 'p2'], 4)
+        self.assertEquals(result, {'p1': 2, 'p2': 0})
+
+    def test_list_from_snapshot(self):
+        stats.StatsDAO.get_global().AndReturn('GLOBAL')
+        stats.StatsDAO.list_projects().AndReturn([
+            ProjectStats(project_id=u'p1', project_name=u'test1',
+                         members=2, instances=3,
+                         local_images=4, total_images=5,
+                         computed_at=self.now)])
+        self.mox.ReplayAll()
+
+        rv = self.client.get('/v1/stats/by-project/')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data['stats'], [{
+            'href': '/v1/stats/by-project/p1',
+            'project': {
+                'href': '/v1/projects/p1',
+                'id': 'p1',
+                'name': 'test1'
+            },
+            'instances': 3,
+            'members': 2,
+            'local-images': 4,
+            'total-images': 5
+        }])
+
     def test_list_for_pure_user(self):
+        tenant = doubles.make(self.mox, doubles.Tenant,
+                              id=u'p2', name=u'test2')
+        stats.StatsDAO.get_global().AndReturn('GLOBAL')
+        stats.StatsDAO.list_projects().AndReturn([
+            ProjectStats(project_id=project_id, project_name=u'test',
+                         members=0, instances=0,
+                         local_images=0, total_images=0,
+                         computed_at=self.now)
+            for project_id in (u'p1', u'p2')])
         self.fake_client_set.identity_public.tenants.list()\
-                .AndReturn([])
-        self.fake_client_set.compute.servers\
-                .list(search_opts={'all_tenants': 1})\
-                .AndReturn([])
-        stats.list_all_images(self.fake_client_set.image.images)\
-                .AndReturn([])
+                .AndReturn([tenant])
         self.mox.ReplayAll()
-        expected = {
-            'collection': {
-                'name': 'stats',
-                'size': 0,
-                'parent-href': '/v1/stats'
-            },
-            'stats': []
-        }
+
         rv = self.client.get('/v1/stats/by-project/?my-projects=True')
         data = self.check_and_parse_response(rv)
-        self.assertEquals(data, expected)
+        self.assertEquals(data['collection'], {
+            'name': 'stats',
+            'size': 1,
+            'parent-href': '/v1/stats'
+        })
+        self.assertEquals([s['project']['id'] for s in data['stats']],
+                          [u'p2'])
 
     def test_project_stats_work(self):
         tcs = self._fake_client_set_factory()
@@ -187,3 +270,123 @@ class StatsTestCase(MockedTestCase):
         rv = self.client.get('/v1/stats/by-project/pid')
         self.check_and_parse_response(rv, 404)
 
+
+class StatsHistoryTestCase(MockedTestCase):
+
+    def setUp(self):
+        super(StatsHistoryTestCase, self).setUp()
+        self.mox.StubOutWithMock(stats, 'StatsDAO')
+        self.mox.StubOutWithMock(stats, 'StatsHistoryDAO')
+        self.since = datetime(2013, 2, 3, 0, 0, 0)
+        self.until = datetime(2013, 2, 4, 0, 0, 0)
+
+    def test_history_works(self):
+        samples = [
+            StatsSample(timestamp=1359849600, samples=12,
+                        node_name=u'node1', cpus=8.0, cpus_used=2.5),
+            StatsSample(timestamp=1359849600, samples=12,
+                        project_id=u'p1', instances=3.0,
+                        local_images=1.0, members=2.0),
+            StatsSample(timestamp=1359849600, samples=12,
+                        project_id=u'p2', instances=0.5,
+                        local_images=0.0, members=1.0)
+        ]
+        # lt bound is exclusive
+        stats.StatsHistoryDAO.history(24 * 3600, self.since,
+                                      self.until - timedelta(seconds=1),
+                                      None).AndReturn(samples)
+        stats.StatsDAO.list_projects().AndReturn([
+            ProjectStats(project_id=u'p1', project_name=u'test1')])
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/stats/history/?step=day'
+                             '&timestamp:ge=2013-02-03T00:00:00Z'
+                             '&timestamp:lt=2013-02-04T00:00:00Z')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data['collection'], {
+            'name': 'history',
+            'size': 3,
+            'parent-href': '/v1/stats'
+        })
+        self.assertEquals(data['history'][0], {
+            'timestamp': '2013-02-03T00:00:00.000000Z',
+            'samples': 12,
+            'node': {
+                'id': 'node1',
+                'name': 'node1',
+                'href': '/v1/nodes/node1'
+            },
+            'cpus': 8.0,
+            'cpus-used': 2.5
+        })
+        self.assertEquals(data['history'][1], {
+            'timestamp': '2013-02-03T00:00:00.000000Z',
+            'samples': 12,
+            'project': {
+                'id': 'p1',
+                'name': 'test1',
+                'href': '/v1/projects/p1'
+            },
+            'instances': 3.0,
+            'local-images': 1.0,
+            'members': 2.0
+        })
+        self.assertEquals(data['history'][2]['project']['name'], None)
+
+    def test_history_for_my_projects(self):
+        tenant = doubles.make(self.mox, doubles.Tenant,
+                              id=u'p2', name=u'test2')
+        self.fake_client_set.identity_public.tenants.list()\
+                .AndReturn([tenant])
+        stats.StatsHistoryDAO.history(3600, self.since, self.until,
+                                      [u'p2']).AndReturn([])
+        stats.StatsDAO.list_projects().AndReturn([])
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/stats/history/?my-projects=true'
+                             '&timestamp:ge=2013-02-03T00:00:00Z'
+                             '&timestamp:le=2013-02-04T00:00:00Z')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data['history'], [])
+
+    def test_history_period_started_before_range(self):
+        since = datetime(2013, 2, 3, 10, 30, 0)
+        samples = [
+            StatsSample(timestamp=1359885600, samples=2,
+                        node_name=u'node1', cpus=8.0, cpus_used=2.5),
+            StatsSample(timestamp=1359885600, samples=2,
+                        node_name=u'node2', cpus=4.0, cpus_used=1.0)
+        ]
+        stats.StatsHistoryDAO.history(3600, since, self.until,
+                                      None).AndReturn(samples)
+        stats.StatsDAO.list_projects().AndReturn([])
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/stats/history/'
+                             '?timestamp:gt=2013-02-03T10:30:00Z'
+                             '&timestamp:le=2013-02-04T00:00:00Z'
+                             '&node:eq=node2')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(len(data['history']), 1)
+        self.assertEquals(data['history'][0]['timestamp'],
+                          '2013-02-03T10:00:00.000000Z')
+        self.assertEquals(data['history'][0]['node']['name'], 'node2')
+
+    def test_history_bad_step(self):
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/stats/history/?step=week')
+        self.check_and_parse_response(rv, status_code=400)
+
+
+class UserStatsTestCase(MockedTestCase):
+    IS_ADMIN = False
+
+    def test_fresh_stats_forbidden(self):
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/stats?fresh=true')
+        self.check_and_parse_response(rv, status_code=400)
+
+    def test_list_fresh_stats_forbidden(self):
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/stats/by-project/?fresh=true')
+        self.check_and_parse_response(rv, status_code=400)
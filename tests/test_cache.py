@@ -0,0 +1,232 @@
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+import unittest
+
+from threading import Thread, Event
+from datetime import datetime, timedelta
+from mox import MoxTestBase
+
+from flask import Flask
+
+from altai_api import cache
+
+
+class ExpiringCacheTestCase(MoxTestBase):
+
+    def setUp(self):
+        super(ExpiringCacheTestCase, self).setUp()
+        self.mox.StubOutWithMock(cache, '_now')
+        self.now = datetime(2013, 1, 1, 12, 0, 0)
+        self.cache = cache.ExpiringCache(max_size=2, ttl=10)
+
+    def at(self, seconds, times=1):
+        for _ in xrange(times):
+            cache._now().AndReturn(self.now + timedelta(seconds=seconds))
+
+    def test_get_missing(self):
+        self.mox.ReplayAll()
+        self.assertEquals(self.cache.get('key'), None)
+        self.assertEquals(self.cache.get('key', 42), 42)
+
+    def test_put_get(self):
+        self.at(0, times=2)
+        self.mox.ReplayAll()
+        self.cache.put('key', 'value')
+        self.assertEquals(self.cache.get('key'), 'value')
+
+    def test_ttl_expires(self):
+        self.at(0)
+        self.at(10)
+        self.mox.ReplayAll()
+        self.cache.put('key', 'value')
+        self.assertEquals(self.cache.get('key', 'expired'), 'expired')
+        self.assertEquals(len(self.cache), 0)
+
+    def test_expires_at_respected(self):
+        self.at(0)
+        self.at(5)
+        self.mox.ReplayAll()
+        self.cache.put('key', 'value',
+                       expires_at=self.now + timedelta(seconds=3))
+        self.assertEquals(self.cache.get('key'), None)
+
+    def test_expires_at_limited_by_ttl(self):
+        self.at(0)
+        self.at(11)
+        self.mox.ReplayAll()
+        self.cache.put('key', 'value',
+                       expires_at=self.now + timedelta(days=1))
+        self.assertEquals(self.cache.get('key'), None)
+
+    def test_lru_eviction(self):
+        self.at(0, times=5)
+        self.mox.ReplayAll()
+        self.cache.put('k1', 'v1')
+        self.cache.put('k2', 'v2')
+        self.assertEquals(self.cache.get('k1'), 'v1')
+        self.cache.put('k3', 'v3')  # k2 is least recently used now
+        self.assertEquals(self.cache.get('k2'), None)
+        self.assertEquals(self.cache.get('k1'), 'v1')
+        self.assertEquals(len(self.cache), 2)
+
+    def test_pop(self):
+        self.at(0, times=2)
+        self.mox.ReplayAll()
+        self.cache.put('key', 'value')
+        self.assertEquals(self.cache.pop('key'), 'value')
+        self.assertEquals(self.cache.pop('key', 'gone'), 'gone')
+
+    def test_clear(self):
+        self.at(0)
+        self.mox.ReplayAll()
+        self.cache.put('key', 'value')
+        self.cache.clear()
+        self.assertEquals(len(self.cache), 0)
+
+
+class FailureCacheTestCase(MoxTestBase):
+
+    def setUp(self):
+        super(FailureCacheTestCase, self).setUp()
+        self.now = datetime(2013, 1, 1, 12, 0, 0)
+        self.cache = cache.FailureCache(max_size=10,
+                                        backoff=1, max_backoff=4)
+        self.mox.stubs.Set(cache, '_now', lambda: self.now)
+
+    def wait(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+    def test_unknown_key_not_blocked(self):
+        self.mox.ReplayAll()
+        self.assertFalse(self.cache.is_blocked('key'))
+        self.assertEquals(self.cache.blocked_count(), 0)
+
+    def test_blocked_after_failure(self):
+        self.mox.ReplayAll()
+        self.cache.failed('key')
+        self.assertTrue(self.cache.is_blocked('key'))
+        self.assertEquals(self.cache.blocked_count(), 1)
+        self.wait(1)
+        self.assertFalse(self.cache.is_blocked('key'))
+        self.assertEquals(self.cache.blocked_count(), 0)
+
+    def test_backoff_doubles(self):
+        self.mox.ReplayAll()
+        self.cache.failed('key')
+        self.wait(1)
+        self.cache.failed('key')
+        self.wait(1.5)
+        self.assertTrue(self.cache.is_blocked('key'))
+        self.wait(0.5)
+        self.assertFalse(self.cache.is_blocked('key'))
+
+    def test_backoff_limited(self):
+        self.mox.ReplayAll()
+        for _ in xrange(10):
+            self.cache.failed('key')
+        self.wait(4)
+        self.assertFalse(self.cache.is_blocked('key'))
+
+    def test_success_forgets_failures(self):
+        self.mox.ReplayAll()
+        for _ in xrange(3):
+            self.cache.failed('key')
+        self.cache.succeeded('key')
+        self.assertFalse(self.cache.is_blocked('key'))
+        self.cache.failed('key')
+        self.wait(1)
+        self.assertFalse(self.cache.is_blocked('key'))
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(SingleFlightTestCase, self).setUp()
+        self.flight = cache.SingleFlight()
+        self.calls = []
+        self.started = Event()
+        self.proceed = Event()
+
+    def slow(self, value):
+        self.calls.append(value)
+        self.started.set()
+        self.proceed.wait(5)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def run_concurrently(self, key, value, count=3):
+        results = []
+
+        def worker():
+            try:
+                results.append(self.flight.do(key, self.slow, value))
+            except Exception, e:
+                results.append(e)
+
+        threads = [Thread(target=worker)]
+        threads[0].start()
+        self.started.wait(5)
+        threads.extend(Thread(target=worker) for _ in xrange(count - 1))
+        for t in threads[1:]:
+            t.start()
+        time.sleep(0.2)  # let followers join the flight
+        self.proceed.set()
+        for t in threads:
+            t.join(5)
+        return results
+
+    def test_single_call(self):
+        self.proceed.set()
+        self.assertEquals(self.flight.do('key', self.slow, 42), 42)
+        self.assertEquals(self.calls, [42])
+        self.assertEquals(self.flight._calls, {})
+
+    def test_concurrent_calls_deduplicated(self):
+        results = self.run_concurrently('key', 42)
+        self.assertEquals(results, [42, 42, 42])
+        self.assertEquals(self.calls, [42])
+        self.assertEquals(self.flight._calls, {})
+
+    def test_exception_shared(self):
+        error = RuntimeError('catch me')
+        results = self.run_concurrently('key', error)
+        self.assertEquals(results, [error, error, error])
+        self.assertEquals(self.calls, [error])
+
+    def test_different_keys_not_deduplicated(self):
+        self.proceed.set()
+        self.flight.do('k1', self.slow, 1)
+        self.flight.do('k2', self.slow, 2)
+        self.assertEquals(self.calls, [1, 2])
+
+
+class AppCacheTestCase(unittest.TestCase):
+
+    def test_app_cache_is_per_app(self):
+        app1, app2 = Flask(__name__), Flask(__name__)
+        with app1.test_request_context():
+            c1 = cache.app_cache('test', 10, 10)
+            self.assertTrue(cache.app_cache('test', 10, 10) is c1)
+        with app2.test_request_context():
+            self.assertFalse(cache.app_cache('test', 10, 10) is c1)
@@ -188,7 +188,8 @@ class AuditLogTestCase(MockedTestCase):
         self.mox.StubOutWithMock(audit_log, 'record_to_view')
 
     def test_list_works(self):
-        audit_log.AuditDAO.list_all().AndReturn(['A1', 'A2'])
+        audit_log.AuditDAO.list_page(None, None, None)\
+                .AndReturn((2, ['A1', 'A2']))
         audit_log.record_to_view('A1').AndReturn('R1')
         audit_log.record_to_view('A2').AndReturn('R2')
         expected = {
@@ -204,6 +205,35 @@ class AuditLogTestCase(MockedTestCase):
         data = self.check_and_parse_response(rv)
         self.assertEquals(data, expected)
 
+    def test_list_next_page(self):
+        audit_log.AuditDAO.list_page(None, None, 2)\
+                .AndReturn((5, ['A1', 'A2']))
+        audit_log.record_to_view('A1').AndReturn({'id': 1})
+        audit_log.record_to_view('A2').AndReturn({'id': 2})
+        audit_log.AuditDAO.list_page(2, None, 2)\
+                .AndReturn((3, ['A3', 'A4']))
+        audit_log.record_to_view('A3').AndReturn({'id': 3})
+        audit_log.record_to_view('A4').AndReturn({'id': 4})
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/audit-log/?limit=2')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data['audit-log'], [{'id': 1}, {'id': 2}])
+        rv = self.client.get(data['collection']['next-href'])
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data['collection']['size'], 3)
+        self.assertEquals(data['audit-log'], [{'id': 3}, {'id': 4}])
+
+    def test_list_filtered(self):
+        audit_log.AuditDAO.list_all().AndReturn(['A1', 'A2'])
+        audit_log.record_to_view('A1').AndReturn({'method': 'GET'})
+        audit_log.record_to_view('A2').AndReturn({'method': 'POST'})
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/audit-log/?method:eq=POST')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data['audit-log'], [{'method': 'POST'}])
+
     def test_get_works(self):
         record_id = 'RID'
         audit_log.AuditDAO.get(record_id).AndReturn('RECORD')
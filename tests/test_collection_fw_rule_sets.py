@@ -63,6 +63,7 @@ class RuleSetsTestCase(MockedTestCase):
     def setUp(self):
         super(RuleSetsTestCase, self).setUp()
         self.mox.StubOutWithMock(fw_rule_sets, 'client_set_for_tenant')
+        self.mox.StubOutWithMock(fw_rule_sets, 'tenant_client_set_getter')
         self.mox.StubOutWithMock(fw_rule_sets, '_sg_to_view')
 
     def test_list_works(self):
@@ -74,16 +75,13 @@ class RuleSetsTestCase(MockedTestCase):
         self.fake_client_set.identity_admin.tenants.list().AndReturn(tenants)
 
         tcs1 = mock_client_set(self.mox)
-        fw_rule_sets.client_set_for_tenant(u'PID1', fallback_to_api=True) \
-                .AndReturn(tcs1)
+        tcs2 = mock_client_set(self.mox)
+        fw_rule_sets.tenant_client_set_getter(fallback_to_api=True) \
+                .AndReturn({u'PID1': tcs1, u'PID2': tcs2}.get)
         tcs1.compute.security_groups.list().AndReturn(['SG1', 'SG2'])
+        tcs2.compute.security_groups.list().AndReturn(['SG3'])
         fw_rule_sets._sg_to_view('SG1', tenants[0].name).AndReturn('REPLY1')
         fw_rule_sets._sg_to_view('SG2', tenants[0].name).AndReturn('REPLY2')
-
-        tcs2 = mock_client_set(self.mox)
-        fw_rule_sets.client_set_for_tenant(u'PID2', fallback_to_api=True) \
-                .AndReturn(tcs2)
-        tcs2.compute.security_groups.list().AndReturn(['SG3'])
         fw_rule_sets._sg_to_view('SG3', tenants[2].name).AndReturn('REPLY3')
 
         expected = {
@@ -106,8 +104,8 @@ class RuleSetsTestCase(MockedTestCase):
         self.fake_client_set.identity_public.tenants.list().AndReturn([tenant])
 
         tcs1 = mock_client_set(self.mox)
-        fw_rule_sets.client_set_for_tenant(u'PID1', fallback_to_api=True) \
-                .AndReturn(tcs1)
+        fw_rule_sets.tenant_client_set_getter(fallback_to_api=True) \
+                .AndReturn({u'PID1': tcs1}.get)
         tcs1.compute.security_groups.list().AndReturn(['SG1'])
         fw_rule_sets._sg_to_view('SG1', tenant.name).AndReturn('REPLY1')
 
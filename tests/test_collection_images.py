@@ -188,6 +188,27 @@ class ImageFromNovaWorks(MockedTestCase):
             data = images._image_to_view(image)
         self.assertEquals(data, expected)
 
+    def test_ami_image_to_view_uses_remembered_names(self):
+        image = doubles.make(self.mox, doubles.Image,
+                             id=u'IMAGE', name=u'TestImage',
+                             owner=None, created_at='2012-10-15T01:43:00',
+                             properties={u'kernel_id': u'KERNEL',
+                                         u'ramdisk_id': u'RAMDISK'})
+        kernel = doubles.make(self.mox, doubles.Image,
+                              id=u'KERNEL', name=u'TestKernel')
+        ramdisk = doubles.make(self.mox, doubles.Image,
+                               id=u'RAMDISK', name=u'TestRamdisk')
+
+        # no calls to glance expected
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            image.owner = images.auth.default_tenant_id()
+            images.remember_image_names([image, kernel, ramdisk])
+            data = images._image_to_view(image)
+        self.assertEquals(data['kernel'][u'name'], u'TestKernel')
+        self.assertEquals(data['ramdisk'][u'name'], u'TestRamdisk')
+
 
 class ListImagesTestCase(MockedTestCase):
 
@@ -269,9 +290,11 @@ class ListImagesTestCase(MockedTestCase):
         images.auth.client_set_for_tenant(tenant.id, fallback_to_api=True) \
                 .AndReturn(tcs)
         tcs.image.images.list(filters={'is_public': None}) \
-                .AndReturn(['ii1', 'ii2'])
-        images._image_to_view('ii1', self.tenants[0]).AndReturn('I1')
-        images._image_to_view('ii2', self.tenants[1]).AndReturn('I2')
+                .AndReturn(self.images[:2])
+        images._image_to_view(self.images[0], self.tenants[0]) \
+                .AndReturn('I1')
+        images._image_to_view(self.images[1], self.tenants[1]) \
+                .AndReturn('I2')
 
         expected = {
             u'collection': {
@@ -393,8 +416,8 @@ class ImagesAsUserTestCase(MockedTestCase):
                                           fallback_to_api=False) \
                 .AndReturn(tcs)
         tcs.image.images.list(filters={'is_public': None}) \
-                .AndReturn(['ii1'])
-        images._image_to_view('ii1', self.tenant).AndReturn('I1')
+                .AndReturn(self.images[:1])
+        images._image_to_view(self.images[0], self.tenant).AndReturn('I1')
 
         self.mox.ReplayAll()
         rv = self.client.get(u'/v1/images/?project:for=%s' % self.tenant.id)
@@ -415,8 +438,9 @@ class ImagesAsUserTestCase(MockedTestCase):
                                           fallback_to_api=False) \
                 .AndReturn(tcs)
         tcs.image.images.list(filters={'is_public': False}) \
-                .AndReturn(['ii1'])
-        images._image_to_view('ii1', self.tenant).AndReturn(fake_image_dict)
+                .AndReturn(self.images[:1])
+        images._image_to_view(self.images[0], self.tenant) \
+                .AndReturn(fake_image_dict)
 
         self.mox.ReplayAll()
         rv = self.client.get(u'/v1/images/?project:eq=%s' % self.tenant.id)
@@ -437,8 +461,9 @@ class ImagesAsUserTestCase(MockedTestCase):
                                           fallback_to_api=False) \
                 .AndReturn(tcs)
         tcs.image.images.list(filters={'is_public': False}) \
-                .AndReturn(['ii1'])
-        images._image_to_view('ii1', self.tenant).AndReturn(fake_image_dict)
+                .AndReturn(self.images[:1])
+        images._image_to_view(self.images[0], self.tenant) \
+                .AndReturn(fake_image_dict)
 
         self.mox.ReplayAll()
         rv = self.client.get(u'/v1/images/?project:in=%s' % self.tenant.id)
@@ -770,6 +795,28 @@ class LinkForImageTestCase(MockedTestCase):
             result = images.link_for_image('IMG')
         self.assertEquals(result, expected)
 
+    def test_link_for_image_remembered(self):
+        image = doubles.make(self.mox, doubles.Image,
+                             id=u'IMG', owner=u'PID', name='test image')
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            images.remember_image_names([image])
+            result = images.link_for_image('IMG')
+        self.assertEquals(result['name'], 'test image')
+
+    def test_link_for_image_fetches_once(self):
+        self.fake_client_set.image.images.get('IMG') \
+                .AndRaise(osc_exc.NotFound('failure'))
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            first = images.link_for_image('IMG')
+            second = images.link_for_image('IMG')
+        self.assertEquals(first, second)
+        self.assertEquals(second['name'], None)
+
 
 class ImageDownloadTestCase(MockedTestCase):
 
@@ -213,6 +213,25 @@ class AddProjectUserTestCase(MockedTestCase):
         data = self.check_and_parse_response(rv)
         self.assertEquals(data, expected)
 
+    def test_add_invalidates_membership(self):
+        ia = self.fake_client_set.identity_admin
+        self.mox.StubOutWithMock(project_users, 'invalidate_user_projects')
+
+        ia.tenants.get(self.project_id).AndReturn(self.tenant)
+        ia.users.get(self.user_id).AndReturn(self.user)
+        ia.roles.list().AndReturn([
+            doubles.make(self.mox, doubles.Role, id=u'MR', name=u'member')
+        ])
+        self.tenant.add_user(self.user_id, u'MR')
+        project_users.invalidate_user_projects(self.user_id)
+
+        self.mox.ReplayAll()
+        params = {'id': self.user_id}
+        rv = self.client.post('/v1/projects/%s/users/' % self.project_id,
+                              content_type='application/json',
+                              data=json.dumps(params))
+        self.check_and_parse_response(rv)
+
     def test_add_tenant_suddenly_removed(self):
         ia = self.fake_client_set.identity_admin
 
@@ -326,6 +345,21 @@ class RemoveProjectUserTestCase(MockedTestCase):
                                 % (self.project_id, self.user_id))
         self.check_and_parse_response(rv, status_code=204)
 
+    def test_remove_invalidates_membership(self):
+        ia = self.fake_client_set.identity_admin
+        self.mox.StubOutWithMock(project_users, 'invalidate_user_projects')
+
+        ia.tenants.get(self.project_id).AndReturn(self.tenant)
+        ia.users.list_roles(self.user_id, self.project_id)\
+                .AndReturn(self.roles[1:])
+        self.tenant.remove_user(u'UID', u'MR')
+        project_users.invalidate_user_projects(self.user_id)
+
+        self.mox.ReplayAll()
+        rv = self.client.delete('/v1/projects/%s/users/%s'
+                                % (self.project_id, self.user_id))
+        self.check_and_parse_response(rv, status_code=204)
+
     def test_remove_no_tenant(self):
         ia = self.fake_client_set.identity_admin
 
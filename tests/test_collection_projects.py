@@ -186,6 +186,7 @@ class UserProjectsTestCase(MockedTestCase):
         self.tm_mock = self.fake_client_set.identity_public.tenants
 
         self.mox.StubOutWithMock(projects, '_quotaset_for_project')
+        self.mox.StubOutWithMock(projects, '_quotasets_for_projects')
         self.mox.StubOutWithMock(projects, '_project_to_view')
         self.mox.StubOutWithMock(projects, '_network_for_project')
 
@@ -234,11 +235,12 @@ class UserProjectsTestCase(MockedTestCase):
 
         self.tm_mock.list().AndReturn(tenants)
         self.nm_mock.list().AndReturn(nets)
-        projects._quotaset_for_project(u't1').AndReturn('QUOTA1')
+        projects._quotasets_for_projects([u't1', u't2']).AndReturn({
+            u't1': 'QUOTA1',
+            u't2': 'QUOTA2'
+        })
         projects._project_to_view(tenants[0], nets[2], 'QUOTA1')\
                 .AndReturn('PROJECT1')
-
-        projects._quotaset_for_project(u't2').AndReturn('QUOTA2')
         projects._project_to_view(tenants[1], nets[0], 'QUOTA2')\
                 .AndReturn('PROJECT2')
 
@@ -268,6 +270,7 @@ class ProjectsTestCase(MockedTestCase):
         self.tm_mock = self.fake_client_set.identity_admin.tenants
 
         self.mox.StubOutWithMock(projects, '_quotaset_for_project')
+        self.mox.StubOutWithMock(projects, '_quotasets_for_projects')
         self.mox.StubOutWithMock(projects, '_project_to_view')
         self.mox.StubOutWithMock(projects, '_network_for_project')
 
@@ -317,11 +320,12 @@ class ProjectsTestCase(MockedTestCase):
 
         self.tm_mock.list().AndReturn(tenants)
         self.nm_mock.list().AndReturn(nets)
-        projects._quotaset_for_project(u't1').AndReturn('QUOTA1')
+        projects._quotasets_for_projects([u't1', u't2']).AndReturn({
+            u't1': 'QUOTA1',
+            u't2': 'QUOTA2'
+        })
         projects._project_to_view(tenants[0], nets[2], 'QUOTA1')\
                 .AndReturn('PROJECT1')
-
-        projects._quotaset_for_project(u't2').AndReturn('QUOTA2')
         projects._project_to_view(tenants[1], nets[0], 'QUOTA2')\
                 .AndReturn('PROJECT2')
 
@@ -339,6 +343,73 @@ class ProjectsTestCase(MockedTestCase):
         data = self.check_and_parse_response(rv)
         self.assertEquals(data, expected)
 
+    def test_get_projects_names_only(self):
+        tenants = (
+            doubles.make(self.mox, doubles.Tenant, name=u'tnt1', id=u't1'),
+            doubles.make(self.mox, doubles.Tenant, name=u'tnt2', id=u't2'))
+
+        self.tm_mock.list().AndReturn(tenants)
+        # neither networks nor quotas are requested
+        projects._project_to_view(tenants[0], None, None)\
+                .AndReturn({u'id': u't1', u'name': u'tnt1'})
+        projects._project_to_view(tenants[1], None, None)\
+                .AndReturn({u'id': u't2', u'name': u'tnt2'})
+
+        self.mox.ReplayAll()
+
+        rv = self.client.get('/v1/projects/?fields=name')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals([p['name'] for p in data['projects']],
+                          [u'tnt1', u'tnt2'])
+
+
+class ProjectsAdminCallsTestCase(MockedTestCase):
+
+    def setUp(self):
+        super(ProjectsAdminCallsTestCase, self).setUp()
+        self.mox.StubOutWithMock(projects, 'admin_client_set')
+        projects.admin_client_set().MultipleTimes() \
+                .AndReturn(self.fake_client_set)
+
+    def test_networks_index_is_cached(self):
+        nets = (
+            doubles.make(self.mox, doubles.Network,
+                         label=u'net2', id=u'netid2', project_id=u't2'),
+            doubles.make(self.mox, doubles.Network,
+                         label=u'net_', id=u'netid_', project_id=None))
+        self.fake_client_set.compute.networks.list().AndReturn(nets)
+        self.mox.ReplayAll()
+
+        with self.app.test_request_context():
+            self.assertEquals(projects._networks_by_project(),
+                              {u't2': nets[0]})
+            # second call is served from cache
+            self.assertEquals(projects._networks_by_project(),
+                              {u't2': nets[0]})
+
+    def test_networks_index_invalidated(self):
+        net = doubles.make(self.mox, doubles.Network,
+                           label=u'net2', id=u'netid2', project_id=u't2')
+        self.fake_client_set.compute.networks.list().AndReturn([])
+        self.fake_client_set.compute.networks.list().AndReturn([net])
+        self.mox.ReplayAll()
+
+        with self.app.test_request_context():
+            self.assertEquals(projects._networks_by_project(), {})
+            projects.invalidate_network_index()
+            self.assertEquals(projects._networks_by_project(),
+                              {u't2': net})
+
+    def test_quotasets_for_projects(self):
+        qm_mock = self.fake_client_set.compute.quotas
+        qm_mock.get(u't1').InAnyOrder().AndReturn('QUOTA1')
+        qm_mock.get(u't2').InAnyOrder().AndReturn('QUOTA2')
+        self.mox.ReplayAll()
+
+        with self.app.test_request_context():
+            result = projects._quotasets_for_projects([u't1', u't2'])
+        self.assertEquals(result, {u't1': 'QUOTA1', u't2': 'QUOTA2'})
+
 
 class CreateProjectTestCase(MockedTestCase):
 
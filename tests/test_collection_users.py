@@ -186,6 +186,18 @@ class UserFromNovaTestCase(MockedTestCase):
             data = users.user_to_view(user, invite, send_code=True)
         self.assertEquals(data, expected)
 
+    def test_user_to_view_fields(self):
+        user = doubles.make(self.mox, doubles.User,
+                            id=u'42', name=u'iv', email=u'iv@example.com',
+                            fullname=u'Example User', enabled=False)
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            data = users.user_to_view(user, fields=set(['id', 'name']))
+        self.assertEquals(data['name'], u'iv')
+        self.assertTrue('projects' not in data)
+        self.assertTrue('admin' not in data)
+
     def test_user_to_view_with_my_projects(self):
         tenant = doubles.make(self.mox, doubles.Tenant,
                               id='PID', name='ptest')
@@ -221,8 +233,8 @@ class GetUsersTestCase(MockedTestCase):
     def test_list_users(self):
         self.fake_client_set.identity_admin \
                 .users.list().AndReturn(['user-a', 'user-b'])
-        users.user_to_view('user-a').AndReturn('dict-a')
-        users.user_to_view('user-b').AndReturn('dict-b')
+        users.user_to_view('user-a', fields=None).AndReturn('dict-a')
+        users.user_to_view('user-b', fields=None).AndReturn('dict-b')
         expected = {
             'collection': {
                 'name': 'users',
@@ -237,6 +249,25 @@ class GetUsersTestCase(MockedTestCase):
         data = self.check_and_parse_response(rv)
         self.assertEquals(data, expected)
 
+    def test_list_users_fields(self):
+        self.fake_client_set.identity_admin \
+                .users.list().AndReturn(['user-a'])
+        users.user_to_view('user-a', fields=set(['id', 'href', 'name'])) \
+                .AndReturn({'id': 'a', 'href': '/v1/users/a',
+                            'name': 'user-a', 'email': 'a@example.com'})
+        self.mox.ReplayAll()
+
+        rv = self.client.get('/v1/users/?fields=name')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data['users'], [
+            {'id': 'a', 'href': '/v1/users/a', 'name': 'user-a'}
+        ])
+
+    def test_list_users_bad_fields(self):
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/users/?fields=name,password')
+        self.check_and_parse_response(rv, status_code=400)
+
     def test_get_user(self):
         # prepare
         self.fake_client_set.identity_admin.users\
@@ -260,6 +291,59 @@ class GetUsersTestCase(MockedTestCase):
         self.check_and_parse_response(rv, status_code=404)
 
 
+class ProjectMemberNamesTestCase(MockedTestCase):
+    IS_ADMIN = False
+
+    def test_project_member_names(self):
+        tenants = self.fake_client_set.identity_admin.tenants
+        self.mox.StubOutWithMock(users.auth, 'current_user_project_ids')
+        users.auth.current_user_project_ids().AndReturn(['P1', 'P2', 'P3'])
+        tenants.list_users('P1').InAnyOrder().AndReturn([
+            doubles.make(self.mox, doubles.User, id=u'U1', name=u'one'),
+            doubles.make(self.mox, doubles.User, id=u'U2', name=u'two')])
+        tenants.list_users('P2').InAnyOrder()\
+                .AndRaise(osc_exc.NotFound('gone'))
+        tenants.list_users('P3').InAnyOrder().AndReturn([
+            doubles.make(self.mox, doubles.User, id=u'U2', name=u'two')])
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            result = users.project_member_names()
+        self.assertEquals(result, {u'U1': u'one', u'U2': u'two'})
+
+
+class UserListsUsersTestCase(MockedTestCase):
+    IS_ADMIN = False
+
+    def setUp(self):
+        super(UserListsUsersTestCase, self).setUp()
+        self.mox.StubOutWithMock(users, 'user_to_view')
+        self.mox.StubOutWithMock(users.auth, 'admin_client_set')
+        self.mox.StubOutWithMock(users.auth, 'current_user_id')
+        self.mox.StubOutWithMock(users.auth, 'current_user_project_ids')
+        self.admin_cs = self._fake_client_set_factory()
+
+    def test_list_users_of_my_projects(self):
+        user_list = [doubles.make(self.mox, doubles.User,
+                                  id=user_id, name=user_id.lower())
+                     for user_id in ('ME', 'U1', 'U2', 'U3')]
+        users.auth.admin_client_set().AndReturn(self.admin_cs)
+        self.admin_cs.identity_admin.users.list().AndReturn(user_list)
+        users.auth.admin_client_set().AndReturn(self.admin_cs)
+        users.auth.current_user_project_ids().AndReturn(set(['P1']))
+        self.admin_cs.identity_admin.tenants.list_users('P1') \
+                .AndReturn([user_list[2]])
+        users.auth.current_user_id().AndReturn('ME')
+        users.user_to_view(user_list[0], fields=None).AndReturn('dict-me')
+        users.user_to_view(user_list[2], fields=None).AndReturn('dict-u2')
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/users/')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data['users'], ['dict-me', 'dict-u2'])
+
+
 class CreateUserTestCase(MockedTestCase):
 
     def setUp(self):
@@ -563,10 +647,11 @@ class UpdateUserTestCase(MockedTestCase):
         (name, email, passw) = ('user-upd', 'user-upd@example.com', 'orange')
 
         fullname = "User Userovich Upd"
-        ia.users.get('new-user').AndReturn('new-user')
-        ia.users.update('new-user', name=name, email=email,
-                        fullname=fullname).AndReturn('new-user')
-        ia.users.update_password('new-user', passw).AndReturn('new-user')
+        user = doubles.make(self.mox, doubles.User, id='new-user')
+        ia.users.get('new-user').AndReturn(user)
+        ia.users.update(user, name=name, email=email,
+                        fullname=fullname).AndReturn(user)
+        ia.users.update_password(user, passw).AndReturn(user)
         ia.users.get('new-user').AndReturn('new-user')
         users.user_to_view('new-user').AndReturn('new-user-dict')
         self.mox.ReplayAll()
@@ -651,6 +736,25 @@ class UpdateUserTestCase(MockedTestCase):
         data = self.check_and_parse_response(rv)
         self.assertEquals(data, 'REPLY')
 
+    def test_update_revoke_admin_forgets_credentials(self):
+        client = self.fake_client_set
+        uid = u'user-a'
+        self.mox.StubOutWithMock(users.auth, 'invalidate_user_credentials')
+
+        user = doubles.make(self.mox, doubles.User, id=uid)
+        client.identity_admin.users.get(uid).AndReturn(user)
+        client.identity_admin.roles.remove_user_role(
+            u'user-a', u'ADMIN_ROLE_ID', u'SYSTENANT_ID')
+        users.auth.invalidate_user_credentials(uid)
+        client.identity_admin.users.get(uid).AndReturn('same-user')
+        users.user_to_view('same-user').AndReturn('REPLY')
+
+        self.mox.ReplayAll()
+        rv = self.client.put(u'/v1/users/%s' % uid,
+                             data=json.dumps({'admin': False}),
+                             content_type='application/json')
+        self.check_and_parse_response(rv)
+
     def test_update_revoke_admin_idempotent(self):
         client = self.fake_client_set
         uid = u'user-a'
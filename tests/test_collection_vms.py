@@ -20,6 +20,7 @@
 # <http://www.gnu.org/licenses/>.
 
 import json
+import mox
 from datetime import datetime
 
 from tests import doubles
@@ -31,6 +32,12 @@ from openstackclient_base import exceptions as osc_exc
 from werkzeug.exceptions import NotFound
 
 from altai_api.blueprints import instances
+from altai_api.utils.markers import encode_marker
+
+
+def _with_ids(*ids):
+    """Match list of servers with given ids"""
+    return mox.Func(lambda servers: [s.id for s in servers] == list(ids))
 
 
 class InstanceFromNovaTestCase(MockedTestCase):
@@ -80,8 +87,8 @@ class InstanceFromNovaTestCase(MockedTestCase):
                         expires_at=datetime(2012, 12, 11, 10, 9, 8),
                         remind_at=datetime(2012, 12, 10, 8, 6, 4))
 
-    def test_instance_to_view_works(self):
-        expected = {
+    def _expected_view(self):
+        return {
             u'id': u'VMID',
             u'href': '/v1/instances/VMID',
             u'name': u'test instance',
@@ -120,6 +127,9 @@ class InstanceFromNovaTestCase(MockedTestCase):
             },
         }
 
+    def test_instance_to_view_works(self):
+        expected = self._expected_view()
+
         # ACTION
         client = self.fake_client_set
         client.identity_admin.tenants.get(u'TENANT').AndReturn(self.tenant)
@@ -197,12 +207,84 @@ class InstanceFromNovaTestCase(MockedTestCase):
             result = instances._instance_to_view(self.instance)
         self.assertEquals(result['created-by'], expected_user)
 
+    def test_instances_to_views(self):
+        expected = self._expected_view()
+        other = doubles.make(self.mox, doubles.Server,
+                             id=u'VM2', name=u'other instance',
+                             user_id=u'GONE', tenant_id=u'TENANT',
+                             addresses={}, image={u'id': u'IMAGE'},
+                             flavor={u'id': u'2'}, status=u'ACTIVE',
+                             created=u'2012-12-12T06:20:27Z')
+        flavor2 = doubles.make(self.mox, doubles.Flavor,
+                               name=u'deleted type', id=u'2')
+
+        client = self.fake_client_set
+        client.compute.flavors.list().AndReturn([self.flavor])
+        client.identity_admin.tenants.list().AndReturn([self.tenant])
+        client.identity_admin.users.list().AndReturn([self.user])
+        client.image.images.list(filters={'is_public': None})\
+                .AndReturn([self.image])
+        instances.InstanceDataDAO.get_many(mox.IgnoreArg())\
+                .AndReturn({u'VMID': self.instancedata})
+        client.compute.flavors.get(u'2').AndReturn(flavor2)
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            result = instances._instances_to_views([self.instance, other])
+        self.assertEquals(len(result), 2)
+        self.assertEquals(result[0], expected)
+        self.assertEquals(result[1]['created-by'], {
+            u'id': u'GONE',
+            u'name': None,
+            u'href': '/v1/users/GONE'
+        })
+        self.assertEquals(result[1]['instance-type']['name'],
+                          u'deleted type')
+        self.assertTrue('expires-at' not in result[1])
+
+    def test_instances_to_views_empty(self):
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            self.assertEquals(instances._instances_to_views([]), [])
+
+
+class InstancesToViewsFieldsTestCase(MockedTestCase):
+
+    def test_instances_to_views_fields(self):
+        server = doubles.make(self.mox, doubles.Server,
+                              id=u'VMID', name=u'test instance',
+                              user_id=u'UID', tenant_id=u'PID',
+                              addresses={}, image={u'id': u'IMAGE'},
+                              flavor={u'id': u'1'}, status=u'ACTIVE',
+                              created=u'2012-12-12T06:20:27Z')
+        tenant = doubles.make(self.mox, doubles.Tenant,
+                              id=u'PID', name=u'test project')
+        self.fake_client_set.identity_admin.tenants.list()\
+                .AndReturn([tenant])
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            self.install_fake_auth()
+            result = instances._instances_to_views(
+                [server], set(['id', 'href', 'name', 'project']))
+        self.assertEquals(len(result), 1)
+        self.assertEquals(result[0]['project'], {
+            u'id': u'PID',
+            u'name': u'test project',
+            u'href': u'/v1/projects/PID'
+        })
+        for name in ('created-by', 'image', 'instance-type', 'expires-at'):
+            self.assertTrue(name not in result[0])
+
 
 class InstancesListTestCase(MockedTestCase):
 
     def setUp(self):
         super(InstancesListTestCase, self).setUp()
         self.mox.StubOutWithMock(instances, '_instance_to_view')
+        self.mox.StubOutWithMock(instances, '_instances_to_views')
         self.mox.StubOutWithMock(instances, '_servers_for_user')
         self.mox.StubOutWithMock(instances, 'fetch_instance')
 
@@ -210,8 +292,8 @@ class InstancesListTestCase(MockedTestCase):
         self.fake_client_set.compute.servers\
                 .list(search_opts={'all_tenants': 1})\
                 .AndReturn([u'VM1', u'VM2'])
-        instances._instance_to_view(u'VM1').AndReturn(u'R1')
-        instances._instance_to_view(u'VM2').AndReturn(u'R2')
+        instances._instances_to_views([u'VM1', u'VM2'], None)\
+                .AndReturn([u'R1', u'R2'])
 
         expected = {
             u'collection': {
@@ -227,10 +309,10 @@ class InstancesListTestCase(MockedTestCase):
         self.assertEquals(data, expected)
 
     def test_list_instances_my_projects(self):
-        instances._servers_for_user() \
+        instances._servers_for_user({}) \
                 .AndReturn([u'VM1', u'VM2'])
-        instances._instance_to_view(u'VM1').AndReturn(u'R1')
-        instances._instance_to_view(u'VM2').AndReturn(u'R2')
+        instances._instances_to_views([u'VM1', u'VM2'], None)\
+                .AndReturn([u'R1', u'R2'])
 
         expected = {
             u'collection': {
@@ -245,6 +327,151 @@ class InstancesListTestCase(MockedTestCase):
         data = self.check_and_parse_response(rv)
         self.assertEquals(data, expected)
 
+    def test_list_instances_paginates_before_views(self):
+        self.fake_client_set.compute.servers\
+                .list(search_opts={'all_tenants': 1})\
+                .AndReturn([u'VM1', u'VM2', u'VM3', u'VM4'])
+        instances._instances_to_views([u'VM2', u'VM3'], None)\
+                .AndReturn([u'R2', u'R3'])
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/instances/?offset=1&limit=2')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data, {
+            u'collection': {
+                u'name': u'instances',
+                u'size': 4
+            },
+            u'instances': [u'R2', u'R3']
+        })
+
+    def test_list_instances_pushes_filters(self):
+        servers = [
+            doubles.make(self.mox, doubles.Server, id=u'VM1',
+                         name=u'test vm', status=u'REBOOT'),
+            doubles.make(self.mox, doubles.Server, id=u'VM2',
+                         name=u'test vm', status=u'ERROR'),
+            doubles.make(self.mox, doubles.Server, id=u'VM3',
+                         name=u'test vm', status=u'ERROR')
+        ]
+        self.fake_client_set.compute.servers\
+                .list(search_opts={'all_tenants': 1,
+                                   'tenant_id': u'PID',
+                                   'status': u'ERROR',
+                                   'name': u'^test vm$'})\
+                .AndReturn(servers)
+        instances._instances_to_views(_with_ids(u'VM2'), None)\
+                .AndReturn([u'R2'])
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/instances/?project:eq=PID'
+                             '&state:eq=ERROR&name:eq=test%20vm&limit=1')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data, {
+            u'collection': {
+                u'name': u'instances',
+                u'size': 2
+            },
+            u'instances': [u'R2']
+        })
+
+    def test_list_instances_pushes_unicode_name(self):
+        name = u'\u0442\u0435\u0441\u0442 (1.0)'
+        servers = [doubles.make(self.mox, doubles.Server, id=u'VM1',
+                                name=name, status=u'ACTIVE')]
+        self.fake_client_set.compute.servers\
+                .list(search_opts={'all_tenants': 1,
+                                   'name': u'^\u0442\u0435\u0441\u0442 '
+                                           u'\\(1\\.0\\)$'})\
+                .AndReturn(servers)
+        instances._instances_to_views(_with_ids(u'VM1'), None)\
+                .AndReturn([u'R1'])
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/instances/?name:eq=%D1%82%D0%B5%D1%81%D1%82'
+                             '%20(1.0)')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data.get('instances'), [u'R1'])
+
+    def test_list_instances_sorts_before_views(self):
+        servers = [
+            doubles.make(self.mox, doubles.Server, id=u'VM1',
+                         name=u'b', tenant_id=u'P2'),
+            doubles.make(self.mox, doubles.Server, id=u'VM2',
+                         name=u'a', tenant_id=u'P1'),
+            doubles.make(self.mox, doubles.Server, id=u'VM3',
+                         name=u'c', tenant_id=u'P1')
+        ]
+        self.fake_client_set.compute.servers\
+                .list(search_opts={'all_tenants': 1})\
+                .AndReturn(servers)
+        instances._instances_to_views(_with_ids(u'VM3', u'VM2'), None)\
+                .AndReturn([u'R3', u'R2'])
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/instances/?sortby=project.id,name:desc'
+                             '&limit=2')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data.get('instances'), [u'R3', u'R2'])
+
+    def test_list_instances_fields(self):
+        self.fake_client_set.compute.servers\
+                .list(search_opts={'all_tenants': 1})\
+                .AndReturn([u'VM1'])
+        instances._instances_to_views(
+            [u'VM1'], set(['id', 'href', 'name', 'state'])).AndReturn([{
+                u'id': u'VM1', u'href': u'/v1/instances/VM1',
+                u'name': u'vm', u'state': u'ACTIVE', u'ipv4': []
+            }])
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/instances/?fields=name,state')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data.get('instances'), [{
+            u'id': u'VM1', u'href': u'/v1/instances/VM1',
+            u'name': u'vm', u'state': u'ACTIVE'
+        }])
+
+    def test_list_instances_marker(self):
+        with self.app.test_request_context():
+            marker = encode_marker(None, [], u'VM2')
+        self.fake_client_set.compute.servers\
+                .list(search_opts={'all_tenants': 1, 'marker': u'VM2'})\
+                .AndReturn([u'VM3'])
+        instances._instances_to_views([u'VM3'], None)\
+                .AndReturn([u'R3'])
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/instances/?marker=%s' % marker)
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data.get('instances'), [u'R3'])
+
+    def test_list_instances_marker_not_found(self):
+        with self.app.test_request_context():
+            marker = encode_marker(None, [], u'VM2')
+        self.fake_client_set.compute.servers\
+                .list(search_opts={'all_tenants': 1, 'marker': u'VM2'})\
+                .AndRaise(osc_exc.BadRequest('marker not found'))
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/instances/?marker=%s' % marker)
+        data = self.check_and_parse_response(rv, status_code=400)
+        self.assertEquals(data.get('argument-name'), 'marker')
+
+    def test_list_instances_builds_views_when_needed(self):
+        self.fake_client_set.compute.servers\
+                .list(search_opts={'all_tenants': 1})\
+                .AndReturn([u'VM1', u'VM2'])
+        instances._instances_to_views([u'VM1', u'VM2'], None)\
+                .AndReturn([{u'name': u'x', u'project': {u'name': u'b'}},
+                            {u'name': u'y', u'project': {u'name': u'a'}}])
+
+        self.mox.ReplayAll()
+        rv = self.client.get('/v1/instances/?sortby=project.name&limit=1')
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data.get('instances'),
+                          [{u'name': u'y', u'project': {u'name': u'a'}}])
+
     def test_get_instance_works(self):
         instances.fetch_instance(u'VMID').AndReturn('VM1')
         instances._instance_to_view('VM1').AndReturn('REPLY')
@@ -296,36 +523,58 @@ class UserInstanceTestCase(MockedTestCase):
 class ServersForUserTestCase(MockedTestCase):
 
     def test_servers_for_user_work(self):
-        self.mox.StubOutWithMock(instances, 'client_set_for_tenant')
+        self.mox.StubOutWithMock(instances, 'tenant_client_set_getter')
         tenants = [doubles.make(self.mox, doubles.Tenant, id='P1'),
                    doubles.make(self.mox, doubles.Tenant, id='P3')]
         tcs = self._fake_client_set_factory()
 
         self.fake_client_set.identity_public.tenants.list() \
                 .AndReturn(tenants)
-        instances.client_set_for_tenant('P1').AndReturn(tcs)
-        tcs.compute.servers.list().AndReturn(['V1', 'V2', 'V3'])
+        instances.tenant_client_set_getter().AndReturn({'P1': tcs}.get)
+        tcs.compute.servers.list(search_opts={}).AndReturn(['V1', 'V2', 'V3'])
 
         self.mox.ReplayAll()
         with self.app.test_request_context('/v1/instances?my-projects=true'
                                            '&project:in=P1|P2'):
             self.install_fake_auth()
             instances.parse_collection_request(instances._SCHEMA.sortby)
-            result = instances._servers_for_user()
+            result = instances._servers_for_user({})
+        self.assertEquals(result, ['V1', 'V2', 'V3'])
+
+    def test_servers_for_user_several_projects(self):
+        self.mox.StubOutWithMock(instances, 'tenant_client_set_getter')
+        tenants = [doubles.make(self.mox, doubles.Tenant, id='P3'),
+                   doubles.make(self.mox, doubles.Tenant, id='P1')]
+        tcs1 = self._fake_client_set_factory()
+        tcs3 = self._fake_client_set_factory()
+
+        self.fake_client_set.identity_public.tenants.list() \
+                .AndReturn(tenants)
+        instances.tenant_client_set_getter() \
+                .AndReturn({'P1': tcs1, 'P3': tcs3}.get)
+        tcs1.compute.servers.list(search_opts={}).AndReturn(['V1', 'V2'])
+        tcs3.compute.servers.list(search_opts={}).AndReturn(['V3'])
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context('/v1/instances?my-projects=true'):
+            self.install_fake_auth()
+            instances.parse_collection_request(instances._SCHEMA.sortby)
+            result = instances._servers_for_user({})
         self.assertEquals(result, ['V1', 'V2', 'V3'])
 
     def test_servers_for_user_none(self):
-        self.mox.StubOutWithMock(instances, 'client_set_for_tenant')
+        self.mox.StubOutWithMock(instances, 'tenant_client_set_getter')
         tenants = [doubles.make(self.mox, doubles.Tenant, id='P2'),
                    doubles.make(self.mox, doubles.Tenant, id='P3')]
         self.fake_client_set.identity_public.tenants.list() \
                 .AndReturn(tenants)
+        instances.tenant_client_set_getter().AndReturn({}.get)
         self.mox.ReplayAll()
         with self.app.test_request_context('/v1/instances?my-projects=true'
                                            '&project:eq=P1'):
             self.install_fake_auth()
             instances.parse_collection_request(instances._SCHEMA.sortby)
-            result = instances._servers_for_user()
+            result = instances._servers_for_user({})
         self.assertEquals(result, [])
 
 
@@ -60,3 +60,25 @@ class AuditDAOTestCase(ContextWrappedDBTestCase):
         l = list(AuditDAO.list_all())
         self.assertEquals(l, [AuditDAO.get(self.record_id)])
 
+    def test_list_page(self):
+        record_ids = [self.record_id]
+        for _ in xrange(4):
+            record = AuditDAO.create_record({
+                'method': 'GET',
+                'resource': '/test',
+                'response_status': 200
+            })
+            record_ids.append(record.record_id)
+
+        size, records = AuditDAO.list_page(limit=2)
+        self.assertEquals(size, 5)
+        self.assertEquals([r.record_id for r in records], record_ids[:2])
+
+        size, records = AuditDAO.list_page(record_ids[1], limit=2)
+        self.assertEquals(size, 3)
+        self.assertEquals([r.record_id for r in records], record_ids[2:4])
+
+        size, records = AuditDAO.list_page(record_ids[1], offset=2)
+        self.assertEquals(size, 3)
+        self.assertEquals([r.record_id for r in records], record_ids[4:])
+
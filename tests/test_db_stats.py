@@ -0,0 +1,140 @@
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+
+from datetime import datetime, timedelta
+
+from tests.db import ContextWrappedDBTestCase
+from altai_api.db.stats import StatsDAO, GlobalStats, ProjectStats
+from altai_api.db.stats import StatsHistoryDAO, StatsSample
+
+
+class StatsDAOTestCase(ContextWrappedDBTestCase):
+
+    def setUp(self):
+        super(StatsDAOTestCase, self).setUp()
+        self.now = datetime(2013, 2, 3, 4, 5, 6)
+
+    def _global_stats(self, projects):
+        return GlobalStats(projects=projects, instances=14, users=9,
+                           total_images=5, global_images=2,
+                           computed_at=self.now)
+
+    def _project_stats(self, project_id, members=0):
+        return ProjectStats(project_id=project_id,
+                            project_name=u'name-%s' % project_id,
+                            members=members, instances=0,
+                            local_images=0, total_images=0,
+                            computed_at=self.now)
+
+    def test_get_global_none(self):
+        self.assertEquals(StatsDAO.get_global(), None)
+        self.assertEquals(list(StatsDAO.list_projects()), [])
+
+    def test_save(self):
+        StatsDAO.save(self._global_stats(2),
+                      [self._project_stats(u'p2'),
+                       self._project_stats(u'p1')])
+        global_stats = StatsDAO.get_global()
+        self.assertEquals(global_stats.projects, 2)
+        self.assertEquals(global_stats.computed_at, self.now)
+        self.assertEquals([s.project_id for s in StatsDAO.list_projects()],
+                          [u'p1', u'p2'])
+
+    def test_save_replaces_snapshot(self):
+        StatsDAO.save(self._global_stats(2),
+                      [self._project_stats(u'p1'),
+                       self._project_stats(u'p2')])
+        StatsDAO.save(self._global_stats(1),
+                      [self._project_stats(u'p2', members=3)])
+
+        self.assertEquals(StatsDAO.get_global().projects, 1)
+        project_stats = list(StatsDAO.list_projects())
+        self.assertEquals([s.project_id for s in project_stats], [u'p2'])
+        self.assertEquals(project_stats[0].members, 3)
+
+
+class StatsHistoryDAOTestCase(ContextWrappedDBTestCase):
+
+    def setUp(self):
+        super(StatsHistoryDAOTestCase, self).setUp()
+        self.start = datetime(2013, 2, 3, 4, 0, 0)
+        # two samples per every 30 minutes, for three hours
+        for minutes in xrange(0, 180, 30):
+            timestamp = self.start + timedelta(minutes=minutes)
+            StatsHistoryDAO.add_samples(timestamp, [
+                StatsSample(project_id=u'p1', instances=minutes,
+                            local_images=1, members=2),
+                StatsSample(node_name=u'node1', cpus=8,
+                            cpus_used=minutes // 30)
+            ])
+
+    def _all_samples(self):
+        return list(StatsSample.query.order_by(StatsSample.timestamp,
+                                               StatsSample.project_id))
+
+    def test_history(self):
+        result = StatsHistoryDAO.history(3600, self.start,
+                                         self.start + timedelta(hours=1))
+        # samples at 4:00, 4:30 and 5:00
+        self.assertEquals(len(result), 4)
+        first_node, first_project = result[0], result[1]
+        self.assertEquals(first_project.project_id, u'p1')
+        self.assertEquals(first_project.samples, 2)
+        self.assertEquals(first_project.instances, 15.0)
+        self.assertEquals(first_project.cpus, None)
+        self.assertEquals(first_node.node_name, u'node1')
+        self.assertEquals(first_node.cpus_used, 0.5)
+        self.assertEquals(result[2].samples, 1)
+
+    def test_history_for_projects(self):
+        result = StatsHistoryDAO.history(24 * 3600, self.start,
+                                         self.start + timedelta(hours=3),
+                                         project_ids=[u'p1'])
+        self.assertEquals(len(result), 1)
+        self.assertEquals(result[0].project_id, u'p1')
+        self.assertEquals(result[0].samples, 6)
+        self.assertEquals(result[0].instances, 75.0)
+
+    def test_history_for_no_projects(self):
+        result = StatsHistoryDAO.history(3600, self.start,
+                                         self.start + timedelta(hours=3),
+                                         project_ids=[])
+        self.assertEquals(result, [])
+
+    def test_rollup(self):
+        # last hour is not complete yet and should stay intact
+        before = self.start + timedelta(hours=2, minutes=45)
+        self.assertEquals(StatsHistoryDAO.rollup(3600, before), 4)
+
+        samples = self._all_samples()
+        self.assertEquals([(s.period, s.samples) for s in samples],
+                          [(3600, 2)] * 4 + [(0, 1)] * 4)
+        self.assertEquals(samples[1].instances, 15.0)
+
+    def test_rollup_is_weighted(self):
+        StatsHistoryDAO.rollup(3600, self.start + timedelta(hours=1))
+        StatsHistoryDAO.rollup(24 * 3600, self.start + timedelta(days=1))
+
+        samples = self._all_samples()
+        self.assertEquals(len(samples), 2)
+        project = [s for s in samples if s.project_id == u'p1'][0]
+        self.assertEquals(project.period, 24 * 3600)
+        self.assertEquals(project.samples, 6)
+        self.assertEquals(project.instances, 75.0)
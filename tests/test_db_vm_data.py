@@ -45,6 +45,19 @@ class InstanceDataDAOTestCase(ContextWrappedDBTestCase):
         instancedata = InstanceDataDAO.get('non-existing id')
         self.assertEquals(instancedata, None)
 
+    def test_get_many(self):
+        InstanceDataDAO.create('OTHER_VMID', None, self.remind_at)
+        result = InstanceDataDAO.get_many(
+            [self.instance_id, 'OTHER_VMID', 'non-existing id'])
+        self.assertEquals(sorted(result.keys()),
+                          ['OTHER_VMID', self.instance_id])
+        self.assertEquals(self.expires_at,
+                          result[self.instance_id].expires_at)
+        self.assertEquals(None, result['OTHER_VMID'].expires_at)
+
+    def test_get_many_empty(self):
+        self.assertEquals(InstanceDataDAO.get_many([]), {})
+
     def test_update_expires_at(self):
         new_expires_at = self.expires_at + timedelta(days=30)
         InstanceDataDAO.update(self.instance_id, expires_at=new_expires_at)
@@ -93,6 +93,18 @@ class HttpResponsesTestCase(TestCase):
                                            'Sat, 29 Oct 1994 19:43:31 GMT'})
         self.check_and_parse_response(rv, status_code=400)
 
+    def test_if_none_match(self):
+        rv = self.client.get('/')
+        self.check_and_parse_response(rv, status_code=200)
+        etag = rv.headers['ETag']
+        rv = self.client.get('/', headers={'If-None-Match': etag})
+        self.assertEquals(rv.status_code, 304)
+        self.assertEquals(rv.data, '')
+
+    def test_if_none_match_checked_for_delete(self):
+        rv = self.client.delete('/', headers={'If-None-Match': '*'})
+        self.check_and_parse_response(rv, status_code=400)
+
     def test_except_works(self):
         rv = self.client.get('/', headers={'Expect': '200-ok'})
         self.check_and_parse_response(rv, status_code=200)
@@ -0,0 +1,108 @@
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+
+from datetime import datetime
+from mox import IsA
+
+from tests.mocked import MockedTestCase
+
+from altai_api.jobs import stats
+from altai_api.db.stats import GlobalStats, ProjectStats
+
+
+class StatsJobsTestCase(MockedTestCase):
+    FAKE_AUTH = False
+
+    def setUp(self):
+        super(StatsJobsTestCase, self).setUp()
+        self.mox.StubOutWithMock(stats, 'compute_stats')
+        self.mox.StubOutWithMock(stats, 'list_node_views')
+        self.mox.StubOutWithMock(stats, 'admin_client_set')
+        self.mox.StubOutWithMock(stats, 'StatsDAO')
+        self.mox.StubOutWithMock(stats, 'StatsHistoryDAO')
+        self.fake_client_set = self._fake_client_set_factory()
+        self.now = datetime(2013, 2, 3, 4, 5, 6)
+
+    def _check_samples(self, expected):
+        def _check(timestamp, samples):
+            self.assertEquals(
+                [(s.project_id, s.node_name, s.instances, s.cpus_used)
+                 for s in samples], expected)
+            return True
+        return _check
+
+    def test_update_stats_snapshot(self):
+        global_stats = GlobalStats(computed_at=self.now)
+        project_stats = [ProjectStats(project_id=u'p1', instances=3,
+                                      local_images=1, members=2)]
+        stats.compute_stats().AndReturn((global_stats, project_stats))
+        stats.admin_client_set().AndReturn(self.fake_client_set)
+        stats.list_node_views(self.fake_client_set.compute.hosts)\
+                .AndReturn([{'name': u'node1', 'cpus': 8, 'cpus-used': 2,
+                             'memory': 1024, 'memory-used': 512}])
+        stats.StatsDAO.save(global_stats, project_stats)
+        stats.StatsHistoryDAO.add_samples(self.now, IsA(list))\
+                .WithSideEffects(self._check_samples([
+                    (u'p1', None, 3, None),
+                    (None, u'node1', None, 2)]))
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            stats.update_stats_snapshot()
+
+    def test_update_stats_snapshot_without_nodes(self):
+        global_stats = GlobalStats(computed_at=self.now)
+        stats.compute_stats().AndReturn((global_stats, []))
+        stats.admin_client_set().AndReturn(self.fake_client_set)
+        stats.list_node_views(self.fake_client_set.compute.hosts)\
+                .AndRaise(RuntimeError('log me'))
+        stats.StatsDAO.save(global_stats, [])
+        stats.StatsHistoryDAO.add_samples(self.now, [])
+
+        self.mox.StubOutWithMock(self.app.logger, 'exception')
+        self.app.logger.exception(IsA(basestring))
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            stats.update_stats_snapshot()
+
+    def test_rollup_stats_history(self):
+        self.mox.StubOutWithMock(stats, 'datetime')
+        stats.datetime.utcnow().AndReturn(self.now)
+        stats.StatsHistoryDAO.rollup(
+            3600, datetime(2013, 2, 1, 4, 5, 6))
+        stats.StatsHistoryDAO.rollup(
+            24 * 3600, datetime(2012, 12, 5, 4, 5, 6))
+
+        self.mox.ReplayAll()
+        with self.app.test_request_context():
+            stats.rollup_stats_history()
+
+    def test_factory_works(self):
+        self.mox.StubOutWithMock(stats, 'PeriodicAdministrativeJob')
+        stats.PeriodicAdministrativeJob(self.app, 300.0,
+                                        stats.update_stats_snapshot)\
+                .AndReturn('T1')
+        stats.PeriodicAdministrativeJob(self.app, 3600.0,
+                                        stats.rollup_stats_history)\
+                .AndReturn('T2')
+
+        self.mox.ReplayAll()
+        self.assertEquals(stats.jobs_factory(self.app), ['T1', 'T2'])
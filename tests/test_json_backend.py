@@ -0,0 +1,127 @@
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from datetime import datetime
+from flask import Flask
+
+from altai_api import json_backend
+
+
+class FormatTimestampTestCase(unittest.TestCase):
+
+    def test_format_timestamp(self):
+        value = datetime(2012, 9, 13, 15, 3, 42, 123)
+        self.assertEquals(json_backend.format_timestamp(value),
+                          '2012-09-13T15:03:42.000123Z')
+
+    def test_format_timestamp_no_microseconds(self):
+        value = datetime(2012, 9, 13, 15, 3, 42)
+        self.assertEquals(json_backend.format_timestamp(value),
+                          '2012-09-13T15:03:42.000000Z')
+
+    def test_same_as_strftime(self):
+        for value in (datetime(2013, 1, 1), datetime(2013, 12, 31, 23, 59),
+                      datetime(2000, 2, 29, 1, 2, 3, 999999)):
+            self.assertEquals(json_backend.format_timestamp(value),
+                              value.strftime('%Y-%m-%dT%H:%M:%S.%fZ'))
+
+
+class BackendsTestCase(unittest.TestCase):
+    data = {
+        'string': u'\u0442\u0435\u0441\u0442',
+        'number': 42,
+        'float': 0.1,
+        'list': [1, None, True, {'created': datetime(2012, 9, 13)}],
+        'created': datetime(2012, 9, 13, 15, 3, 42)
+    }
+    expected = {
+        'string': u'\u0442\u0435\u0441\u0442',
+        'number': 42,
+        'float': 0.1,
+        'list': [1, None, True, {'created': '2012-09-13T00:00:00.000000Z'}],
+        'created': '2012-09-13T15:03:42.000000Z'
+    }
+
+    def test_stdlib_always_available(self):
+        self.assertTrue('json' in json_backend.available_backends())
+
+    def test_round_trip(self):
+        for name in json_backend.available_backends():
+            backend = json_backend.get_backend(name)
+            text = backend.dumps(self.data)
+            self.assertTrue(isinstance(text, str))
+            self.assertEquals(backend.loads(text), self.expected, name)
+
+    def test_compact(self):
+        for name in json_backend.available_backends():
+            backend = json_backend.get_backend(name)
+            self.assertEquals(backend.dumps({'a': [1, 2]}), '{"a":[1,2]}')
+
+    def test_object_hook(self):
+        hook = lambda obj: sorted(obj.keys())
+        for name in json_backend.available_backends():
+            backend = json_backend.get_backend(name)
+            result = backend.loads('{"b":{"d":1,"c":2},"a":[{"e":3}]}',
+                                   object_hook=hook)
+            self.assertEquals(result, ['a', 'b'], name)
+
+    def test_raises_type_error(self):
+        for name in json_backend.available_backends():
+            backend = json_backend.get_backend(name)
+            self.assertRaises(TypeError, backend.dumps, {'a': object()})
+
+    def test_with_timestamps(self):
+        self.assertEquals(json_backend._with_timestamps(self.data),
+                          self.expected)
+
+    def test_with_object_hook(self):
+        data = {'b': {'d': 1, 'c': 2}, 'a': [{'e': 3}]}
+        seen = []
+
+        def hook(obj):
+            seen.append(sorted(obj.keys()))
+            return len(obj)
+        result = json_backend._with_object_hook(data, hook)
+        self.assertEquals(result, 2)
+        self.assertEquals(sorted(seen), [['a', 'b'], ['c', 'd'], ['e']])
+        self.assertEquals(seen[-1], ['a', 'b'])
+
+
+class GetBackendTestCase(unittest.TestCase):
+
+    def test_auto(self):
+        expected = json_backend.available_backends()[0]
+        self.assertEquals(json_backend.get_backend('auto').name, expected)
+
+    def test_no_context(self):
+        expected = json_backend.available_backends()[0]
+        self.assertEquals(json_backend.get_backend().name, expected)
+
+    def test_from_config(self):
+        app = Flask(__name__)
+        app.config['JSON_BACKEND'] = 'json'
+        with app.test_request_context():
+            self.assertEquals(json_backend.get_backend().name, 'json')
+
+    def test_not_available(self):
+        self.assertRaises(RuntimeError, json_backend.get_backend, 'pickle')
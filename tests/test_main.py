@@ -72,21 +72,25 @@ class MainTestCase(mox.MoxTestBase):
         self.mox.StubOutWithMock(main, 'setup_logging')
         self.mox.StubOutWithMock(main, 'check_connection')
         self.mox.StubOutWithMock(main.instances_jobs, 'jobs_factory')
+        self.mox.StubOutWithMock(main.stats_jobs, 'jobs_factory')
         self.fake_app = self.mox.CreateMock(ApiApp)
         self.fake_app.config = self.config
 
     def test_main_works(self):
         main.make_app().AndReturn(self.fake_app)
         jobs = [self.mox.CreateMock(PeriodicJob),
+                 self.mox.CreateMock(PeriodicJob),
                  self.mox.CreateMock(PeriodicJob)]
 
         main.setup_logging(self.fake_app)
         main.check_connection(self.fake_app).AndReturn(True)
-        main.instances_jobs.jobs_factory(self.fake_app).AndReturn(jobs)
+        main.instances_jobs.jobs_factory(self.fake_app).AndReturn(jobs[:2])
+        main.stats_jobs.jobs_factory(self.fake_app).AndReturn(jobs[2:])
         self.fake_app.run(use_reloader=False,
                           host='127.0.0.1', port=42)
         jobs[0].cancel().AndRaise(RuntimeError('ignore me'))
         jobs[1].cancel()
+        jobs[2].cancel()
         self.mox.ReplayAll()
         main.main()
 
@@ -20,10 +20,14 @@
 # License along with this program. If not, see
 # <http://www.gnu.org/licenses/>.
 
+import zlib
+import urllib
+import hashlib
 import unittest
 import flask
 
 from datetime import datetime
+from operator import itemgetter
 
 from tests import TestCase, ContextWrappedTestCase
 from altai_api import exceptions as exc
@@ -34,9 +38,14 @@ from altai_api.schema import types as st
 from altai_api.utils import (make_json_response,
                              make_collection_response,
                              parse_request_data)
+from altai_api.utils import communication
+from altai_api.utils.communication import make_json_stream_response
 from altai_api.utils.collection import get_matcher_argument
+from altai_api.utils.collection import view_fields
 from altai_api.utils.communication import parse_my_projects_arg
-from altai_api.utils.sorting import parse_sortby, apply_sortby
+from altai_api.utils.sorting import parse_sortby, apply_sortby, _Inverted
+from altai_api.utils.sorting import apply_marker, sort_key_values
+from altai_api.utils.markers import decode_marker
 from altai_api.utils.parsers import int_from_string, int_from_user
 from altai_api.utils.parsers import cidr_from_user, ipv4_from_user
 from altai_api.utils.parsers import timestamp_from_openstack
@@ -102,6 +111,195 @@ class MakeResponseTestCase(TestCase):
                 self.fail('TypeError was not raised')
         self.assertTrue('TEST CLASS' in str(error))
 
+    def test_stream_response(self):
+        self.app.config['PRETTY_PRINT_JSON'] = False
+        elements = [{'id': i, 'created': datetime(2012, 9, 13)}
+                    for i in xrange(5)]
+        with self.app.test_request_context():
+            resp = make_json_stream_response({'one': 1}, 'elements',
+                                             elements)
+        self.assertTrue(resp.is_streamed)
+        chunk_size = communication._STREAM_CHUNK_SIZE
+        communication._STREAM_CHUNK_SIZE = 20
+        try:
+            chunks = list(resp.response)
+        finally:
+            communication._STREAM_CHUNK_SIZE = chunk_size
+        self.assertTrue(len(chunks) > 2)
+        self.assertEquals(flask.json.loads(''.join(chunks)), {
+            'one': 1,
+            'elements': [{'id': i, 'created': '2012-09-13T00:00:00.000000Z'}
+                         for i in xrange(5)]
+        })
+        self.assertEquals(resp.status_code, 200)
+        self.assertEquals(resp.headers.get('Content-type'),
+                          'application/json')
+
+    def test_stream_response_empty(self):
+        self.app.config['PRETTY_PRINT_JSON'] = False
+        with self.app.test_request_context():
+            resp = make_json_stream_response({}, 'elements', [])
+        self.assertEquals(resp.data, '{"elements":[]}')
+
+    def test_stream_response_pretty(self):
+        self.app.config['PRETTY_PRINT_JSON'] = True
+        with self.app.test_request_context():
+            resp = make_json_stream_response({'one': 1}, 'elements', [2])
+        self.assertFalse(resp.is_streamed)
+        self.assertEquals(flask.json.loads(resp.data),
+                          {'one': 1, 'elements': [2]})
+
+
+class CompressResponseTestCase(TestCase):
+
+    def setUp(self):
+        super(CompressResponseTestCase, self).setUp()
+        self.app.config['PRETTY_PRINT_JSON'] = False
+        self.app.config['COMPRESS_RESPONSES'] = True
+        self.app.config['COMPRESS_MIN_SIZE'] = 10
+        self.data = {'elements': range(100)}
+        self.expected = '{"elements":[%s]}' % ','.join(map(str, range(100)))
+
+    def _make_response(self, accept_encoding):
+        headers = {'Accept-Encoding': accept_encoding}
+        with self.app.test_request_context(headers=headers):
+            return make_json_response(self.data)
+
+    def test_gzip(self):
+        resp = self._make_response('gzip, deflate')
+        self.assertEquals(resp.headers.get('Content-Encoding'), 'gzip')
+        self.assertEquals(resp.headers.get('Vary'), 'Accept-Encoding')
+        self.assertEquals(zlib.decompress(resp.data, 16 + zlib.MAX_WBITS),
+                          self.expected)
+        self.assertEquals(resp.headers.get('Content-Length'),
+                          str(len(resp.data)))
+
+    def test_deflate(self):
+        resp = self._make_response('deflate')
+        self.assertEquals(resp.headers.get('Content-Encoding'), 'deflate')
+        self.assertEquals(zlib.decompress(resp.data), self.expected)
+
+    def test_quality(self):
+        resp = self._make_response('gzip;q=0.5, deflate')
+        self.assertEquals(resp.headers.get('Content-Encoding'), 'deflate')
+
+    def test_refused(self):
+        resp = self._make_response('gzip;q=0, *;q=0.5')
+        self.assertEquals(resp.headers.get('Content-Encoding'), 'deflate')
+
+    def test_not_accepted(self):
+        resp = self._make_response('identity')
+        self.assertEquals(resp.headers.get('Content-Encoding'), None)
+        self.assertEquals(resp.headers.get('Vary'), 'Accept-Encoding')
+        self.assertEquals(resp.data, self.expected)
+
+    def test_small(self):
+        self.app.config['COMPRESS_MIN_SIZE'] = 1000
+        resp = self._make_response('gzip')
+        self.assertEquals(resp.headers.get('Content-Encoding'), None)
+        self.assertEquals(resp.data, self.expected)
+
+    def test_disabled(self):
+        self.app.config['COMPRESS_RESPONSES'] = False
+        resp = self._make_response('gzip')
+        self.assertEquals(resp.headers.get('Content-Encoding'), None)
+        self.assertEquals(resp.headers.get('Vary'), None)
+        self.assertEquals(resp.data, self.expected)
+
+    def test_stream(self):
+        headers = {'Accept-Encoding': 'gzip'}
+        with self.app.test_request_context(headers=headers):
+            resp = make_json_stream_response({}, 'elements', range(100))
+        self.assertTrue(resp.is_streamed)
+        self.assertEquals(resp.headers.get('Content-Encoding'), 'gzip')
+        self.assertEquals(resp.headers.get('Vary'), 'Accept-Encoding')
+        self.assertEquals(zlib.decompress(''.join(resp.response),
+                                          16 + zlib.MAX_WBITS),
+                          self.expected)
+
+    def test_stream_not_accepted(self):
+        with self.app.test_request_context():
+            resp = make_json_stream_response({}, 'elements', range(100))
+        self.assertEquals(resp.headers.get('Content-Encoding'), None)
+        self.assertEquals(''.join(resp.response), self.expected)
+
+
+class ETagTestCase(TestCase):
+
+    def setUp(self):
+        super(ETagTestCase, self).setUp()
+        self.app.config['PRETTY_PRINT_JSON'] = False
+        self.etag = hashlib.sha1('{"one":1}').hexdigest()
+
+    def _make_response(self, headers=None, method='GET', **kwargs):
+        with self.app.test_request_context(method=method, headers=headers):
+            return make_json_response({'one': 1}, **kwargs)
+
+    def test_etag(self):
+        resp = self._make_response()
+        self.assertEquals(resp.status_code, 200)
+        self.assertEquals(resp.get_etag(), (self.etag, False))
+
+    def test_no_etag_for_post(self):
+        resp = self._make_response(method='POST')
+        self.assertEquals(resp.headers.get('ETag'), None)
+
+    def test_no_etag_for_errors(self):
+        with self.app.test_request_context():
+            resp = make_json_response({'one': 1},
+                                      status_code=404)
+        self.assertEquals(resp.headers.get('ETag'), None)
+
+    def test_not_modified(self):
+        resp = self._make_response({'If-None-Match': '"%s"' % self.etag})
+        self.assertEquals(resp.status_code, 304)
+        self.assertEquals(resp.data, '')
+        self.assertEquals(resp.get_etag(), (self.etag, False))
+
+    def test_modified(self):
+        resp = self._make_response({'If-None-Match': '"other", "tags"'})
+        self.assertEquals(resp.status_code, 200)
+        self.assertEquals(resp.data, '{"one":1}')
+
+    def test_star(self):
+        resp = self._make_response({'If-None-Match': '*'})
+        self.assertEquals(resp.status_code, 304)
+
+    def test_version_stamp(self):
+        resp = self._make_response(etag='v42')
+        self.assertEquals(resp.get_etag(), ('v42', False))
+        resp = self._make_response({'If-None-Match': '"v42"'}, etag='v42')
+        self.assertEquals(resp.status_code, 304)
+
+    def test_compressed(self):
+        self.app.config['COMPRESS_RESPONSES'] = True
+        self.app.config['COMPRESS_MIN_SIZE'] = 0
+        resp = self._make_response({'Accept-Encoding': 'gzip'})
+        etag = self.etag + '-gzip'
+        self.assertEquals(resp.get_etag(), (etag, False))
+        resp = self._make_response({'Accept-Encoding': 'gzip',
+                                    'If-None-Match': '"%s"' % etag})
+        self.assertEquals(resp.status_code, 304)
+        self.assertEquals(resp.get_etag(), (etag, False))
+        self.assertEquals(resp.headers.get('Vary'), 'Accept-Encoding')
+
+    def test_stream_version_stamp(self):
+        headers = {'If-None-Match': '"v42"'}
+        with self.app.test_request_context(headers=headers):
+            resp = make_json_stream_response({}, 'elements', [1],
+                                             etag='v42')
+        self.assertEquals(resp.status_code, 304)
+        with self.app.test_request_context():
+            resp = make_json_stream_response({}, 'elements', [1],
+                                             etag='v42')
+        self.assertTrue(resp.is_streamed)
+        self.assertEquals(resp.get_etag(), ('v42', False))
+
+    def test_stream_no_etag(self):
+        with self.app.test_request_context():
+            resp = make_json_stream_response({}, 'elements', [1])
+        self.assertEquals(resp.headers.get('ETag'), None)
+
 
 class ParseRequestDataTestCase(TestCase):
 
@@ -437,6 +635,204 @@ class MakeCollectionResponseTestCase(ContextWrappedTestCase):
         data = self.check_and_parse_response(rv)
         self.assertEquals(data, expected)
 
+    def test_to_views_page_only(self):
+        converted = []
+
+        def to_views(elements):
+            converted.extend(elements)
+            return [{'test': x} for x in elements]
+
+        flask.g.limit = 2
+        flask.g.offset = 1
+        rv = make_collection_response(u'test', range(1, 8),
+                                      to_views=to_views)
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data, {
+            u'collection': {
+                u'name': u'test',
+                u'size': 7
+            },
+            u'test': [{'test': 2}, {'test': 3}]
+        })
+        self.assertEquals(converted, [2, 3])
+
+    def test_to_views_filtered(self):
+        flask.g.filters = {'test': {'ge': 5}}
+        flask.g.limit = 2
+        rv = make_collection_response(
+            u'test', range(1, 8),
+            to_views=lambda elements: [{'test': x} for x in elements])
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data, {
+            u'collection': {
+                u'name': u'test',
+                u'size': 3
+            },
+            u'test': [{'test': 5}, {'test': 6}]
+        })
+
+    def test_keys_filter_and_sort(self):
+        converted = []
+
+        def to_views(elements):
+            converted.extend(elements)
+            return [{'test': x} for x in elements]
+
+        flask.g.filters = {'test': {'ge': 3}}
+        flask.g.sortby = parse_sortby('test:desc', ['test'])
+        flask.g.unused_args.add('sortby')
+        flask.g.limit = 2
+        rv = make_collection_response(u'test', range(1, 8),
+                                      to_views=to_views,
+                                      keys={'test': lambda x: x})
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data, {
+            u'collection': {
+                u'name': u'test',
+                u'size': 5
+            },
+            u'test': [{'test': 7}, {'test': 6}]
+        })
+        self.assertEquals(converted, [7, 6])
+
+    def test_fields(self):
+        flask.g.fields = set(['name'])
+        flask.g.unused_args.add('fields')
+        elements = [{'id': 1, 'href': '/1', 'name': 'a', 'test': 1},
+                    {'id': 2, 'href': '/2', 'name': 'b', 'test': 2}]
+        rv = make_collection_response(u'test', elements)
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data[u'test'],
+                          [{'id': 1, 'href': '/1', 'name': 'a'},
+                           {'id': 2, 'href': '/2', 'name': 'b'}])
+
+    def test_fields_streamed(self):
+        self.app.config['STREAM_COLLECTION_MIN_SIZE'] = 2
+        flask.g.fields = set(['name'])
+        flask.g.unused_args.add('fields')
+        elements = [{'id': 1, 'href': '/1', 'name': 'a', 'test': 1},
+                    {'id': 2, 'href': '/2', 'name': 'b', 'test': 2}]
+        rv = make_collection_response(u'test', elements)
+        self.assertTrue(rv.is_streamed)
+        self.assertFalse('fields' in flask.g.unused_args)
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data[u'test'],
+                          [{'id': 1, 'href': '/1', 'name': 'a'},
+                           {'id': 2, 'href': '/2', 'name': 'b'}])
+
+    def test_view_fields(self):
+        flask.g.fields = set(['name'])
+        flask.g.filters = {'test': {'ge': 5}, 'other': {}}
+        flask.g.sortby = parse_sortby('project.name', ['project.name'])
+        self.assertEquals(view_fields(),
+                          set(['id', 'href', 'name', 'test', 'project']))
+
+    def test_view_fields_all(self):
+        self.assertEquals(view_fields(), None)
+
+    def test_next_href(self):
+        elements = [{'id': i, 'test': i} for i in xrange(5)]
+        flask.g.limit = 2
+        rv = make_collection_response(u'test', elements)
+        data = self.check_and_parse_response(rv)
+        next_href = data[u'collection'][u'next-href']
+        self.assertTrue(next_href.startswith('/?marker='))
+        marker = urllib.unquote(next_href[len('/?marker='):])
+        self.assertEquals(decode_marker(marker), (None, [], 1))
+
+    def test_next_href_streamed(self):
+        self.app.config['STREAM_COLLECTION_MIN_SIZE'] = 2
+        elements = [{'id': i} for i in xrange(5)]
+        flask.g.limit = 2
+        rv = make_collection_response(
+            u'test', elements,
+            to_views=lambda page: [{'id': e['id'], 'test': e['id'] * 10}
+                                   for e in page])
+        self.assertTrue(rv.is_streamed)
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data[u'test'], [{'id': 0, 'test': 0},
+                                          {'id': 1, 'test': 10}])
+        next_href = data[u'collection'][u'next-href']
+        marker = urllib.unquote(next_href[len('/?marker='):])
+        self.assertEquals(decode_marker(marker), (None, [], 1))
+
+    def test_no_next_href_on_last_page(self):
+        elements = [{'id': i, 'test': i} for i in xrange(5)]
+        flask.g.limit = 2
+        flask.g.offset = 3
+        rv = make_collection_response(u'test', elements)
+        data = self.check_and_parse_response(rv)
+        self.assertTrue(u'next-href' not in data[u'collection'])
+
+    def test_marker(self):
+        elements = [{'id': i, 'test': i % 3} for i in xrange(7)]
+        flask.g.sortby = parse_sortby('test', ['test'])
+        flask.g.unused_args.add('sortby')
+        flask.g.marker = ([1], 4)
+        flask.g.limit = 2
+        rv = make_collection_response(u'test', elements)
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data[u'collection'][u'size'], 2)
+        self.assertEquals(data[u'test'], [{'id': 2, 'test': 2},
+                                          {'id': 5, 'test': 2}])
+
+    def test_marker_not_found(self):
+        flask.g.marker = ([], 42)
+        self.assertRaises(exc.InvalidArgumentValue,
+                          make_collection_response, u'test', self.result)
+
+    def test_size_given(self):
+        converted = []
+
+        def to_views(elements):
+            converted.extend(elements)
+            return [{'id': x} for x in elements]
+
+        flask.g.limit = 2
+        rv = make_collection_response(u'test', [3, 4], size=5,
+                                      to_views=to_views)
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data[u'collection'][u'size'], 5)
+        self.assertEquals(data[u'test'], [{'id': 3}, {'id': 4}])
+        self.assertTrue(u'next-href' in data[u'collection'])
+        self.assertEquals(converted, [3, 4])
+
+    def test_streamed(self):
+        self.app.config['STREAM_COLLECTION_MIN_SIZE'] = 3
+        rv = make_collection_response(u'test', self.result)
+        self.assertTrue(rv.is_streamed)
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(data, {
+            u'collection': {
+                u'name': u'test',
+                u'size': 7
+            },
+            u'test': self.result
+        })
+
+    def test_streamed_views_built_lazily(self):
+        self.app.config['STREAM_COLLECTION_MIN_SIZE'] = 3
+        pages = []
+
+        def to_views(page):
+            pages.append(len(page))
+            return [{'test': element['test'] * 10} for element in page]
+
+        rv = make_collection_response(u'test', self.result,
+                                      to_views=to_views)
+        self.assertTrue(rv.is_streamed)
+        self.assertEquals(pages, [])
+        data = self.check_and_parse_response(rv)
+        self.assertEquals(pages, [3, 3, 1])
+        self.assertEquals(data.get('test'),
+                          [{'test': i * 10} for i in xrange(1, 8)])
+
+    def test_small_not_streamed(self):
+        self.app.config['STREAM_COLLECTION_MIN_SIZE'] = 3
+        flask.g.limit = 2
+        rv = make_collection_response(u'test', self.result)
+        self.assertFalse(rv.is_streamed)
+
 
 class SortByTestCase(unittest.TestCase):
     allowed = ('first', 'second')
@@ -455,6 +851,48 @@ class SortByTestCase(unittest.TestCase):
         self.assertRaises(exc.InvalidRequest, parse_sortby,
                           'fw-rule-sets:desc', self.allowed)
 
+    def test_marker_sorted(self):
+        victim = [{'id': 1, 'first': 2}, {'id': 2, 'first': 1},
+                  {'id': 3, 'first': 2}, {'id': 4, 'first': 3},
+                  {'id': 5, 'first': 2}]
+        sortby = parse_sortby('first', self.allowed)
+        result = apply_marker(sortby, victim, [2], 3, itemgetter('id'))
+        self.assertEquals([x['id'] for x in result], [4, 5])
+
+    def test_marker_desc(self):
+        victim = [{'id': 1, 'first': 2}, {'id': 2, 'first': 1},
+                  {'id': 3, 'first': 3}]
+        sortby = parse_sortby('first:desc', self.allowed)
+        result = apply_marker(sortby, victim, [2], 1, itemgetter('id'))
+        self.assertEquals([x['id'] for x in result], [2])
+
+    def test_marker_gone_keeps_ties(self):
+        victim = [{'id': 1, 'first': 2}, {'id': 2, 'first': 1},
+                  {'id': 3, 'first': 2}]
+        sortby = parse_sortby('first', self.allowed)
+        result = apply_marker(sortby, victim, [2], 42, itemgetter('id'))
+        self.assertEquals([x['id'] for x in result], [1, 3])
+
+    def test_marker_link_object(self):
+        # marker is made from views, and applied to raw element keys
+        views = [{'id': 2, 'first': {'id': u'P1', 'name': u'a',
+                                     'href': u'/P1'}}]
+        victim = [{'id': 1, 'first': {'id': u'P2'}},
+                  {'id': 2, 'first': {'id': u'P1'}},
+                  {'id': 3, 'first': {'id': u'P1'}}]
+        sortby = parse_sortby('first', self.allowed)
+        values = sort_key_values(sortby, views[0])
+        self.assertEquals(values, [u'P1'])
+        result = apply_marker(sortby, victim, values, 2, itemgetter('id'))
+        self.assertEquals([x['id'] for x in result], [1, 3])
+
+    def test_marker_unsorted(self):
+        victim = [{'id': 3}, {'id': 1}, {'id': 2}]
+        result = apply_marker(None, victim, [], 3, itemgetter('id'))
+        self.assertEquals(result, [{'id': 1}, {'id': 2}])
+        self.assertEquals(
+            apply_marker(None, victim, [], 42, itemgetter('id')), None)
+
     def test_applies_nothing(self):
         victim = [
             { 'first': 3 },
@@ -503,6 +941,19 @@ class SortByTestCase(unittest.TestCase):
         sortby = parse_sortby('time:desc', ('time',))
         self.assertEquals(result, apply_sortby(sortby, victim))
 
+    def test_inverted_comparisons(self):
+        one, two = _Inverted(1), _Inverted(2)
+        self.assertTrue(two < one)
+        self.assertTrue(one > two)
+        self.assertTrue(two <= one)
+        self.assertTrue(one >= two)
+        self.assertTrue(one <= _Inverted(1))
+        self.assertTrue(one >= _Inverted(1))
+        self.assertFalse(one < two)
+        self.assertFalse(two > one)
+        self.assertFalse(one <= two)
+        self.assertFalse(two >= one)
+
     def test_key_not_found(self):
         victim = [
             { 'first': 3 },
@@ -571,6 +1022,40 @@ class SortByTestCase(unittest.TestCase):
         sortby = parse_sortby('first,second:desc', self.allowed)
         self.assertEquals(result, apply_sortby(sortby, victim))
 
+    def test_sort_is_stable(self):
+        victim = [
+            { 'first': 2, 'second': 1 },
+            { 'first': 1, 'second': 2 },
+            { 'first': 2, 'second': 3 },
+            { 'first': 1, 'second': 4 }
+        ]
+        result = [victim[1], victim[3], victim[0], victim[2]]
+        sortby = parse_sortby('first', self.allowed)
+        self.assertEquals(result, apply_sortby(sortby, victim))
+
+    def test_sort_mixed_directions_with_none(self):
+        victim = [
+            { 'first': 1, 'second': None },
+            { 'first': None, 'second': 2 },
+            { 'first': 1, 'second': 3 },
+            { 'first': None, 'second': None }
+        ]
+        result = [victim[1], victim[3], victim[2], victim[0]]
+        sortby = parse_sortby('first,second:desc', self.allowed)
+        self.assertEquals(result, apply_sortby(sortby, victim))
+
+    def test_sort_count(self):
+        victim = [{ 'first': x } for x in (5, 3, 9, 1, 7, 2, 8, 4, 6, 0)]
+        sortby = parse_sortby('first:desc', self.allowed)
+        self.assertEquals([{ 'first': 9 }],
+                          apply_sortby(sortby, victim, 1))
+        self.assertEquals([{ 'first': x } for x in (9, 8, 7, 6, 5)],
+                          apply_sortby(sortby, victim, 5))
+
+    def test_sort_count_no_sortby(self):
+        victim = [{ 'first': 3 }, { 'first': 1 }, { 'first': 2 }]
+        self.assertEquals(victim[:2], apply_sortby(None, victim, 2))
+
 
 class TimestampFromOpenstackTestCase(unittest.TestCase):
 
@@ -25,7 +25,8 @@ from altai_api.schema import types as st
 from altai_api import exceptions as exc
 
 from altai_api.schema import Schema
-from altai_api.utils.filters import parse_filters, apply_filters
+from altai_api.utils.filters import (parse_filters, apply_filters,
+                                     compile_filters)
 
 
 class ParseFiltersTestCase(unittest.TestCase):
@@ -197,3 +198,65 @@ class ApplyFiltersTestCase(unittest.TestCase):
         result = apply_filters(param, filters, self.schema)
         self.assertEquals(expected, result)
 
+    def test_apply_in_links(self):
+        schema = Schema([st.LinkObject('project')])
+        param = [
+            { 'project': { 'id': 'P1' } },
+            { 'project': None },
+            { 'project': { 'id': 'P2' } },
+            { 'project': { 'id': 'P3' } }
+        ]
+        filters = {
+            'project': { 'in': ['P3', 'P1'] }
+        }
+        result = apply_filters(param, filters, schema)
+        self.assertEquals([param[0], param[3]], result)
+
+    def test_apply_in_unhashable_value(self):
+        param = [
+            { 'name': ['test'] },
+            { 'name': 'test' }
+        ]
+        filters = {
+            'name': { 'in': ['test', 'bar'] }
+        }
+        result = apply_filters(param, filters, self.schema)
+        self.assertEquals([param[1]], result)
+
+
+class CompileFiltersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(CompileFiltersTestCase, self).setUp()
+        self.calls = []
+
+        def counting(value, pattern):
+            self.calls.append(value)
+            return value.endswith(pattern)
+
+        self.schema = Schema([
+            st.String('name', add_search_matchers={'endswith': counting}),
+            st.Int('size')
+        ])
+
+    def test_empty(self):
+        predicate = compile_filters({}, self.schema)
+        self.assertTrue(predicate({ 'name': 'test' }))
+
+    def test_cheap_filters_go_first(self):
+        predicate = compile_filters({
+            'name': { 'endswith': 'st' },
+            'size': { 'eq': 42 }
+        }, self.schema)
+        self.assertFalse(predicate({ 'name': 'test', 'size': 43 }))
+        self.assertEquals(self.calls, [])
+        self.assertTrue(predicate({ 'name': 'test', 'size': 42 }))
+        self.assertEquals(self.calls, ['test'])
+
+    def test_in_none(self):
+        predicate = compile_filters({
+            'size': { 'in': [1, 2] }
+        }, self.schema)
+        self.assertFalse(predicate({ 'size': None }))
+        self.assertFalse(predicate({}))
+        self.assertTrue(predicate({ 'size': 2 }))
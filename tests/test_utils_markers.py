@@ -0,0 +1,74 @@
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from datetime import datetime
+from flask import Flask
+
+from altai_api import exceptions as exc
+from altai_api.utils.markers import encode_marker, decode_marker
+
+
+class MarkersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(MarkersTestCase, self).setUp()
+        self.app = Flask(__name__)
+        self.app.config['ALTAI_API_SUPERUSER_PASSWORD'] = 'password'
+        self.context = self.app.test_request_context()
+        self.context.__enter__()
+
+    def tearDown(self):
+        self.context.__exit__(None, None, None)
+        super(MarkersTestCase, self).tearDown()
+
+    def test_round_trip(self):
+        values = [u'name', 42, None, datetime(2012, 9, 13, 15, 3, 42)]
+        marker = encode_marker(u'name,created:desc', values, u'ID')
+        self.assertEquals(decode_marker(marker),
+                          (u'name,created:desc', values, u'ID'))
+
+    def test_unsorted(self):
+        marker = encode_marker(None, [], 42)
+        self.assertEquals(decode_marker(marker), (None, [], 42))
+
+    def test_url_safe(self):
+        marker = encode_marker(u'name', [u'?&/+' * 10], u'ID')
+        self.assertEquals(marker.strip('-_.0123456789abcdefghijklmnopqrs'
+                                       'tuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'),
+                          '')
+
+    def test_forged(self):
+        marker = encode_marker(None, [], u'ID')
+        other = encode_marker(None, [], u'OTHER')
+        forged = other.split('.')[0] + '.' + marker.split('.')[1]
+        self.assertRaises(exc.InvalidArgumentValue, decode_marker, forged)
+
+    def test_other_key(self):
+        marker = encode_marker(None, [], u'ID')
+        self.app.config['MARKER_SECRET_KEY'] = 'secret'
+        self.assertRaises(exc.InvalidArgumentValue, decode_marker, marker)
+
+    def test_garbage(self):
+        for marker in ('', 'garbage', 'a.b.c', u'\u0444.x'):
+            self.assertRaises(exc.InvalidArgumentValue,
+                              decode_marker, marker)
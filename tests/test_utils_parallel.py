@@ -0,0 +1,124 @@
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+import unittest
+
+from threading import Lock
+from flask import Flask
+
+from altai_api.utils import parallel
+from altai_api.utils.parallel import parallel_map
+
+
+class ParallelMapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(ParallelMapTestCase, self).setUp()
+        # threads left busy by previous tests should not count
+        self._saved_pool = parallel._POOL
+        parallel._POOL = parallel._Pool()
+
+    def tearDown(self):
+        parallel._POOL = self._saved_pool
+        super(ParallelMapTestCase, self).tearDown()
+
+    def test_empty(self):
+        self.assertEquals(parallel_map(str, [], pool_size=4), [])
+
+    def test_keeps_order(self):
+        def slow_str(x):
+            time.sleep(0.01 * (5 - x))
+            return str(x)
+        self.assertEquals(parallel_map(slow_str, range(5), pool_size=3),
+                          ['0', '1', '2', '3', '4'])
+
+    def test_runs_concurrently(self):
+        lock = Lock()
+        state = {'running': 0, 'max_running': 0}
+
+        def work(x):
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'],
+                                           state['running'])
+            time.sleep(0.1)
+            with lock:
+                state['running'] -= 1
+            return x
+
+        start = time.time()
+        result = parallel_map(work, range(6), pool_size=3)
+        self.assertEquals(result, range(6))
+        self.assertEquals(state['max_running'], 3)
+        self.assertTrue(time.time() - start < 0.5)
+
+    def test_raises_first_error(self):
+        called = []
+
+        def work(x):
+            called.append(x)
+            if x >= 2:
+                raise ValueError(x)
+            return x
+
+        try:
+            parallel_map(work, range(20), pool_size=1)
+        except ValueError, e:
+            self.assertEquals(e.args, (2,))
+        else:
+            self.fail('ValueError expected')
+        self.assertEquals(called, [0, 1, 2])
+
+    def test_raises_error_from_thread(self):
+        def work(x):
+            if x == 3:
+                raise ValueError(x)
+            return x
+
+        self.assertRaises(ValueError, parallel_map, work, range(10), 4)
+
+    def test_pool_size_from_config(self):
+        app = Flask(__name__)
+        app.config['FANOUT_POOL_SIZE'] = 2
+        with app.test_request_context():
+            self.assertEquals(parallel_map(str, [1, 2, 3]),
+                              ['1', '2', '3'])
+
+    def test_nested_calls_share_pool(self):
+        lock = Lock()
+        state = {'running': 0, 'max_running': 0}
+
+        def work(x):
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'],
+                                           state['running'])
+            time.sleep(0.02)
+            with lock:
+                state['running'] -= 1
+            return x
+
+        result = parallel_map(
+            lambda x: parallel_map(work, range(x, x + 4), pool_size=3),
+            [0, 4, 8, 12], pool_size=3)
+        self.assertEquals(result, [range(x, x + 4) for x in (0, 4, 8, 12)])
+        self.assertTrue(state['max_running'] <= 3, state)
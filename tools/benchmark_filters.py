@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2012-2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Compare compiled collection filters with plain matcher calls
+
+Filters synthetic audit log records and instance views with several
+combined filters, and prints time taken by both implementations.
+
+"""
+
+import sys
+import random
+import timeit
+
+from datetime import datetime, timedelta
+from os.path import dirname
+
+
+def old_apply_filters(result, parsed_filters, schema):
+    compiled_filters = [
+        (name, value, schema.argument_matcher(name, match_type))
+        for name, filters in parsed_filters.iteritems()
+        for match_type, value in filters.iteritems()]
+    return [resource
+            for resource in result
+            if all((matches(resource.get(name), value)
+                    for name, value, matches in compiled_filters))]
+
+
+def _link(rnd, kind, number):
+    index = rnd.randint(0, number)
+    return {u'id': u'%s-%d' % (kind, index),
+            u'name': u'%s %d' % (kind, index)}
+
+
+def make_records(number):
+    rnd = random.Random(42)
+    start = datetime(2013, 1, 1)
+    return [{u'id': unicode(i),
+             u'message': rnd.choice((u'OK', u'Forbidden', u'Not found')),
+             u'method': rnd.choice((u'GET', u'POST', u'PUT', u'DELETE')),
+             u'resource': u'/v1/instances/%d' % rnd.randint(0, 1000),
+             u'response_status': rnd.choice((200, 201, 403, 404)),
+             u'timestamp': start + timedelta(seconds=i),
+             u'user': _link(rnd, u'user', 100),
+             u'project': _link(rnd, u'project', 50)}
+            for i in xrange(number)]
+
+
+def make_instances(number):
+    rnd = random.Random(42)
+    start = datetime(2013, 1, 1)
+    return [{u'id': u'%08x' % rnd.getrandbits(32),
+             u'name': u'vm-%d' % rnd.randint(0, number),
+             u'state': rnd.choice((u'ACTIVE', u'BUILD', u'ERROR')),
+             u'created': start + timedelta(seconds=rnd.randint(0, 10 ** 7)),
+             u'created-by': _link(rnd, u'user', 100),
+             u'project': _link(rnd, u'project', 50),
+             u'image': _link(rnd, u'image', 10)}
+            for _ in xrange(number)]
+
+
+def main():
+    sys.path.insert(0, dirname(dirname(__file__)))
+    from altai_api.schema import Schema
+    from altai_api.schema import types as st
+    from altai_api.utils.filters import apply_filters
+
+    audit_schema = Schema((
+        st.String('id'),
+        st.String('message'),
+        st.String('method'),
+        st.String('resource'),
+        st.Int('response_status'),
+        st.Timestamp('timestamp'),
+        st.LinkObject('user'),
+        st.LinkObject('project')))
+    audit_filters = {
+        'timestamp': {'ge': datetime(2013, 1, 1, 10),
+                      'lt': datetime(2013, 1, 2)},
+        'method': {'in': [u'POST', u'PUT', u'DELETE']},
+        'response_status': {'eq': 403},
+        'project': {'in': [u'project-%d' % i for i in xrange(10)]}
+    }
+    instance_schema = Schema((
+        st.String('id'),
+        st.String('name'),
+        st.String('state'),
+        st.Timestamp('created'),
+        st.LinkObject('created-by'),
+        st.LinkObject('project'),
+        st.LinkObject('image')))
+    instance_filters = {
+        'name': {'startswith': u'vm-1'},
+        'state': {'eq': u'ERROR'},
+        'project': {'in': [u'project-%d' % i for i in xrange(25)]},
+        'image': {'exists': True}
+    }
+
+    benchmarks = (
+        ('audit-log', make_records, audit_schema, audit_filters),
+        ('instances', make_instances, instance_schema, instance_filters)
+    )
+    for name, make, schema, filters in benchmarks:
+        for number in (10000, 100000):
+            resources = make(number)
+            expected = old_apply_filters(resources, filters, schema)
+            assert expected == apply_filters(resources, filters, schema)
+            tests = (
+                ('matcher calls', old_apply_filters),
+                ('compiled', apply_filters)
+            )
+            for test_name, function in tests:
+                seconds = min(timeit.repeat(
+                    lambda: function(resources, filters, schema),
+                    number=1, repeat=3))
+                print '%-10s %7d records, %-15s %8.3f s' % (
+                    name, number, test_name, seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2012-2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Compare JSON backends on audit log collection response
+
+Encodes and decodes synthetic audit log response with 10000 records
+with every installed backend, and prints time taken.
+
+"""
+
+import sys
+import json
+import random
+import timeit
+
+from datetime import datetime, timedelta
+from os.path import dirname
+
+
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def _old_json_default(obj):
+    if isinstance(obj, datetime):
+        return obj.strftime(_TIMESTAMP_FORMAT)
+    raise TypeError('%r is not JSON serializable' % obj)
+
+
+def old_dumps(data):
+    return json.dumps(data, separators=(',', ':'), default=_old_json_default)
+
+
+def _link(rnd, kind, number):
+    index = rnd.randint(0, number)
+    return {u'id': u'%s-%d' % (kind, index),
+            u'name': u'%s %d' % (kind, index),
+            u'href': u'/v1/%ss/%s-%d' % (kind, kind, index)}
+
+
+def make_audit_log(number):
+    rnd = random.Random(42)
+    start = datetime(2013, 1, 1)
+    records = [{u'id': unicode(i),
+                u'href': u'/v1/audit-log/%d' % i,
+                u'message': rnd.choice((u'OK', u'Forbidden', u'Not found')),
+                u'method': rnd.choice((u'GET', u'POST', u'PUT', u'DELETE')),
+                u'resource': u'/v1/instances/%d' % rnd.randint(0, 1000),
+                u'remote_address': u'10.0.%d.%d' % (rnd.randint(0, 255),
+                                                    rnd.randint(0, 255)),
+                u'response_status': rnd.choice((200, 201, 403, 404)),
+                u'timestamp': start + timedelta(seconds=i,
+                                                microseconds=i % 7),
+                u'user': _link(rnd, u'user', 100),
+                u'project': _link(rnd, u'project', 50)}
+               for i in xrange(number)]
+    return {
+        u'collection': {
+            u'name': u'audit-log',
+            u'size': number
+        },
+        u'audit-log': records
+    }
+
+
+def main():
+    sys.path.insert(0, dirname(dirname(__file__)))
+    from altai_api import json_backend
+
+    data = make_audit_log(10000)
+    text = old_dumps(data)
+    seconds = min(timeit.repeat(lambda: old_dumps(data),
+                                number=1, repeat=5))
+    print '%-25s dumps %8.3f s' % ('json, strftime', seconds)
+    for name in json_backend.available_backends():
+        backend = json_backend.get_backend(name)
+        assert json.loads(backend.dumps(data)) == json.loads(text)
+        dumps = min(timeit.repeat(lambda: backend.dumps(data),
+                                  number=1, repeat=5))
+        loads = min(timeit.repeat(lambda: backend.loads(text),
+                                  number=1, repeat=5))
+        print '%-25s dumps %8.3f s, loads %8.3f s' % (name, dumps, loads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# vim: tabstop=8 shiftwidth=4 softtabstop=4 expandtab smarttab autoindent
+
+# Altai API Service
+# Copyright (C) 2012-2013 Grid Dynamics Consulting Services, Inc
+# All Rights Reserved
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Compare collection sorting with the old cmp-based implementation
+
+Sorts synthetic instance views by several keys, with and without
+limit, and prints time taken by both implementations.
+
+"""
+
+import sys
+import random
+import timeit
+
+from datetime import datetime, timedelta
+from os.path import dirname
+
+
+def _old_cmp(val1, val2):
+    if val1 is None and val2 is None:
+        return 0
+    elif val1 is None:
+        return -1
+    elif val2 is None:
+        return 1
+    else:
+        return cmp(val1, val2)
+
+
+def old_apply_sortby(how, result):
+    def compare(val1, val2):
+        for _, is_asc, keyfun in how:
+            res = _old_cmp(keyfun(val1), keyfun(val2))
+            if res != 0:
+                return res if is_asc else -res
+        return 0
+    return sorted(list(result), compare)
+
+
+def make_instances(number):
+    rnd = random.Random(42)
+    start = datetime(2013, 1, 1)
+    states = (u'ACTIVE', u'BUILD', u'ERROR', u'SHUTOFF', None)
+    return [{u'id': u'%08x' % rnd.getrandbits(32),
+             u'name': u'vm-%d' % rnd.randint(0, number),
+             u'state': rnd.choice(states),
+             u'created': start + timedelta(seconds=rnd.randint(0, 10 ** 7)),
+             u'project': {
+                 u'id': u'project-%d' % rnd.randint(0, 50),
+                 u'name': u'Project %d' % rnd.randint(0, 50)}}
+            for _ in xrange(number)]
+
+
+def main():
+    sys.path.insert(0, dirname(dirname(__file__)))
+    from altai_api.utils.sorting import parse_sortby, apply_sortby
+
+    allowed = ('name', 'state', 'created', 'project.name')
+    how = parse_sortby('project.name,state:desc,created', allowed)
+    for number in (10000, 100000):
+        instances = make_instances(number)
+        expected = old_apply_sortby(how, instances)
+        assert expected == apply_sortby(how, instances)
+        tests = (
+            ('cmp-based', lambda: old_apply_sortby(how, instances)),
+            ('key-based', lambda: apply_sortby(how, instances)),
+            ('key-based, limit=20',
+             lambda: apply_sortby(how, instances, 20))
+        )
+        for name, test in tests:
+            seconds = min(timeit.repeat(test, number=1, repeat=3))
+            print '%7d instances, %-20s %8.3f s' % (number, name, seconds)
+
+
+if __name__ == '__main__':
+    main()